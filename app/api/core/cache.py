@@ -1,45 +1,212 @@
-from datetime import datetime, time, timedelta
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
 import functools
 import json
 import inspect
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
 
-from redis.asyncio import Redis
+from fastapi import Request, Response, params
 
+from api.core import metrics, profiling
+from api.core.cached_response import CachedResponse
+from api.core.generation import GenerationTracker
+from api.core.local_cache import CacheStats, LocalCache, SingleFlight
+from api.core.settings import Settings
 
-redis = Redis.from_url(
-    "redis://host.docker.internal:6379",
-    encoding="utf-8",
-    decode_responses=True,
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+
+# Created by init_redis() from the app lifespan, not at import time.
+redis: Optional["Redis"] = None
+
+# Settings defaults until configure_cache() applies the app's Settings.
+cache_ttl = Settings.cache_ttl
+compress_min_bytes: Optional[int] = Settings.cache_compress_min_bytes
+compress_level = Settings.cache_compress_level
+
+local_cache = LocalCache(
+    max_entries=Settings.cache_local_max_entries,
+    max_bytes=Settings.cache_local_max_bytes,
+    ttl=Settings.cache_local_ttl,
 )
+single_flight = SingleFlight()
+cache_stats = CacheStats()
+generation = GenerationTracker(redis, on_change=lambda _: local_cache.clear())
+
+
+@metrics.registry.collector
+def collect_cache_metrics() -> None:
+    for prefix, counters in cache_stats.snapshot().items():
+        for field, value in counters.items():
+            metrics.cache_requests.set(prefix, field, value=value)
+        hits = counters["local_hits"] + counters["redis_hits"]
+        if hits + counters["misses"]:
+            metrics.cache_hit_ratio.set(prefix, value=hits / (hits + counters["misses"]))
+
+
+def configure_cache(settings: Settings) -> None:
+    """Apply the cache part of settings; called from the app lifespan"""
+    global cache_ttl, compress_min_bytes, compress_level
+    cache_ttl = settings.cache_ttl
+    compress_min_bytes = settings.cache_compress_min_bytes if settings.cache_compress else None
+    compress_level = settings.cache_compress_level
+    local_cache.max_entries = settings.cache_local_max_entries
+    local_cache.max_bytes = settings.cache_local_max_bytes
+    local_cache.ttl = settings.cache_local_ttl
+    generation.key = settings.generation_key
+    generation.channel = settings.generation_channel
+    generation.events_channel = settings.ingest_events_channel
+    generation.poll_interval = settings.generation_poll_interval
+
+
+def init_redis(url: str) -> "Redis":
+    global redis
+    from redis.asyncio import Redis
+
+    redis = Redis.from_url(url)
+    generation.redis = redis
+    return redis
+
+
+async def close_redis() -> None:
+    global redis
+    if redis is not None:
+        await redis.aclose()
+    redis = generation.redis = None
 
-def compute_ttl() -> int:
-    now = datetime.now()
-    today_reset = datetime.combine(now.date(), time(hour=14, minute=11))
-    if now >= today_reset:
-        reset = today_reset + timedelta(days=1)
-    else:
-        reset = today_reset
-    return int((reset - now).total_seconds())
 
+def _normalize(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, Enum):
+        return _normalize(value.value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_normalize(v) for v in value]
+    return value
 
-def cache_response(prefix: str):
+
+def build_cache_key(
+    prefix: str,
+    signature: inspect.Signature,
+    args,
+    kwargs,
+    generation: Optional[int] = None,
+) -> str:
+    """Key from the declared query parameters only.
+
+    Dependencies (DB sessions etc.) are skipped, defaults are filled in,
+    None values are dropped and dates are rendered in ISO form, so that
+    equivalent requests map to the same key. When a data generation is
+    given it is part of the key, so a new load never reads old entries.
+    """
+    bound = signature.bind_partial(*args, **kwargs)
+    query = {}
+    for name, param in signature.parameters.items():
+        default = param.default
+        if isinstance(default, params.Depends):
+            continue
+        if name in bound.arguments:
+            value = bound.arguments[name]
+        elif default is not inspect.Parameter.empty:
+            value = default
+        else:
+            continue
+        if isinstance(value, params.Param):
+            value = value.get_default(call_default_factory=True)
+        if value is None:
+            continue
+        query[name] = _normalize(value)
+    key_body = json.dumps(query, sort_keys=True, separators=(",", ":"), default=str)
+    if generation is not None:
+        return f"{prefix}:g{generation}:{key_body}"
+    return f"{prefix}:{key_body}"
+
+
+def _encode_result(result) -> bytes:
+    if hasattr(result, "model_dump_json"):
+        return result.model_dump_json().encode()
+    if hasattr(result, "dict"):
+        result = result.dict()
+    return json.dumps(result, separators=(",", ":"), default=str).encode()
+
+
+def _with_request_param(signature: inspect.Signature) -> inspect.Signature:
+    """Route signature plus a Request parameter for Accept-Encoding"""
+    request_param = inspect.Parameter(
+        "_cache_request",
+        inspect.Parameter.KEYWORD_ONLY,
+        annotation=Request,
+    )
+    return signature.replace(
+        parameters=[*signature.parameters.values(), request_param]
+    )
+
+
+def cache_response(prefix: str, skip: Optional[Callable[[Dict], bool]] = None):
+    """Cache the encoded response body of a route.
+
+    Hits (and the miss that fills the cache) are returned as a raw
+    Response, so FastAPI does not re-validate them against the
+    response_model. Calls for which skip(arguments) is true (e.g.
+    streamed formats) go straight to the route.
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+
         @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
-            key_body = json.dumps({"args": args[1:], "kwargs": kwargs}, sort_keys=True, default=str)
-            key = f"{prefix}:{key_body}"
-            cached = await redis.get(key)
-            if cached:
-                return json.loads(cached)
+        async def wrapper(*args, _cache_request: Optional[Request] = None, **kwargs):
+            if skip is not None and skip(signature.bind_partial(*args, **kwargs).arguments):
+                return await func(*args, **kwargs)
+            accept_encoding = ""
+            if _cache_request is not None:
+                accept_encoding = _cache_request.headers.get("accept-encoding", "")
+            key = build_cache_key(prefix, signature, args, kwargs, generation.value)
+            cached = local_cache.get(key)
+            if cached is not None:
+                cache_stats.incr(prefix, "local_hits")
+                return cached.to_response(accept_encoding)
+            if single_flight.is_inflight(key):
+                cache_stats.incr(prefix, "coalesced")
+            cached = await single_flight.run(key, lambda: load(key, args, kwargs))
+            return cached.to_response(accept_encoding)
+
+        async def load(key, args, kwargs):
+            started = time.perf_counter()
+            raw = await redis.get(key)
+            elapsed = time.perf_counter() - started
+            metrics.cache_operation_seconds.observe(elapsed, prefix, "get")
+            profiling.record("cache", elapsed)
+            cached = CachedResponse.from_bytes(raw) if raw else None
+            if cached is not None:
+                cache_stats.incr(prefix, "redis_hits")
+                local_cache.set(key, cached, size=len(cached))
+                return cached
+            cache_stats.incr(prefix, "misses")
             result = await func(*args, **kwargs)
-            if hasattr(result, "model_dump_json"):
-                payload = result.model_dump()
-            elif hasattr(result, "dict"):
-                payload = result.dict()
-            else:
-                payload = result
-            await redis.set(key, json.dumps(payload, default=str), ex=compute_ttl())
-            return result
-        wrapper.__signature__ = inspect.signature(func)
+            with profiling.phase("encoding"):
+                if isinstance(result, Response):
+                    body, media_type = result.body, result.media_type
+                else:
+                    body, media_type = _encode_result(result), "application/json"
+                cached = CachedResponse.encode(
+                    body,
+                    media_type,
+                    compress_min_bytes=compress_min_bytes,
+                    compress_level=compress_level,
+                )
+            started = time.perf_counter()
+            await redis.set(key, cached.to_bytes(), ex=cache_ttl)
+            elapsed = time.perf_counter() - started
+            metrics.cache_operation_seconds.observe(elapsed, prefix, "set")
+            profiling.record("cache", elapsed)
+            local_cache.set(key, cached, size=len(cached))
+            return cached
+
+        wrapper.__signature__ = _with_request_param(signature)
         return wrapper
     return decorator
@@ -0,0 +1,84 @@
+import gzip
+import json
+from typing import Optional
+
+from fastapi import Response
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip: listed, or covered
+    by "*", with a q-value above 0 ("gzip;q=0" refuses it)"""
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip()] = q
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+class CachedResponse:
+    """Final response body as stored in the cache, plus its metadata.
+
+    Serialized as one JSON metadata line followed by the body bytes, so a
+    hit is served as a raw Response without touching pydantic.
+    """
+
+    def __init__(self, body: bytes, media_type: str = "application/json", encoding: Optional[str] = None):
+        self.body = body
+        self.media_type = media_type
+        self.encoding = encoding
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    @classmethod
+    def encode(
+        cls,
+        body: bytes,
+        media_type: str = "application/json",
+        compress_min_bytes: Optional[int] = None,
+        compress_level: int = 6,
+    ) -> "CachedResponse":
+        if compress_min_bytes is not None and len(body) >= compress_min_bytes:
+            compressed = gzip.compress(body, compresslevel=compress_level, mtime=0)
+            if len(compressed) < len(body):
+                return cls(compressed, media_type, "gzip")
+        return cls(body, media_type)
+
+    def to_bytes(self) -> bytes:
+        meta = {"t": self.media_type}
+        if self.encoding:
+            meta["e"] = self.encoding
+        return json.dumps(meta, separators=(",", ":")).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> Optional["CachedResponse"]:
+        """None if raw is not a cached response (e.g. an older entry format)"""
+        head, sep, body = raw.partition(b"\n")
+        if not sep:
+            return None
+        try:
+            meta = json.loads(head)
+            return cls(body, meta["t"], meta.get("e"))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def to_response(self, accept_encoding: str = "") -> Response:
+        headers = {"Vary": "Accept-Encoding"}
+        body = self.body
+        if self.encoding == "gzip":
+            if accepts_gzip(accept_encoding):
+                headers["Content-Encoding"] = "gzip"
+            else:
+                body = gzip.decompress(body)
+        return Response(content=body, media_type=self.media_type, headers=headers)
@@ -0,0 +1,59 @@
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from api.models.crud import EXPORT_NUMERIC
+
+
+TRADING_RESULTS_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("exchange_product_id", pa.string()),
+    ("exchange_product_name", pa.string()),
+    ("oil_id", pa.string()),
+    ("delivery_basis_id", pa.string()),
+    ("delivery_basis_name", pa.string()),
+    ("delivery_type_id", pa.string()),
+    ("volume", pa.decimal128(EXPORT_NUMERIC.precision, EXPORT_NUMERIC.scale)),
+    ("total", pa.decimal128(EXPORT_NUMERIC.precision, EXPORT_NUMERIC.scale)),
+    ("count", pa.int64()),
+    ("date", pa.date32()),
+    ("created_on", pa.timestamp("us")),
+    ("updated_on", pa.timestamp("us")),
+])
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def table_from_csv(data: bytes, schema: pa.Schema = TRADING_RESULTS_SCHEMA) -> pa.Table:
+    """Arrow table from PostgreSQL COPY ... (FORMAT csv) output.
+
+    Parsed column by column in Arrow's C++ reader. COPY writes NULL as
+    an unquoted empty field and '' quoted, which keeps them apart.
+    """
+    if not data:
+        return schema.empty_table()
+    return pa_csv.read_csv(
+        io.BytesIO(data),
+        read_options=pa_csv.ReadOptions(column_names=schema.names),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=schema,
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+
+def encode_table(table: pa.Table, format: str) -> bytes:
+    """Arrow IPC stream or Parquet file"""
+    sink = io.BytesIO()
+    if format == "parquet":
+        pq.write_table(table, sink, compression="zstd")
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue()
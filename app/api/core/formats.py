@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Sequence
+
+
+def _plain(value):
+    """Value as rendered by the JSON endpoints (pydantic)"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_ndjson(rows: Iterable) -> bytes:
+    """One JSON object per row and line"""
+    return "".join(
+        json.dumps({k: _plain(v) for k, v in row._mapping.items()}, ensure_ascii=False) + "\n"
+        for row in rows
+    ).encode()
+
+
+def encode_csv(rows: Iterable, header: Sequence[str] = ()) -> bytes:
+    """CSV lines for rows, preceded by header if given"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(header)
+    writer.writerows(
+        ["" if v is None else _plain(v) for v in row] for row in rows
+    )
+    return buffer.getvalue().encode()
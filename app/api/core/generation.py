@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from api.core.settings import Settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationTracker:
+    """Keeps the process-local copy of the data generation up to date.
+
+    The scraper bumps `key` after each successful load and publishes
+    the new value on `channel`. The tracker applies announcements as
+    they arrive and re-reads the key every poll_interval seconds in
+    case a message was missed.
+
+    The scraper also describes each ingest (files, dates, rows,
+    generation) on `events_channel`; the latest one is kept in
+    last_ingest and passed to on_ingest. wait_change() lets background
+    tasks sleep until the next change.
+    """
+
+    def __init__(
+        self,
+        redis: Optional["Redis"],
+        on_change: Optional[Callable[[int], None]] = None,
+        poll_interval: float = Settings.generation_poll_interval,
+        on_ingest: Optional[Callable[[Dict], None]] = None,
+        key: str = Settings.generation_key,
+        channel: str = Settings.generation_channel,
+        events_channel: str = Settings.ingest_events_channel,
+    ):
+        self.redis = redis
+        self.on_change = on_change
+        self.on_ingest = on_ingest
+        self.poll_interval = poll_interval
+        self.key = key
+        self.channel = channel
+        self.events_channel = events_channel
+        self.value = 0
+        self.last_ingest: Optional[Dict] = None
+        self._waiters: List[asyncio.Future] = []
+
+    def update(self, value: int) -> None:
+        if value == self.value:
+            return
+        self.value = value
+        if self.on_change is not None:
+            self.on_change(value)
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(value)
+
+    async def wait_change(self, seen: int) -> int:
+        """Return the generation once it differs from seen"""
+        while self.value == seen:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        return self.value
+
+    def ingested(self, event: Dict) -> None:
+        self.last_ingest = event
+        self.update(int(event["generation"]))
+        if self.on_ingest is not None:
+            self.on_ingest(event)
+
+    async def refresh(self) -> int:
+        raw = await self.redis.get(self.key)
+        self.update(int(raw) if raw else 0)
+        return self.value
+
+    async def listen(self) -> None:
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache generation listener failed, retrying")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _listen_once(self) -> None:
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel, self.events_channel)
+            await self.refresh()
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=self.poll_interval,
+                )
+                if message is None:
+                    await self.refresh()
+                    continue
+                channel = message.get("channel")
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                try:
+                    if channel == self.events_channel:
+                        self.ingested(json.loads(message["data"]))
+                    else:
+                        self.update(int(message["data"]))
+                except (TypeError, ValueError, KeyError):
+                    await self.refresh()
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,257 @@
+import bisect
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+# Those of db.PoolStats, whose counts db_pool_checkout_wait_seconds copies
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def set(self, *label_values, value: float) -> None:
+        """For collectors copying a total kept elsewhere"""
+        self.values[label_values] = value
+
+    def samples(self) -> Iterable[str]:
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    """Per label set: non-cumulative bucket counts, sum and count.
+
+    observe() is a dict lookup and a bisect; the cumulative series are
+    only computed when rendering.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def set_counts(self, counts: Sequence[int], total: float, *label_values) -> None:
+        """Replace a series from counters kept elsewhere (e.g. PoolStats)"""
+        self.series[label_values] = [list(counts), total, sum(counts)]
+
+    def samples(self) -> Iterable[str]:
+        bounds = [*map(_number, self.buckets), "+Inf"]
+        for key, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = 'le="' + bound + '"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {count}"
+
+
+class Registry:
+    """Metrics of this process in Prometheus text exposition format.
+
+    Collectors run before every render to set gauges from state kept
+    elsewhere (pool status, cache counters) instead of updating them on
+    the hot path.
+    """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], None]) -> Callable[[], None]:
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in self.metrics:
+            getattr(metric, "values", getattr(metric, "series", {})).clear()
+
+
+registry = Registry()
+
+http_request_seconds = registry.register(Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte",
+    ("method", "route", "status"),
+))
+cache_operation_seconds = registry.register(Histogram(
+    "cache_operation_duration_seconds",
+    "Redis round trips of cache_response",
+    ("prefix", "operation"),
+))
+cache_requests = registry.register(Counter(
+    "cache_requests_total",
+    "cache_response lookups since start by result (local_hits, redis_hits, misses, coalesced)",
+    ("prefix", "result"),
+))
+cache_hit_ratio = registry.register(Gauge(
+    "cache_hit_ratio",
+    "(local_hits + redis_hits) / (local_hits + redis_hits + misses)",
+    ("prefix",),
+))
+db_query_seconds = registry.register(Histogram(
+    "db_query_duration_seconds",
+    "Statement execution time; query is the crud function or the SQL verb",
+    ("query",),
+))
+db_query_rows = registry.register(Histogram(
+    "db_query_rows",
+    "Rows returned or affected per statement",
+    ("query",),
+    buckets=ROW_BUCKETS,
+))
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections",
+    "Pooled connections by state",
+    ("engine", "state"),
+))
+db_pool_wait_seconds = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a free pooled connection, not opening one",
+    ("engine",),
+    buckets=POOL_WAIT_BUCKETS,
+))
+db_pool_timeouts = registry.register(Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after pool_timeout since start",
+    ("engine",),
+))
+
+
+def observe_query(name: str, seconds: float, rows: Optional[int] = None) -> None:
+    db_query_seconds.observe(seconds, name)
+    if rows is not None and rows >= 0:
+        db_query_rows.observe(rows, name)
+
+
+def _query_name(statement: str, context) -> str:
+    name = context.execution_options.get("query_name") if context is not None else None
+    if name:
+        return name
+    verb = statement.lstrip().split(None, 1)
+    return verb[0].upper() if verb else "UNKNOWN"
+
+
+def instrument_engine(sync_engine) -> None:
+    """Time every statement the engine executes (db_query_* metrics).
+
+    Statements are labelled with their query_name execution option,
+    set by the crud functions, or else with their SQL verb.
+    """
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info.pop("query_started")
+        observe_query(_query_name(statement, context), seconds, cursor.rowcount)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording http_request_duration_seconds.
+
+    The route label is the matched path template ("/dynamics"), so URLs
+    with different query strings share a series; unmatched paths are
+    labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
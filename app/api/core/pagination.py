@@ -0,0 +1,27 @@
+import base64
+import json
+from datetime import date
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(last_date: date, last_id: Optional[int] = None) -> str:
+    """Opaque keyset cursor pointing after the last row of a page"""
+    data = {"d": last_date.isoformat()}
+    if last_id is not None:
+        data["i"] = last_id
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[date, Optional[int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        last_id = data.get("i")
+        if last_id is not None and not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return date.fromisoformat(data["d"]), last_id
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
@@ -0,0 +1,283 @@
+import asyncio
+import contextlib
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from api.core.settings import Settings
+
+
+logger = logging.getLogger(__name__)
+
+# Settings defaults until configure_profiling() applies the app's Settings.
+profile_token = Settings.profile_token
+profile_calls_limit = Settings.profile_calls_limit
+
+PHASES = ("cache", "snapshot", "pool_wait", "db", "mapping", "validation", "encoding")
+
+
+class Phases:
+    """Seconds and call counts per phase of one profiled request"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        entries = [
+            f'{name};dur={self.seconds[name] * 1000:.3f};desc="{self.counts[name]}x"'
+            for name in PHASES if name in self.seconds
+        ]
+        entries.append(f"app;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_phases: ContextVar[Optional[Phases]] = ContextVar("profile_phases", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """Add to the current request's phase, if it is being profiled"""
+    phases = _phases.get()
+    if phases is not None:
+        phases.add(name, seconds)
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.add(name, time.perf_counter() - started)
+
+
+class SlowQueryLog:
+    """The last `size` statements that took longer than `threshold`.
+
+    Each entry keeps the statement text, its parameters and, for
+    SELECTs, the EXPLAIN plan with the same parameters. The plan is
+    taken by a background task on another pooled connection, so the
+    request that ran the statement does not wait for it; the entry's
+    "plan" stays None until then, and at most PENDING_MAX plans are
+    taken at a time. The entries are also logged.
+    """
+
+    STATEMENT_MAX = 4000
+    PARAMETER_MAX = 200
+    PENDING_MAX = 2
+
+    def __init__(self, threshold: float, size: int, explain: bool = True):
+        self.threshold = threshold
+        self.explain = explain
+        self.entries: deque = deque(maxlen=size)
+        self.pending: Set[asyncio.Task] = set()
+
+    def _explainable(self, statement: str, executemany: bool) -> bool:
+        if not self.explain or executemany or len(self.pending) >= self.PENDING_MAX:
+            return False
+        verb = statement.lstrip()[:6].upper()
+        return verb.startswith("SELECT") or verb.startswith("WITH")
+
+    def _schedule_plan(self, sync_engine, entry: Dict, statement: str, parameters) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._plan(sync_engine, entry, statement, parameters))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+
+    async def _plan(self, sync_engine, entry: Dict, statement: str, parameters) -> None:
+        # The task copied the request's context; its EXPLAIN is not
+        # part of that request's profile.
+        _phases.set(None)
+        try:
+            async with AsyncEngine(sync_engine).connect() as conn:
+                result = await conn.exec_driver_sql(
+                    "EXPLAIN " + statement, parameters, execution_options={"slow_query_plan": True},
+                )
+                entry["plan"] = [row[0] for row in result.fetchall()]
+        except Exception:
+            logger.debug("EXPLAIN of a slow query failed", exc_info=True)
+            return
+        logger.warning("Plan of the slow query %s:\n%s", entry["query"] or "", "\n".join(entry["plan"]))
+
+    async def drain(self) -> None:
+        """Wait for the plans being taken"""
+        await asyncio.gather(*self.pending, return_exceptions=True)
+
+    def observe(self, conn, statement: str, parameters, context, executemany: bool, seconds: float) -> None:
+        if not self.threshold or seconds < self.threshold:
+            return
+        if context is not None and context.execution_options.get("slow_query_plan"):
+            return
+        name = context.execution_options.get("query_name") if context is not None else None
+        if executemany:
+            shown = [f"{len(parameters)} parameter sets"]
+        else:
+            shown = [repr(p)[:self.PARAMETER_MAX] for p in parameters or ()]
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "seconds": round(seconds, 6),
+            "query": name,
+            "statement": statement[:self.STATEMENT_MAX],
+            "parameters": shown,
+            "plan": None,
+        }
+        self.entries.append(entry)
+        logger.warning(
+            "Slow query (%.3fs) %s: %s; parameters %s",
+            seconds, name or "", entry["statement"], entry["parameters"],
+        )
+        if self._explainable(statement, executemany):
+            self._schedule_plan(conn.engine, entry, statement, parameters)
+
+    def snapshot(self) -> Dict:
+        return {"threshold_seconds": self.threshold, "entries": list(self.entries)}
+
+
+slow_queries = SlowQueryLog(
+    Settings.slow_query_seconds, Settings.slow_query_log_size, Settings.slow_query_explain,
+)
+
+
+def configure_profiling(settings: Settings) -> None:
+    """Apply the profiling part of settings; called from the app lifespan"""
+    global profile_token, profile_calls_limit
+    profile_token = settings.profile_token
+    profile_calls_limit = settings.profile_calls_limit
+    slow_queries.threshold = settings.slow_query_seconds
+    slow_queries.explain = settings.slow_query_explain
+    slow_queries.entries = deque(slow_queries.entries, maxlen=settings.slow_query_log_size)
+
+
+def instrument_engine(sync_engine) -> None:
+    """Feed statement times to the profiled request's "db" phase and to
+    slow_queries"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["profile_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info.pop("profile_started")
+        record("db", seconds)
+        slow_queries.observe(conn, statement, parameters, context, executemany, seconds)
+
+
+class ProfilingMiddleware:
+    """Opt-in profiling of single requests.
+
+    Disabled unless profile_token (PROFILE_TOKEN) is set. A request
+    with the headers X-Profile-Token: <profile_token> and
+      X-Profile: phases - is served as usual, with a Server-Timing
+        header of the time spent per phase (PHASES) before the
+        response started;
+      X-Profile: calls - runs under cProfile and answers with the
+        profile_calls_limit functions of highest cumulative time
+        instead of the response body. cProfile sees everything the
+        event loop runs meanwhile, and only one such profile runs at a
+        time; concurrent ones get the phases mode.
+    Any other request, including one with a wrong token, is served as
+    usual.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiling_calls = False
+
+    def _mode(self, scope) -> Optional[bytes]:
+        if scope["type"] != "http" or not profile_token:
+            return None
+        mode = token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                mode = value
+            elif name == b"x-profile-token":
+                token = value
+        if mode not in (b"phases", b"calls") or token is None:
+            return None
+        if not hmac.compare_digest(token, profile_token.encode()):
+            return None
+        return mode
+
+    async def __call__(self, scope, receive, send):
+        mode = self._mode(scope)
+        if mode is None:
+            return await self.app(scope, receive, send)
+        phases = Phases()
+        reset = _phases.set(phases)
+        started = time.perf_counter()
+        try:
+            if mode == b"calls" and not self.profiling_calls:
+                self.profiling_calls = True
+                try:
+                    await self._profile_calls(scope, receive, send, phases, started)
+                finally:
+                    self.profiling_calls = False
+            else:
+                await self.app(scope, receive, self._with_server_timing(send, phases, started))
+        finally:
+            _phases.reset(reset)
+        logger.info(
+            "Profiled %s %s: %.1f ms, %s",
+            scope["method"], scope["path"], (time.perf_counter() - started) * 1000, phases.seconds,
+        )
+
+    @staticmethod
+    def _with_server_timing(send, phases: Phases, started: float):
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = phases.server_timing(time.perf_counter() - started)
+                message = dict(message, headers=[*message.get("headers", []), (b"server-timing", timing.encode())])
+            await send(message)
+        return send_with_timing
+
+    async def _profile_calls(self, scope, receive, send, phases: Phases, started: float) -> None:
+        status = []
+
+        async def discard(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.disable()
+        total = time.perf_counter() - started
+        out = io.StringIO()
+        out.write(f"{scope['method']} {scope['path']} -> {status[0] if status else '?'}\n")
+        out.write(f"Server-Timing: {phases.server_timing(total)}\n\n")
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(profile_calls_limit)
+        body = out.getvalue().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
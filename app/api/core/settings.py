@@ -0,0 +1,133 @@
+import functools
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+def _env(name: str, default: str = "") -> str:
+    return os.getenv(name, default)
+
+
+def _flag(name: str, default: str) -> bool:
+    return _env(name, default).lower() == "true"
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuration of the API: its external clients (DB pools,
+    Redis), the response cache, profiling and the snapshot.
+
+    Built once from the environment, and .env if present, by
+    get_settings() when the app starts, not at import time.
+    """
+
+    database_url: str
+    redis_url: str = "redis://host.docker.internal:6379"
+    replica_urls: Tuple[str, ...] = ()
+    replica_strategy: str = "round_robin"
+    replica_max_lag: float = 30.0
+    replica_check_interval: float = 10.0
+    workers: int = 1
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = False
+    pool_warm: int = 5
+    liveness_interval: float = 30.0
+    statement_cache_size: int = 100
+    prepared_statement_cache_size: int = 100
+    command_timeout: Optional[float] = None
+    cache_ttl: int = 24 * 60 * 60
+    cache_compress: bool = True
+    cache_compress_min_bytes: int = 4096
+    cache_compress_level: int = 6
+    cache_local_max_entries: int = 1024
+    cache_local_max_bytes: int = 64 * 1024 * 1024
+    cache_local_ttl: float = 60.0
+    generation_key: str = "cache:generation"
+    generation_channel: str = "cache:generation"
+    ingest_events_channel: str = "ingest:events"
+    generation_poll_interval: float = 30.0
+    profile_token: str = ""
+    profile_calls_limit: int = 40
+    slow_query_seconds: float = 0.5
+    slow_query_log_size: int = 50
+    slow_query_explain: bool = True
+    snapshot_days: int = 0
+    snapshot_retry_interval: float = 30.0
+    dynamics_stream_chunk: int = 1000
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Read the environment.
+
+        With DB_MAX_CONNECTIONS set, every worker (WEB_CONCURRENCY of
+        them) gets an equal share of that budget: a fixed-size pool of
+        the whole share unless DB_POOL_SIZE is set, and in any case no
+        more than the share for pool_size + max_overflow, so the workers
+        together never open more connections than the server allows for
+        the API. DB_POOL_WARM is capped the same way.
+        """
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        workers = max(1, int(_env("WEB_CONCURRENCY") or 1))
+        pool_size = int(_env("DB_POOL_SIZE") or 5)
+        max_overflow = int(_env("DB_MAX_OVERFLOW", "10"))
+        budget = int(_env("DB_MAX_CONNECTIONS") or 0)
+        if budget:
+            share = max(1, budget // workers)
+            if _env("DB_POOL_SIZE"):
+                pool_size = min(pool_size, share)
+                max_overflow = min(max_overflow, share - pool_size)
+            else:
+                pool_size, max_overflow = share, 0
+        pool_warm = min(int(_env("DB_POOL_WARM") or pool_size), pool_size + max_overflow)
+        database_url = _env("DATABASE_URL") or (
+            f"postgresql+asyncpg://{_env('POSTGRES_USER')}:{_env('POSTGRES_PASSWORD')}"
+            f"@{_env('DB_HOST')}:{_env('DB_PORT')}/{_env('POSTGRES_DB')}"
+        )
+        return cls(
+            database_url=database_url,
+            redis_url=_env("REDIS_URL", cls.redis_url),
+            replica_urls=tuple(u.strip() for u in _env("DB_REPLICA_URLS").split(",") if u.strip()),
+            replica_strategy=_env("DB_REPLICA_STRATEGY", cls.replica_strategy),
+            replica_max_lag=float(_env("DB_REPLICA_MAX_LAG", "30")),
+            replica_check_interval=float(_env("DB_REPLICA_CHECK_INTERVAL", "10")),
+            workers=workers,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=float(_env("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(_env("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=_flag("DB_POOL_PRE_PING", "false"),
+            pool_warm=pool_warm,
+            liveness_interval=float(_env("DB_LIVENESS_INTERVAL", "30")),
+            statement_cache_size=int(_env("DB_STATEMENT_CACHE_SIZE", "100")),
+            prepared_statement_cache_size=int(_env("DB_PREPARED_STATEMENT_CACHE_SIZE", "100")),
+            command_timeout=float(_env("DB_COMMAND_TIMEOUT") or 0) or None,
+            cache_ttl=int(_env("CACHE_TTL", str(cls.cache_ttl))),
+            cache_compress=_env("CACHE_COMPRESS", "gzip").lower() == "gzip",
+            cache_compress_min_bytes=int(_env("CACHE_COMPRESS_MIN_BYTES", "4096")),
+            cache_compress_level=int(_env("CACHE_COMPRESS_LEVEL", "6")),
+            cache_local_max_entries=int(_env("CACHE_LOCAL_MAX_ENTRIES", "1024")),
+            cache_local_max_bytes=int(_env("CACHE_LOCAL_MAX_BYTES", str(cls.cache_local_max_bytes))),
+            cache_local_ttl=float(_env("CACHE_LOCAL_TTL", "60")),
+            generation_key=_env("CACHE_GENERATION_KEY", cls.generation_key),
+            generation_channel=_env("CACHE_GENERATION_CHANNEL", cls.generation_channel),
+            ingest_events_channel=_env("INGEST_EVENTS_CHANNEL", cls.ingest_events_channel),
+            generation_poll_interval=float(_env("CACHE_GENERATION_POLL_INTERVAL", "30")),
+            profile_token=_env("PROFILE_TOKEN"),
+            profile_calls_limit=int(_env("PROFILE_CALLS_LIMIT", "40")),
+            slow_query_seconds=float(_env("SLOW_QUERY_SECONDS", "0.5")),
+            slow_query_log_size=int(_env("SLOW_QUERY_LOG_SIZE", "50")),
+            slow_query_explain=_flag("SLOW_QUERY_EXPLAIN", "true"),
+            snapshot_days=int(_env("SNAPSHOT_DAYS", "0")),
+            snapshot_retry_interval=float(_env("SNAPSHOT_RETRY_INTERVAL", "30")),
+            dynamics_stream_chunk=int(_env("DYNAMICS_STREAM_CHUNK", "1000")),
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings.from_env()
@@ -0,0 +1,87 @@
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from api.core.cache import generation
+from api.core.generation import GenerationTracker
+from api.core.settings import Settings
+
+if TYPE_CHECKING:
+    from api.core.trading_snapshot import TradingSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """Holds the current TradingSnapshot and reloads it on new data.
+
+    A snapshot is only served while the data generation it was loaded
+    at is current; after an ingest callers fall back to the DB until
+    the reload has replaced it in a single assignment.
+    """
+
+    def __init__(
+        self,
+        tracker: GenerationTracker,
+        days: int = Settings.snapshot_days,
+        retry_interval: float = Settings.snapshot_retry_interval,
+    ):
+        self.tracker = tracker
+        self.days = days
+        self.retry_interval = retry_interval
+        self.snapshot: Optional["TradingSnapshot"] = None
+
+    def current(self) -> Optional["TradingSnapshot"]:
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.generation == self.tracker.value:
+            return snapshot
+        return None
+
+    async def reload(self, engine: AsyncEngine) -> "TradingSnapshot":
+        # NumPy is only imported once a snapshot is actually loaded.
+        from api.core.trading_snapshot import TradingSnapshot
+
+        seen = self.tracker.value
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            snapshot = await TradingSnapshot.load(conn, self.days, seen)
+        self.snapshot = snapshot
+        logger.info(
+            "Snapshot loaded: %d rows since %s, %d array bytes", snapshot.size, snapshot.start, snapshot.nbytes
+        )
+        return snapshot
+
+    async def follow(self, engine: AsyncEngine) -> None:
+        """Load now and again after every generation change"""
+        with contextlib.suppress(Exception):
+            await self.tracker.refresh()
+        while True:
+            try:
+                snapshot = await self.reload(engine)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Snapshot load failed, retrying")
+                await asyncio.sleep(self.retry_interval)
+                continue
+            await self.tracker.wait_change(snapshot.generation)
+
+    def stats(self) -> Optional[Dict]:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        return {
+            "rows": snapshot.size,
+            "start": snapshot.start.isoformat(),
+            "complete": snapshot.complete,
+            "generation": snapshot.generation,
+            "current": snapshot is self.current(),
+            "array_bytes": snapshot.nbytes,
+        }
+
+
+snapshots = SnapshotStore(generation)
@@ -0,0 +1,178 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import asc, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from api.models.crud import TRADING_RESULT_COLUMNS
+from api.models.models import TradingResult
+
+
+FIELDS = tuple(c.name for c in TRADING_RESULT_COLUMNS)
+ENCODED = ("oil_id", "delivery_basis_id", "delivery_type_id")
+SnapshotRow = namedtuple("SnapshotRow", FIELDS)
+
+
+def _objects(values: Sequence) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _encode(values: Sequence) -> Tuple[np.ndarray, Dict, np.ndarray]:
+    """Codes, value -> code lookup and code -> value dictionary"""
+    lookup: Dict = {}
+    codes = np.fromiter(
+        (lookup.setdefault(v, len(lookup)) for v in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+    return codes, lookup, _objects(list(lookup))
+
+
+class TradingSnapshot:
+    """trading_results rows with date >= start, sorted by (date, id).
+
+    date and id are NumPy arrays used for binary search and masks;
+    oil_id, delivery_basis_id and delivery_type_id are int32 codes into
+    per-column dictionaries; the remaining columns are object arrays,
+    so returned rows hold the same values as the crud queries return.
+
+    Methods answer like the crud function of the same purpose, or
+    return None when the rows outside the snapshot could change the
+    answer and the DB has to be asked instead.
+    """
+
+    def __init__(self, rows: Sequence[Sequence], start: date, complete: bool, generation: int):
+        self.start = start
+        self.complete = complete
+        self.generation = generation
+        self.size = len(rows)
+        columns = dict(zip(FIELDS, zip(*rows))) if rows else {name: () for name in FIELDS}
+        self.dates = np.array(columns["date"], dtype="datetime64[D]")
+        self.ids = np.array(columns["id"], dtype=np.int64)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.lookups: Dict[str, Dict] = {}
+        self.dictionaries: Dict[str, np.ndarray] = {}
+        for name in ENCODED:
+            self.codes[name], self.lookups[name], self.dictionaries[name] = _encode(columns[name])
+        self.values = {
+            name: _objects(columns[name])
+            for name in FIELDS if name not in ENCODED and name not in ("date", "id")
+        }
+
+    @classmethod
+    async def load(cls, conn: AsyncConnection, days: int, generation: int) -> "TradingSnapshot":
+        """Last `days` calendar days up to the newest trading date"""
+        oldest, newest = (await conn.execute(
+            select(func.min(TradingResult.date), func.max(TradingResult.date))
+        )).one()
+        if newest is None:
+            return cls([], start=date.min, complete=True, generation=generation)
+        start = newest - timedelta(days=days - 1)
+        rows = (await conn.execute(
+            select(*TRADING_RESULT_COLUMNS)
+            .where(TradingResult.date >= start)
+            .order_by(asc(TradingResult.date), asc(TradingResult.id))
+        )).all()
+        return cls(rows, start=start, complete=oldest >= start, generation=generation)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.dates, self.ids, *self.codes.values(), *self.values.values()]
+        return sum(a.nbytes for a in arrays)
+
+    def covers(self, day: date) -> bool:
+        return self.complete or day >= self.start
+
+    def _bound(self, day: date, side: str) -> int:
+        return int(np.searchsorted(self.dates, np.datetime64(day, "D"), side=side))
+
+    def _select(self, lo: int, hi: int, filters: Dict[str, Optional[str]]) -> np.ndarray:
+        """Indices in [lo, hi) matching the equality filters"""
+        mask = np.ones(max(hi - lo, 0), dtype=bool)
+        for name, value in filters.items():
+            if not value:
+                continue
+            code = self.lookups[name].get(value)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.codes[name][lo:hi] == code
+        return lo + np.flatnonzero(mask)
+
+    def _rows(self, idx: np.ndarray) -> List[SnapshotRow]:
+        columns = []
+        for name in FIELDS:
+            if name == "date":
+                columns.append(self.dates[idx].tolist())
+            elif name == "id":
+                columns.append(self.ids[idx].tolist())
+            elif name in self.codes:
+                columns.append(self.dictionaries[name][self.codes[name][idx]])
+            else:
+                columns.append(self.values[name][idx])
+        return [SnapshotRow._make(row) for row in zip(*columns)]
+
+    def distinct_dates(
+        self,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        before: Optional[date] = None,
+    ) -> Optional[List[date]]:
+        hi = self.size if before is None else self._bound(before, "left")
+        idx = self._select(0, hi, {
+            "oil_id": oil_id,
+            "delivery_type_id": delivery_type_id,
+            "delivery_basis_id": delivery_basis_id,
+        })
+        dates = np.unique(self.dates[idx])[::-1]
+        if not self.complete and (limit is None or len(dates) < limit):
+            return None
+        return dates[:limit].tolist()
+
+    def latest(
+        self,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        before: Optional[Tuple[date, int]] = None,
+    ) -> Optional[List[SnapshotRow]]:
+        filters = {
+            "oil_id": oil_id,
+            "delivery_type_id": delivery_type_id,
+            "delivery_basis_id": delivery_basis_id,
+        }
+        if before is not None:
+            day, before_id = before
+            if not self.covers(day):
+                return None
+            idx = self._select(self._bound(day, "left"), self._bound(day, "right"), filters)
+            idx = idx[self.ids[idx] < before_id]
+        else:
+            idx = self._select(0, self.size, filters)
+            if not len(idx):
+                return [] if self.complete else None
+            idx = idx[self.dates[idx] == self.dates[idx[-1]]]
+        return self._rows(idx[::-1][:limit])
+
+    def date_range(
+        self,
+        start_date: date,
+        end_date: date,
+        oil_id: Optional[str] = None,
+        delivery_type_id: Optional[str] = None,
+        delivery_basis_id: Optional[str] = None,
+    ) -> Optional[List[SnapshotRow]]:
+        if not self.covers(start_date):
+            return None
+        idx = self._select(self._bound(start_date, "left"), self._bound(end_date, "right"), {
+            "oil_id": oil_id,
+            "delivery_type_id": delivery_type_id,
+            "delivery_basis_id": delivery_basis_id,
+        })
+        return self._rows(idx)
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from decimal import Decimal
-from typing import List
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field, ConfigDict
 from typing_extensions import Annotated
@@ -8,6 +8,7 @@ from typing_extensions import Annotated
 
 class LastTradingDatesResponse(BaseModel):
     dates: Annotated[List[date], Field(description="Список дат последних торговых дней")]
+    next_cursor: Annotated[Optional[str], Field(description="Курсор следующей страницы")] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -38,5 +39,29 @@ class DynamicsResponse(BaseModel):
 
 class TradingResultsResponse(BaseModel):
     results: Annotated[List[TradingResultDetail], Field(description="Список результатов последних торгов")]
+    next_cursor: Annotated[Optional[str], Field(description="Курсор следующей страницы")] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+AggregatePeriod = Literal["day", "week", "month"]
+AggregateDimension = Literal["oil_id", "delivery_basis_id", "delivery_type_id"]
+
+
+class AggregateRow(BaseModel):
+    period_start: Annotated[date, Field(description="Начало периода (день, понедельник недели или первое число месяца)")]
+    oil_id: Annotated[Optional[str], Field(description="Идентификатор сырья")] = None
+    delivery_basis_id: Annotated[Optional[str], Field(description="Идентификатор условий поставки")] = None
+    delivery_type_id: Annotated[Optional[str], Field(description="Тип поставки")] = None
+    volume: Annotated[Decimal, Field(description="Объем торгов")]
+    total: Annotated[Decimal, Field(description="Общая сумма торгов")]
+    count: Annotated[int, Field(description="Количество сделок")]
+    avg_price: Annotated[Optional[Decimal], Field(description="Средневзвешенная цена (total / volume)")] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AggregateResponse(BaseModel):
+    period: Annotated[AggregatePeriod, Field(description="Период группировки")]
+    group_by: Annotated[List[AggregateDimension], Field(description="Поля группировки")]
+    rows: Annotated[List[AggregateRow], Field(description="Агрегаты за период")]
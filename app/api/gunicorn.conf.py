@@ -0,0 +1,20 @@
+"""Production launch: gunicorn -c api/gunicorn.conf.py api.main:app
+
+Several Uvicorn workers, no reload, the app imported once in the master
+(preload_app) and forked. Importing the app opens no connections; every
+worker creates its own DB pools and Redis client in the lifespan.
+"""
+import os
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+# Settings.from_env() divides DB_MAX_CONNECTIONS between this many workers.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:80")
+preload_app = True
+reload = False
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
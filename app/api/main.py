@@ -1,12 +1,72 @@
+import asyncio
+import contextlib
+import logging
+
 from fastapi import FastAPI
 
-from .routers import last_trading_dates, dynamics, trading_results
+from .core.cache import close_redis, configure_cache, generation, init_redis
+from .core.metrics import MetricsMiddleware
+from .core.profiling import ProfilingMiddleware, configure_profiling, slow_queries
+from .core.settings import get_settings
+from .core.snapshot import snapshots
+from .models import db
+from .routers import (
+    last_trading_dates, dynamics, trading_results, cache, aggregates, export, database, metrics,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the external clients from one Settings object and start
+    the background tasks; importing the app opens no connections"""
+    settings = get_settings()
+    app.state.settings = settings
+    configure_cache(settings)
+    configure_profiling(settings)
+    snapshots.days = settings.snapshot_days
+    snapshots.retry_interval = settings.snapshot_retry_interval
+    init_redis(settings.redis_url)
+    try:
+        # Without it, requests until the listener's first read would
+        # use generation 0 keys, possibly left in Redis by old workers.
+        await generation.refresh()
+    except Exception:
+        logger.warning("Could not read the cache generation", exc_info=True)
+    engine = db.init_db(settings)
+    try:
+        await db.warm_pool(engine, settings.pool_warm)
+    except Exception:
+        logger.warning("Could not warm the DB pool", exc_info=True)
+    tasks = [asyncio.create_task(generation.listen())]
+    if settings.liveness_interval > 0:
+        tasks.append(asyncio.create_task(db.check_liveness(engine, settings.liveness_interval)))
+    if db.read_router.replicas:
+        tasks.append(asyncio.create_task(db.read_router.follow(generation)))
+    if snapshots.days > 0:
+        tasks.append(asyncio.create_task(snapshots.follow(engine)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await slow_queries.drain()
+        await db.close_db()
+        await close_redis()
 
 
 app = FastAPI(
     title="SPIMEX Trading Results API",
     version="1.0.0",
+    lifespan=lifespan,
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 app.include_router(
     last_trading_dates.router,
@@ -18,8 +78,33 @@ app.include_router(
     prefix="",
     tags=["Dynamics"],
 )
+app.include_router(
+    export.router,
+    prefix="",
+    tags=["Export"],
+)
+app.include_router(
+    aggregates.router,
+    prefix="",
+    tags=["Aggregates"],
+)
 app.include_router(
     trading_results.router,
     prefix="",
     tags=["Trading Results"],
 )
+app.include_router(
+    cache.router,
+    prefix="",
+    tags=["Cache"],
+)
+app.include_router(
+    database.router,
+    prefix="",
+    tags=["Database"],
+)
+app.include_router(
+    metrics.router,
+    prefix="",
+    tags=["Metrics"],
+)
@@ -1,10 +1,27 @@
+import time
 from datetime import date
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
-from sqlalchemy import select, func, desc, asc
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Date, Numeric, Row, select, func, desc, asc, cast
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
-from .models import TradingResult
+from api.core.metrics import observe_query
+
+from .models import TradingResult, TradingResultDaily
+
+
+# Plain column tuples instead of ORM entities: no identity map or
+# attribute instrumentation per row on the read paths.
+TRADING_RESULT_COLUMNS = tuple(TradingResult.__table__.columns)
+
+# volume and total are unconstrained NUMERIC; the columnar export gives
+# them this fixed precision and scale (Arrow decimal128), exact for any
+# value with up to 32 integer and 6 fractional digits.
+EXPORT_NUMERIC = Numeric(38, 6)
+COPY_COLUMNS = tuple(
+    cast(c, EXPORT_NUMERIC).label(c.name) if c.name in ("volume", "total") else c
+    for c in TRADING_RESULT_COLUMNS
+)
 
 
 async def get_distinct_dates(
@@ -12,6 +29,8 @@ async def get_distinct_dates(
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
+    limit: Optional[int] = None,
+    before: Optional[date] = None,
 ) -> List[date]:
     stmt = select(TradingResult.date).distinct()
     if oil_id:
@@ -20,33 +39,119 @@ async def get_distinct_dates(
         stmt = stmt.where(TradingResult.delivery_type_id == delivery_type_id)
     if delivery_basis_id:
         stmt = stmt.where(TradingResult.delivery_basis_id == delivery_basis_id)
+    if before is not None:
+        stmt = stmt.where(TradingResult.date < before)
     stmt = stmt.order_by(desc(TradingResult.date))
+    if limit is not None:
+        stmt = stmt.limit(limit)
 
-    rows = await session.execute(stmt)
+    # Each crud function names its statements (query_name), the label of
+    # the db_query_* metrics.
+    rows = await session.execute(stmt.execution_options(query_name="get_distinct_dates"))
     return [r[0] for r in rows.fetchall()]
 
 
-async def get_trading_results_by_date_range(
-    session: AsyncSession,
+def _date_range_filters(
     start_date: date,
     end_date: date,
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
-) -> List[TradingResult]:
-    stmt = select(TradingResult).where(
-        TradingResult.date.between(start_date, end_date)
-    )
+) -> list:
+    filters = [TradingResult.date.between(start_date, end_date)]
     if oil_id:
-        stmt = stmt.where(TradingResult.oil_id == oil_id)
+        filters.append(TradingResult.oil_id == oil_id)
     if delivery_type_id:
-        stmt = stmt.where(TradingResult.delivery_type_id == delivery_type_id)
+        filters.append(TradingResult.delivery_type_id == delivery_type_id)
     if delivery_basis_id:
-        stmt = stmt.where(TradingResult.delivery_basis_id == delivery_basis_id)
-    stmt = stmt.order_by(asc(TradingResult.date))
+        filters.append(TradingResult.delivery_basis_id == delivery_basis_id)
+    return filters
+
+
+async def get_trading_results_by_date_range(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+) -> List[Row]:
+    stmt = (
+        select(*TRADING_RESULT_COLUMNS)
+        .where(*_date_range_filters(
+            start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+        ))
+        .order_by(asc(TradingResult.date), asc(TradingResult.id))
+        .execution_options(query_name="get_trading_results_by_date_range")
+    )
 
     rows = await session.execute(stmt)
-    return rows.scalars().all()
+    return rows.all()
+
+
+async def stream_trading_results_by_date_range(
+    conn: AsyncConnection,
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> AsyncIterator[list]:
+    """Same rows as get_trading_results_by_date_range, as plain Row
+    chunks read from a server-side cursor"""
+    stmt = (
+        select(*TRADING_RESULT_COLUMNS)
+        .where(*_date_range_filters(
+            start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+        ))
+        .order_by(asc(TradingResult.date), asc(TradingResult.id))
+        .execution_options(
+            yield_per=chunk_size, query_name="stream_trading_results_by_date_range"
+        )
+    )
+    result = await conn.stream(stmt)
+    async for chunk in result.partitions(chunk_size):
+        yield chunk
+
+
+async def copy_trading_results_by_date_range(
+    conn: AsyncConnection,
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+) -> bytes:
+    """Same rows as get_trading_results_by_date_range as COPY CSV output
+    (table column order, no header, volume and total as EXPORT_NUMERIC),
+    without building row objects"""
+    stmt = (
+        select(*COPY_COLUMNS)
+        .where(*_date_range_filters(
+            start_date, end_date, oil_id, delivery_type_id, delivery_basis_id
+        ))
+        .order_by(asc(TradingResult.date), asc(TradingResult.id))
+    )
+    compiled = stmt.compile(dialect=conn.dialect)
+    args = [compiled.params[name] for name in compiled.positiontup]
+    chunks = []
+
+    async def collect(chunk: bytes) -> None:
+        chunks.append(chunk)
+
+    raw = await conn.get_raw_connection()
+    # COPY runs on the driver connection, past the engine's events.
+    started = time.perf_counter()
+    status = await raw.driver_connection.copy_from_query(
+        compiled.string, *args, output=collect, format="csv"
+    )
+    observe_query(
+        "copy_trading_results_by_date_range",
+        time.perf_counter() - started,
+        int(status.split()[-1]) if status else None,
+    )
+    return b"".join(chunks)
 
 
 async def get_latest_trading_results(
@@ -54,7 +159,14 @@ async def get_latest_trading_results(
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
-) -> List[TradingResult]:
+    limit: Optional[int] = None,
+    before: Optional[Tuple[date, int]] = None,
+) -> List[Row]:
+    """Rows of the latest trading date, newest id first.
+
+    With `before` (a (date, id) keyset from the previous page) the page
+    continues on that date instead of re-resolving the latest one.
+    """
     filters = []
     if oil_id:
         filters.append(TradingResult.oil_id == oil_id)
@@ -63,14 +175,76 @@ async def get_latest_trading_results(
     if delivery_basis_id:
         filters.append(TradingResult.delivery_basis_id == delivery_basis_id)
 
-    max_date = (await session.execute(
-        select(func.max(TradingResult.date)).where(*filters)
-    )).scalar_one()
+    if before is not None:
+        before_date, before_id = before
+        filters.append(TradingResult.date == before_date)
+        filters.append(TradingResult.id < before_id)
+    else:
+        max_date = (
+            select(func.max(TradingResult.date))
+            .where(*filters)
+            .scalar_subquery()
+        )
+        filters.append(TradingResult.date == max_date)
 
     stmt = (
-        select(TradingResult)
-        .where(TradingResult.date == max_date, *filters)
+        select(*TRADING_RESULT_COLUMNS)
+        .where(*filters)
         .order_by(desc(TradingResult.id))
     )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    rows = await session.execute(stmt.execution_options(query_name="get_latest_trading_results"))
+    return rows.all()
+
+
+AGGREGATE_DIMENSIONS = ('oil_id', 'delivery_basis_id', 'delivery_type_id')
+
+
+async def get_aggregates(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    period: str = 'day',
+    group_by: Sequence[str] = (),
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+):
+    """Sums of volume/total/count per period and group_by columns.
+
+    Read from the daily rollup. Week and month buckets start on the
+    Monday / first of the month, and only days in the range count.
+    """
+    daily = TradingResultDaily
+    if period == 'day':
+        bucket = daily.date
+    else:
+        bucket = cast(func.date_trunc(period, daily.date), Date)
+    bucket = bucket.label('period_start')
+    dimensions = [getattr(daily, name) for name in group_by]
+    volume = func.sum(daily.volume)
+    total = func.sum(daily.total)
+
+    stmt = select(
+        bucket,
+        *dimensions,
+        volume.label('volume'),
+        total.label('total'),
+        func.sum(daily.count).label('count'),
+        func.round(total / func.nullif(volume, 0), 4).label('avg_price'),
+    ).where(daily.date.between(start_date, end_date))
+    if oil_id:
+        stmt = stmt.where(daily.oil_id == oil_id)
+    if delivery_type_id:
+        stmt = stmt.where(daily.delivery_type_id == delivery_type_id)
+    if delivery_basis_id:
+        stmt = stmt.where(daily.delivery_basis_id == delivery_basis_id)
+    stmt = (
+        stmt.group_by(bucket, *dimensions)
+        .order_by(bucket, *dimensions)
+        .execution_options(query_name="get_aggregates")
+    )
+
     rows = await session.execute(stmt)
-    return rows.scalars().all()
+    return rows.all()
@@ -1,36 +1,410 @@
-import os
-from pathlib import Path
-from typing import AsyncGenerator
+import asyncio
+import bisect
+import contextlib
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncGenerator, Dict, List, Optional
 
-from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import exc, make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from api.core import metrics, profiling
+from api.core.settings import Settings, get_settings
 
-load_dotenv()
+if TYPE_CHECKING:
+    from api.core.generation import GenerationTracker
 
-DB_USER = os.getenv("POSTGRES_USER")
-DB_PASS = os.getenv("POSTGRES_PASSWORD")
-DB_NAME = os.getenv("POSTGRES_DB")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
 
-ASYNC_DATABASE_URL = (
-    f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+logger = logging.getLogger(__name__)
 
-engine = create_async_engine(
-    ASYNC_DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args={"ssl": False},
-)
+
+class PoolStats:
+    """Checkout counts and time spent waiting for a pooled connection"""
+
+    BUCKETS = metrics.POOL_WAIT_BUCKETS
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        self.wait_buckets[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_buckets": dict(zip([*map(str, self.BUCKETS), "+Inf"], self.wait_buckets)),
+        }
+
+
+# Seconds spent opening new connections during the current checkout
+_connecting: ContextVar[Optional[list]] = ContextVar("pool_connecting", default=None)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait times in its own stats.
+
+    Only the wait for a free connection counts: the time to open a new
+    one (TCP, TLS, auth) when the pool grows is left out. The stats
+    survive engine.dispose(), which recreates the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        connecting = [0.0]
+        token = _connecting.set(connecting)
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            _connecting.reset(token)
+            waited = max(time.perf_counter() - started - connecting[0], 0.0)
+            self.stats.observe(waited)
+            profiling.record("pool_wait", waited)
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            connecting = _connecting.get()
+            if connecting is not None:
+                connecting[0] += time.perf_counter() - started
+
+
+def make_engine(
+    url: Optional[str] = None, settings: Optional[Settings] = None, **options
+) -> AsyncEngine:
+    """Engine with the pool and driver settings of `settings`.
+
+    pool_pre_ping is off by default: it costs a round trip on every
+    checkout, and check_liveness() covers dead connections instead.
+    Keyword options override the settings.
+    """
+    settings = settings or get_settings()
+    connect_args = {
+        "ssl": False,
+        "statement_cache_size": settings.statement_cache_size,
+        "prepared_statement_cache_size": settings.prepared_statement_cache_size,
+    }
+    if settings.command_timeout:
+        connect_args["command_timeout"] = settings.command_timeout
+    connect_args.update(options.pop("connect_args", {}))
+    engine_options = dict(
+        poolclass=InstrumentedPool,
+        pool_size=settings.pool_size,
+        max_overflow=settings.max_overflow,
+        pool_timeout=settings.pool_timeout,
+        pool_recycle=settings.pool_recycle,
+        pool_pre_ping=settings.pool_pre_ping,
+    )
+    engine_options.update(options)
+    db_engine = create_async_engine(
+        url or settings.database_url, connect_args=connect_args, **engine_options
+    )
+    metrics.instrument_engine(db_engine.sync_engine)
+    profiling.instrument_engine(db_engine.sync_engine)
+    return db_engine
+
+
+def pool_status(db_engine: AsyncEngine) -> Dict:
+    pool = db_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        **pool.stats.snapshot(),
+    }
+
+
+async def warm_pool(db_engine: AsyncEngine, size: int) -> int:
+    """Open `size` connections at once and return them to the pool"""
+    connections = [db_engine.connect() for _ in range(size)]
+    results = await asyncio.gather(*(c.start() for c in connections), return_exceptions=True)
+    for conn in connections:
+        await conn.close()
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        raise errors[0]
+    return size
+
+
+async def check_liveness(db_engine: AsyncEngine, interval: float) -> None:
+    """Run SELECT 1 on a pooled connection every interval seconds.
+
+    When it fails the pooled connections are dropped, so requests after
+    a DB restart get fresh ones instead of each finding a dead one.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with db_engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("DB liveness check failed, dropping pooled connections", exc_info=True)
+            await db_engine.dispose()
+
+
+# Lag in seconds (0 when everything received is replayed, or when the
+# server is not a standby) and whether replay has reached the primary
+# WAL position taken at the start of the check.
+REPLICA_STATUS_SQL = """
+SELECT
+    CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag,
+    NOT pg_is_in_recovery()
+        OR COALESCE(pg_last_wal_replay_lsn() >= CAST(CAST(:lsn AS text) AS pg_lsn), true) AS caught_up
+"""
+
+
+class Replica:
+    def __init__(self, url: str, db_engine: AsyncEngine):
+        self.url = url
+        self.engine = db_engine
+        self.lag: Optional[float] = None
+        self.caught_up = False
+        self.error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return make_url(self.url).render_as_string(hide_password=True)
+
+    def status(self) -> Dict:
+        return {
+            "url": self.name,
+            "lag_seconds": self.lag,
+            "caught_up": self.caught_up,
+            "error": self.error,
+            "checked_out": self.engine.pool.checkedout(),
+            "pool": pool_status(self.engine),
+        }
+
+
+class ReadRouter:
+    """Picks the engine for read-only sessions.
+
+    Replicas are used only if the last check found them within max_lag
+    seconds and replayed up to the primary's WAL position, and only
+    while the data generation seen at that check is still current: after
+    an ingest reads go to the primary until a new check shows the
+    replica has the new rows, so no stale result is cached under the
+    new generation. With no usable replica the primary is returned.
+    """
+
+    STRATEGIES = ("round_robin", "least_connections")
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: List[Replica],
+        strategy: str = "round_robin",
+        max_lag: float = 30.0,
+        interval: float = 10.0,
+    ):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown DB_REPLICA_STRATEGY {strategy!r}")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.interval = interval
+        self.tracker: Optional["GenerationTracker"] = None
+        self.generation: Optional[int] = None
+        self._turn = itertools.count()
+
+    def healthy(self) -> List[Replica]:
+        if self.tracker is None or self.generation != self.tracker.value:
+            return []
+        return [
+            r for r in self.replicas
+            if r.error is None and r.caught_up and r.lag is not None and r.lag <= self.max_lag
+        ]
+
+    def pick(self) -> AsyncEngine:
+        candidates = self.healthy()
+        if not candidates:
+            return self.primary
+        if self.strategy == "least_connections":
+            return min(candidates, key=lambda r: r.engine.pool.checkedout()).engine
+        return candidates[next(self._turn) % len(candidates)].engine
+
+    async def check(self) -> None:
+        seen = self.tracker.value if self.tracker is not None else None
+        lsn = None
+        try:
+            async with self.primary.connect() as conn:
+                lsn = (await conn.exec_driver_sql("SELECT pg_current_wal_lsn()::text")).scalar_one()
+        except Exception:
+            logger.warning("Could not read the primary WAL position", exc_info=True)
+        await asyncio.gather(*(self._check_replica(r, lsn) for r in self.replicas))
+        self.generation = seen
+
+    async def _check_replica(self, replica: Replica, lsn: Optional[str]) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                row = (await conn.execute(text(REPLICA_STATUS_SQL), {"lsn": lsn})).one()
+        except Exception as e:
+            replica.error = f"{type(e).__name__}: {e}"
+            logger.warning("Replica %s check failed: %s", replica.name, replica.error)
+            return
+        replica.lag = float(row.lag)
+        replica.caught_up = bool(row.caught_up)
+        replica.error = None
+
+    async def follow(self, tracker: "GenerationTracker") -> None:
+        """Check every interval seconds and right after each generation change"""
+        self.tracker = tracker
+        while True:
+            seen = tracker.value
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Replica check failed")
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(tracker.wait_change(seen), self.interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def status(self) -> Dict:
+        return {
+            "strategy": self.strategy,
+            "max_lag_seconds": self.max_lag,
+            "healthy": len(self.healthy()),
+            "replicas": [r.status() for r in self.replicas],
+        }
+
+
+# Created by init_db() from the app lifespan, not at import time.
+engine: Optional[AsyncEngine] = None
+read_router: Optional[ReadRouter] = None
 AsyncSessionLocal = sessionmaker(
-    bind=engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
+
+def init_db(settings: Settings) -> AsyncEngine:
+    """Create the primary engine and the replica router"""
+    global engine, read_router
+    engine = make_engine(settings=settings)
+    replicas = [Replica(url, make_engine(url, settings)) for url in settings.replica_urls]
+    read_router = ReadRouter(
+        engine,
+        replicas,
+        strategy=settings.replica_strategy,
+        max_lag=settings.replica_max_lag,
+        interval=settings.replica_check_interval,
+    )
+    return engine
+
+
+async def close_db() -> None:
+    global engine, read_router
+    if read_router is not None:
+        await read_router.dispose()
+    if engine is not None:
+        await engine.dispose()
+    engine = read_router = None
+
+
+@metrics.registry.collector
+def collect_pool_metrics() -> None:
+    engines = []
+    if engine is not None:
+        engines.append(("primary", engine))
+    if read_router is not None:
+        engines.extend((replica.name, replica.engine) for replica in read_router.replicas)
+    for name, db_engine in engines:
+        status = pool_status(db_engine)
+        for state in ("checked_out", "idle", "overflow"):
+            metrics.db_pool_connections.set(name, state, value=status[state])
+        stats = db_engine.pool.stats
+        metrics.db_pool_wait_seconds.set_counts(stats.wait_buckets, stats.wait_seconds_total, name)
+        metrics.db_pool_timeouts.set(name, value=stats.timeouts)
+
+
+def primary_engine() -> AsyncEngine:
+    if engine is None:
+        raise RuntimeError("DB engine is not initialised: init_db() runs in the app lifespan")
+    return engine
+
+
+def read_engine() -> AsyncEngine:
+    """Engine for a read-only query: a healthy replica or the primary"""
+    if read_router is None:
+        raise RuntimeError("DB engine is not initialised: init_db() runs in the app lifespan")
+    return read_router.pick()
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    """Dependency to get DB session"""
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+    """Dependency to get a read-only DB session (replica when healthy)"""
+    async with AsyncSessionLocal(bind=read_engine()) as session:
+        yield session
+
+
+class LazySession:
+    """Opens the DB session on first use only"""
+
+    def __init__(self):
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    async def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = AsyncSessionLocal(bind=read_engine())
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def get_lazy_session() -> AsyncGenerator[LazySession, None]:
+    """Dependency to get DB session lazily, e.g. only on a cache miss"""
+    lazy = LazySession()
+    try:
+        yield lazy
+    finally:
+        await lazy.close()
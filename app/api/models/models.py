@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Numeric, Text, Date, DateTime
+from sqlalchemy import BigInteger, Column, Integer, Numeric, Text, Date, DateTime, Index
 from sqlalchemy.orm import declarative_base
 
 
@@ -6,7 +6,35 @@ Base = declarative_base()
 
 
 class TradingResult(Base):
+    """Schema is owned by scripts/migrations.
+
+    The table is range-partitioned by month on date and its primary key
+    is (id, date); id alone stays unique (one sequence) and is the ORM
+    identity. Indexes mirror 0003 and 0004; (date, exchange_product_id,
+    delivery_basis_id) is the unique natural key the scraper upserts on.
+    """
     __tablename__ = 'trading_results'
+    __table_args__ = (
+        Index('ix_trading_results_date_id', 'date', 'id'),
+        Index(
+            'ix_trading_results_oil_id_date', 'oil_id', 'date', 'id',
+            postgresql_include=['delivery_basis_id', 'delivery_type_id'],
+        ),
+        Index(
+            'ix_trading_results_delivery_basis_id_date', 'delivery_basis_id', 'date', 'id',
+            postgresql_include=['oil_id', 'delivery_type_id'],
+        ),
+        Index(
+            'ix_trading_results_delivery_type_id_date', 'delivery_type_id', 'date', 'id',
+            postgresql_include=['oil_id', 'delivery_basis_id'],
+        ),
+        Index(
+            'uq_trading_results_date_product_basis',
+            'date', 'exchange_product_id', 'delivery_basis_id',
+            unique=True,
+        ),
+        {'postgresql_partition_by': 'RANGE (date)'},
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     exchange_product_id = Column(Text)
     exchange_product_name = Column(Text)
@@ -17,6 +45,19 @@ class TradingResult(Base):
     volume = Column(Numeric)
     total = Column(Numeric)
     count = Column(Integer)
-    date = Column(Date)
+    date = Column(Date, nullable=False)
     created_on = Column(DateTime)
     updated_on = Column(DateTime)
+
+
+class TradingResultDaily(Base):
+    """Daily sums per oil/basis/type, maintained by the scraper (0005)"""
+    __tablename__ = 'trading_results_daily'
+    date = Column(Date, primary_key=True)
+    oil_id = Column(Text, primary_key=True)
+    delivery_basis_id = Column(Text, primary_key=True)
+    delivery_type_id = Column(Text, primary_key=True)
+    volume = Column(Numeric, nullable=False)
+    total = Column(Numeric, nullable=False)
+    count = Column(BigInteger, nullable=False)
+    rows = Column(Integer, nullable=False)
@@ -0,0 +1,36 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from api.core.cache import cache_response
+from api.routers.services import get_aggregates_service
+from api.entities.schemas import AggregateDimension, AggregatePeriod, AggregateResponse
+from api.models.db import LazySession, get_lazy_session
+
+
+router = APIRouter()
+
+@router.get("/dynamics/aggregate", response_model=AggregateResponse)
+@cache_response("aggregate")
+async def get_aggregates(
+    start_date: date,
+    end_date: date,
+    period: AggregatePeriod = "day",
+    group_by: List[AggregateDimension] = Query([]),
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    lazy_session: LazySession = Depends(get_lazy_session),
+):
+    session = await lazy_session.get()
+    return await get_aggregates_service(
+        session=session,
+        start_date=start_date,
+        end_date=end_date,
+        period=period,
+        group_by=group_by,
+        oil_id=oil_id,
+        delivery_type_id=delivery_type_id,
+        delivery_basis_id=delivery_basis_id,
+    )
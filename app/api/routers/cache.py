@@ -0,0 +1,22 @@
+from typing import Dict
+
+from fastapi import APIRouter
+
+from api.core.cache import cache_stats, generation, local_cache
+from api.core.snapshot import snapshots
+
+
+router = APIRouter()
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> Dict:
+    return {
+        "generation": generation.value,
+        "last_ingest": generation.last_ingest,
+        "prefixes": cache_stats.snapshot(),
+        "local": {
+            "entries": len(local_cache),
+            "bytes": local_cache.size_bytes,
+        },
+        "snapshot": snapshots.stats(),
+    }
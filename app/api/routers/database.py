@@ -0,0 +1,24 @@
+from typing import Dict
+
+from fastapi import APIRouter
+
+from api.core.profiling import slow_queries
+from api.models import db
+from api.models.db import pool_status, primary_engine
+
+
+router = APIRouter()
+
+@router.get("/db/pool")
+async def get_pool_status() -> Dict:
+    return pool_status(primary_engine())
+
+
+@router.get("/db/replicas")
+async def get_replicas() -> Dict:
+    return db.read_router.status()
+
+
+@router.get("/db/slow-queries")
+async def get_slow_queries() -> Dict:
+    return slow_queries.snapshot()
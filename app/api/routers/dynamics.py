@@ -1,27 +1,43 @@
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.core.cache import cache_response
-from api.routers.services import get_dynamics_service
+from api.core.settings import get_settings
+from api.routers.services import get_dynamics_service, stream_dynamics_service
 from api.entities.schemas import DynamicsResponse
-from api.models.db import get_session
+from api.models.db import LazySession, get_lazy_session
 
 
 router = APIRouter()
 
-@router.get("/dynamics", response_model=DynamicsResponse)
-@cache_response("dynamics")
+@router.get(
+    "/dynamics",
+    response_model=DynamicsResponse,
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}},
+)
+@cache_response("dynamics", skip=lambda args: args.get("format", "json") != "json")
 async def get_dynamics(
     start_date: date,
     end_date: date,
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
-    session: AsyncSession = Depends(get_session),
+    format: Literal["json", "ndjson", "csv"] = "json",
+    lazy_session: LazySession = Depends(get_lazy_session),
 ):
+    if format != "json":
+        return stream_dynamics_service(
+            start_date=start_date,
+            end_date=end_date,
+            format=format,
+            oil_id=oil_id,
+            delivery_type_id=delivery_type_id,
+            delivery_basis_id=delivery_basis_id,
+            chunk_size=get_settings().dynamics_stream_chunk,
+        )
+    session = await lazy_session.get()
     return await get_dynamics_service(
         session=session,
         start_date=start_date,
@@ -0,0 +1,40 @@
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Response
+
+from api.core.cache import cache_response
+from api.routers.services import export_dynamics_service
+from api.models.db import LazySession, get_lazy_session
+
+
+router = APIRouter()
+
+@router.get(
+    "/dynamics/export",
+    response_class=Response,
+    responses={200: {"content": {
+        "application/vnd.apache.arrow.stream": {},
+        "application/vnd.apache.parquet": {},
+    }}},
+)
+@cache_response("dynamics_export")
+async def export_dynamics(
+    start_date: date,
+    end_date: date,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    format: Literal["arrow", "parquet"] = "arrow",
+    lazy_session: LazySession = Depends(get_lazy_session),
+):
+    session = await lazy_session.get()
+    return await export_dynamics_service(
+        session=session,
+        start_date=start_date,
+        end_date=end_date,
+        format=format,
+        oil_id=oil_id,
+        delivery_type_id=delivery_type_id,
+        delivery_basis_id=delivery_basis_id,
+    )
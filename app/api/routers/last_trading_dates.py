@@ -1,12 +1,14 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Query
 
 from api.core.cache import cache_response
-from api.routers.services import get_last_trading_dates_service
+from api.routers.services import (
+    LAST_TRADING_DATES_MAX_COUNT,
+    get_last_trading_dates_service,
+)
 from api.entities.schemas import LastTradingDatesResponse
-from api.models.db import get_session
+from api.models.db import LazySession, get_lazy_session
 
 
 router = APIRouter()
@@ -14,15 +16,18 @@ router = APIRouter()
 @router.get("/last_trading_dates", response_model=LastTradingDatesResponse)
 @cache_response("last_trading_dates")
 async def get_last_trading_dates(
-    count: int = 5,
+    count: int = Query(5, ge=1, le=LAST_TRADING_DATES_MAX_COUNT),
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
-    session: AsyncSession = Depends(get_session),
+    cursor: Optional[str] = None,
+    lazy_session: LazySession = Depends(get_lazy_session),
 ):
+    session = await lazy_session.get()
     return await get_last_trading_dates_service(
         session=session,
         count=count,
+        cursor=cursor,
         oil_id=oil_id,
         delivery_type_id=delivery_type_id,
         delivery_basis_id=delivery_basis_id,
@@ -1,15 +1,29 @@
 from datetime import date
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.core.formats import encode_csv, encode_ndjson
+from api.core.pagination import decode_cursor, encode_cursor
+from api.core.profiling import phase
+from api.core.settings import Settings
+from api.core.snapshot import snapshots
+from api.models.db import read_engine
 from api.models.crud import (
+    copy_trading_results_by_date_range,
+    get_aggregates,
     get_distinct_dates,
     get_trading_results_by_date_range,
-    get_latest_trading_results
+    get_latest_trading_results,
+    stream_trading_results_by_date_range,
 )
+from api.models.models import TradingResult
 from api.entities.schemas import (
+    AggregateResponse,
+    AggregateRow,
     LastTradingDatesResponse,
     DynamicsResponse,
     TradingResultsResponse,
@@ -17,20 +31,56 @@ from api.entities.schemas import (
 )
 
 
+LAST_TRADING_DATES_MAX_COUNT = 365
+TRADING_RESULTS_MAX_LIMIT = 1000
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+TRADE_DETAILS = TypeAdapter(List[TradingResultDetail])
+
+
+def _trade_details(rows) -> List[TradingResultDetail]:
+    """Validate crud column rows in one pass over the whole list.
+
+    The result is put into the response with model_construct, so the
+    rows are not validated a second time.
+    """
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    with phase("mapping"):
+        records = [dict(zip(fields, row)) for row in rows]
+    with phase("validation"):
+        return TRADE_DETAILS.validate_python(records)
+
+
 async def get_last_trading_dates_service(
     session: AsyncSession,
     count: int = 5,
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
+    cursor: Optional[str] = None,
 ) -> LastTradingDatesResponse:
-    dates = await get_distinct_dates(
-        session,
+    count = min(count, LAST_TRADING_DATES_MAX_COUNT)
+    before = decode_cursor(cursor)[0] if cursor else None
+    query = dict(
         oil_id=oil_id,
         delivery_type_id=delivery_type_id,
-        delivery_basis_id=delivery_basis_id
+        delivery_basis_id=delivery_basis_id,
+        limit=count + 1,
+        before=before,
     )
-    return LastTradingDatesResponse(dates=dates[:count])
+    dates = None
+    snapshot = snapshots.current()
+    if snapshot is not None:
+        with phase("snapshot"):
+            dates = snapshot.distinct_dates(**query)
+    if dates is None:
+        dates = await get_distinct_dates(session, **query)
+    next_cursor = encode_cursor(dates[count - 1]) if len(dates) > count else None
+    return LastTradingDatesResponse(dates=dates[:count], next_cursor=next_cursor)
 
 
 async def get_dynamics_service(
@@ -44,15 +94,120 @@ async def get_dynamics_service(
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="start_date must be <= end_date")
 
-    records = await get_trading_results_by_date_range(
+    query = dict(
+        start_date=start_date,
+        end_date=end_date,
+        oil_id=oil_id,
+        delivery_type_id=delivery_type_id,
+        delivery_basis_id=delivery_basis_id,
+    )
+    records = None
+    snapshot = snapshots.current()
+    if snapshot is not None:
+        with phase("snapshot"):
+            records = snapshot.date_range(**query)
+    if records is None:
+        records = await get_trading_results_by_date_range(session, **query)
+    return DynamicsResponse.model_construct(trades=_trade_details(records))
+
+
+def stream_dynamics_service(
+    start_date: date,
+    end_date: date,
+    format: str,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+    chunk_size: int = Settings.dynamics_stream_chunk,
+) -> StreamingResponse:
+    """/dynamics rows as NDJSON or CSV, encoded chunk by chunk.
+
+    The rows are read chunk_size at a time through a server-side cursor
+    on a connection of the response's own, so memory does not depend
+    on the range size.
+    """
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be <= end_date")
+
+    async def body():
+        if format == "csv":
+            yield encode_csv([], header=[c.name for c in TradingResult.__table__.columns])
+        async with read_engine().connect() as conn:
+            chunks = stream_trading_results_by_date_range(
+                conn,
+                start_date=start_date,
+                end_date=end_date,
+                oil_id=oil_id,
+                delivery_type_id=delivery_type_id,
+                delivery_basis_id=delivery_basis_id,
+                chunk_size=chunk_size,
+            )
+            async for chunk in chunks:
+                yield encode_csv(chunk) if format == "csv" else encode_ndjson(chunk)
+
+    headers = {}
+    if format == "csv":
+        headers["Content-Disposition"] = (
+            f'attachment; filename="dynamics_{start_date}_{end_date}.csv"'
+        )
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[format], headers=headers)
+
+
+async def export_dynamics_service(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    format: str = "arrow",
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+) -> Response:
+    """/dynamics rows as an Arrow IPC stream or a Parquet file"""
+    from api.core import columnar
+
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be <= end_date")
+
+    data = await copy_trading_results_by_date_range(
+        await session.connection(),
+        start_date=start_date,
+        end_date=end_date,
+        oil_id=oil_id,
+        delivery_type_id=delivery_type_id,
+        delivery_basis_id=delivery_basis_id,
+    )
+    with phase("encoding"):
+        body = columnar.encode_table(columnar.table_from_csv(data), format)
+    return Response(content=body, media_type=columnar.MEDIA_TYPES[format])
+
+
+async def get_aggregates_service(
+    session: AsyncSession,
+    start_date: date,
+    end_date: date,
+    period: str = "day",
+    group_by: Optional[List[str]] = None,
+    oil_id: Optional[str] = None,
+    delivery_type_id: Optional[str] = None,
+    delivery_basis_id: Optional[str] = None,
+) -> AggregateResponse:
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be <= end_date")
+
+    group_by = list(dict.fromkeys(group_by or []))
+    rows = await get_aggregates(
         session,
         start_date=start_date,
         end_date=end_date,
+        period=period,
+        group_by=group_by,
         oil_id=oil_id,
         delivery_type_id=delivery_type_id,
-        delivery_basis_id=delivery_basis_id
+        delivery_basis_id=delivery_basis_id,
     )
-    return DynamicsResponse(trades=[TradingResultDetail.from_orm(r) for r in records])
+    with phase("validation"):
+        validated = [AggregateRow.model_validate(r._mapping) for r in rows]
+    return AggregateResponse(period=period, group_by=group_by, rows=validated)
 
 
 async def get_trading_results_service(
@@ -61,6 +216,7 @@ async def get_trading_results_service(
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
 ) -> TradingResultsResponse:
     if not any([oil_id, delivery_type_id, delivery_basis_id]):
         raise HTTPException(
@@ -68,10 +224,33 @@ async def get_trading_results_service(
             detail="Укажите хотя бы один из фильтров: oil_id, delivery_type_id или delivery_basis_id"
         )
 
-    records = await get_latest_trading_results(
-        session,
+    limit = min(limit, TRADING_RESULTS_MAX_LIMIT)
+    before = None
+    if cursor:
+        before_date, before_id = decode_cursor(cursor)
+        if before_id is None:
+            raise HTTPException(status_code=400, detail="Некорректный cursor")
+        before = (before_date, before_id)
+
+    query = dict(
         oil_id=oil_id,
         delivery_type_id=delivery_type_id,
-        delivery_basis_id=delivery_basis_id
+        delivery_basis_id=delivery_basis_id,
+        limit=limit + 1,
+        before=before,
+    )
+    records = None
+    snapshot = snapshots.current()
+    if snapshot is not None:
+        with phase("snapshot"):
+            records = snapshot.latest(**query)
+    if records is None:
+        records = await get_latest_trading_results(session, **query)
+    next_cursor = None
+    if len(records) > limit:
+        last = records[limit - 1]
+        next_cursor = encode_cursor(last.date, last.id)
+    return TradingResultsResponse.model_construct(
+        results=_trade_details(records[:limit]),
+        next_cursor=next_cursor,
     )
-    return TradingResultsResponse(results=[TradingResultDetail.from_orm(r) for r in records[:limit]])
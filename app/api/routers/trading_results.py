@@ -1,12 +1,14 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Query
 
 from api.core.cache import cache_response
-from api.routers.services import get_trading_results_service
+from api.routers.services import (
+    TRADING_RESULTS_MAX_LIMIT,
+    get_trading_results_service,
+)
 from api.entities.schemas import TradingResultsResponse
-from api.models.db import get_session
+from api.models.db import LazySession, get_lazy_session
 
 
 router = APIRouter()
@@ -17,13 +19,16 @@ async def get_trading_results(
     oil_id: Optional[str] = None,
     delivery_type_id: Optional[str] = None,
     delivery_basis_id: Optional[str] = None,
-    limit: int = 100,
-    session: AsyncSession = Depends(get_session),
+    limit: int = Query(100, ge=1, le=TRADING_RESULTS_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    lazy_session: LazySession = Depends(get_lazy_session),
 ):
+    session = await lazy_session.get()
     return await get_trading_results_service(
         session=session,
         oil_id=oil_id,
         delivery_type_id=delivery_type_id,
         delivery_basis_id=delivery_basis_id,
         limit=limit,
+        cursor=cursor,
     )
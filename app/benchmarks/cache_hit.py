@@ -0,0 +1,84 @@
+"""Cache hit latency for large /dynamics payloads.
+
+before: cached JSON string -> json.loads -> response_model validation
+        -> re-serialization (what FastAPI did with the old dict hits)
+after:  cached envelope bytes -> CachedResponse -> raw Response
+
+Run from app/: python -m benchmarks.cache_hit --rows 1000 10000
+"""
+import argparse
+import json
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from api.core.cached_response import CachedResponse
+from api.entities.schemas import DynamicsResponse, TradingResultDetail
+
+
+def make_payload(rows: int) -> DynamicsResponse:
+    start = date(2023, 1, 1)
+    now = datetime(2025, 7, 15, 12, 0, 0)
+    return DynamicsResponse(trades=[
+        TradingResultDetail(
+            id=i,
+            exchange_product_id=f"A{i % 90:03d}NVY060F",
+            exchange_product_name="Бензин (АИ-92-К5)",
+            oil_id=f"A{i % 90:03d}",
+            delivery_basis_id="NVY",
+            delivery_basis_name="ст. Новоярославская",
+            delivery_type_id="F",
+            volume=Decimal("60") + i % 7,
+            total=Decimal("3542400.50") + i,
+            count=1 + i % 5,
+            date=start + timedelta(days=i % 700),
+            created_on=now,
+            updated_on=now,
+        )
+        for i in range(rows)
+    ])
+
+
+def before_hit(cached: str) -> bytes:
+    payload = json.loads(cached)
+    model = DynamicsResponse.model_validate(payload)
+    return json.dumps(model.model_dump(mode="json")).encode()
+
+
+def after_hit(raw: bytes, accept_encoding: str) -> bytes:
+    return CachedResponse.from_bytes(raw).to_response(accept_encoding).body
+
+
+def timeit(fn, *args, repeat: int) -> float:
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'before ms':>10} {'after ms':>10} {'after gz ms':>12} {'stored KiB':>11} {'gz KiB':>8}")
+    for rows in args.rows:
+        model = make_payload(rows)
+        old_cached = json.dumps(model.model_dump(), default=str)
+        body = model.model_dump_json().encode()
+        plain = CachedResponse.encode(body).to_bytes()
+        compressed = CachedResponse.encode(body, compress_min_bytes=4096).to_bytes()
+
+        before = timeit(before_hit, old_cached, repeat=args.repeat)
+        after = timeit(after_hit, plain, "", repeat=args.repeat)
+        after_gz = timeit(after_hit, compressed, "gzip", repeat=args.repeat)
+        print(
+            f"{rows:>8} {before:>10.2f} {after:>10.3f} {after_gz:>12.3f}"
+            f" {len(plain) / 1024:>11.0f} {len(compressed) / 1024:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Per-file bulletin parsing: prepare_df vs prepare_df_legacy.
+
+Parses the same synthetic .xls bulletin (needs xlwt) with both parsers
+and reports the median ms/file and the peak traced memory of one parse.
+
+Run from app/:
+    python -m benchmarks.parse_bulletin --rows 400 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from benchmarks.synthetic import write_bulletin_xls
+from scripts.hw import prepare_df, prepare_df_legacy
+
+
+PARSERS = {
+    "legacy": prepare_df_legacy,
+    "fast": prepare_df,
+}
+
+
+def measure(parse, path: str, repeat: int):
+    parse(path)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(path)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    parse(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "2024-01-09_oil_xls_20240109162000.xls")
+        write_bulletin_xls(path, date(2024, 1, 9), args.rows)
+        print(f"{args.rows} bulletin rows, {os.path.getsize(path) // 1024} KiB")
+        print(f"{'parser':<8} {'ms/file':>9} {'peak MiB':>9}")
+        results = {}
+        for name, parse in PARSERS.items():
+            results[name] = measure(parse, path, args.repeat)
+            print(f"{name:<8} {results[name][0]:>9.1f} {results[name][1]:>9.2f}")
+    print(f"legacy / fast: {results['legacy'][0] / results['fast'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
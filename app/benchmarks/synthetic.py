@@ -0,0 +1,174 @@
+"""Synthetic SPIMEX-like trading_results rows for tests and benchmarks."""
+import itertools
+import random
+from datetime import date, datetime, timedelta
+
+
+COLUMNS = [
+    "exchange_product_id",
+    "exchange_product_name",
+    "oil_id",
+    "delivery_basis_id",
+    "delivery_basis_name",
+    "delivery_type_id",
+    "volume",
+    "total",
+    "count",
+    "date",
+    "created_on",
+    "updated_on",
+]
+
+
+def synthetic_rows(start: date, days: int, products_per_day: int = 60, seed: int = 1):
+    """Bulletin-like rows on weekdays: ~40 oil codes, ~60 bases, 3 delivery types"""
+    rnd = random.Random(seed)
+    oils = [f"A{n:03d}" for n in range(100, 140)]
+    bases = [f"{chr(65 + n // 26)}{chr(65 + n % 26)}Y" for n in range(60)]
+    types = ["F", "A", "J"]
+    products = [
+        (oil, basis, kind)
+        for oil in oils for basis in bases for kind in types
+    ]
+    now = datetime(2025, 7, 15, 12, 0, 0)
+    day = start
+    for _ in range(days):
+        if day.weekday() < 5:
+            for oil, basis, kind in rnd.sample(products, products_per_day):
+                volume = rnd.randint(1, 50) * 60
+                yield (
+                    f"{oil}{basis}060{kind}",
+                    f"Продукт {oil}",
+                    oil,
+                    basis,
+                    f"Базис {basis}",
+                    kind,
+                    volume,
+                    volume * rnd.randint(40_000, 90_000),
+                    rnd.randint(1, 10),
+                    day,
+                    now,
+                    now,
+                )
+        day += timedelta(days=1)
+
+
+def market_rows(start: date, end: date, products_per_day: int = 500, seed: int = 1):
+    """Weekday rows for [start, end] with a skewed, stable product mix.
+
+    ~150 oil codes, ~400 bases and the delivery types F/A/J (mostly F)
+    form a universe of 6000 products whose popularity follows a Zipf
+    curve, so a few hundred products trade almost daily and the long
+    tail rarely, as in real bulletins. Prices drift per product.
+    """
+    rnd = random.Random(seed)
+    oils = [f"A{n:03d}" for n in range(100, 250)]
+    bases = [f"{chr(65 + n // 26 % 26)}{chr(65 + n % 26)}{'YZW'[n // 676 % 3]}" for n in range(400)]
+    products = []
+    while len(products) < 6000:
+        kind = rnd.choices("FAJ", weights=(85, 10, 5))[0]
+        product = (rnd.choice(oils), rnd.choice(bases), kind)
+        if product not in products:
+            products.append(product)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(products))))
+    prices = {product: rnd.randint(20_000, 90_000) for product in products}
+    now = datetime(2025, 7, 15, 12, 0, 0)
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            traded = set()
+            while len(traded) < min(products_per_day, len(products)):
+                traded.update(rnd.choices(range(len(products)), cum_weights=cum_weights, k=products_per_day))
+            for index in sorted(traded)[:products_per_day]:
+                oil, basis, kind = product = products[index]
+                prices[product] = max(1000, int(prices[product] * rnd.uniform(0.98, 1.02)))
+                volume = rnd.randint(1, 30) * 60
+                yield (
+                    f"{oil}{basis}060{kind}",
+                    f"Продукт {oil}",
+                    oil,
+                    basis,
+                    f"Базис {basis}",
+                    kind,
+                    volume,
+                    volume * prices[product],
+                    rnd.randint(1, 12),
+                    day,
+                    now,
+                    now,
+                )
+        day += timedelta(days=1)
+
+
+async def copy_rows(conn, rows, table: str = "trading_results") -> int:
+    """COPY rows into table over an asyncpg connection; returns row count"""
+    records = list(rows)
+    await conn.copy_records_to_table(table, records=records, columns=COLUMNS)
+    return len(records)
+
+
+BULLETIN_HEADER = [
+    "Код\nИнструмента",
+    "Наименование\nИнструмента",
+    "Базис\nпоставки",
+    "Объем\nДоговоров\nв единицах\nизмерения",
+    "Обьем\nДоговоров,\nруб.",
+    "Изменение рыночной\nцены к цене\nпредыдущего дня",
+    "Цена\n(за единицу\nизмерения), руб.\nМинимальная",
+    "Цена\n(за единицу\nизмерения), руб.\nСредневзвешенная",
+    "Цена\n(за единицу\nизмерения), руб.\nМаксимальная",
+    "Количество\nДоговоров,\nшт.",
+]
+
+
+def write_bulletin_xls(path: str, day: date, rows: int = 400, seed: int = 1) -> None:
+    """SPIMEX-like .xls bulletin (needs xlwt): header on row 7, a unit
+    section label, traded and non-traded rows ('-' counts) and totals."""
+    import xlwt
+
+    rnd = random.Random(seed)
+    book = xlwt.Workbook(encoding="utf-8")
+    sheet = book.add_sheet("TRADE_SUMMARY")
+    sheet.write(0, 1, "БЮЛЛЕТЕНЬ ПО ИТОГАМ ТОРГОВ В СЕКЦИИ «НЕФТЕПРОДУКТЫ»")
+    sheet.write(2, 1, f"Дата торгов: {day:%d.%m.%Y}")
+    sheet.write(4, 1, "Форма СЭТ-БТ")
+    sheet.write(5, 1, "Секция Биржи: «Нефтепродукты» АО «Биржа «Санкт-Петербург»")
+    for col, title in enumerate(BULLETIN_HEADER, start=1):
+        sheet.write(6, col, title)
+    sheet.write(7, 1, "Единица измерения: Метрическая тонна")
+    for n in range(rows):
+        r = 8 + n
+        oil = f"A{100 + rnd.randrange(40):03d}"
+        basis = f"{chr(65 + rnd.randrange(3))}{chr(65 + rnd.randrange(26))}Y"
+        kind = rnd.choice("FAJ")
+        traded = rnd.random() < 0.7
+        volume = rnd.randint(1, 50) * 60 if traded else 0
+        price = rnd.randint(40_000, 90_000)
+        sheet.write(r, 1, f"{oil}{basis}060{kind}")
+        sheet.write(r, 2, f"Бензин ({oil}), ст. {basis}")
+        sheet.write(r, 3, f"ст. {basis}")
+        sheet.write(r, 4, str(volume) if traded else "-")
+        sheet.write(r, 5, str(volume * price) if traded else "-")
+        sheet.write(r, 6, str(rnd.randint(-500, 500)) if traded else "-")
+        for col in (7, 8, 9):
+            sheet.write(r, col, str(price) if traded else "-")
+        sheet.write(r, 10, str(rnd.randint(1, 10)) if traded else "-")
+    sheet.write(8 + rows, 1, "Итого:")
+    sheet.write(8 + rows, 10, "0")
+    book.save(path)
+
+
+def write_bulletins(directory: str, files: int, rows: int = 400, start: date = date(2024, 1, 1)):
+    """files bulletins named like the scraper's downloads; returns paths"""
+    import os
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    day = start
+    while len(paths) < files:
+        if day.weekday() < 5:
+            path = os.path.join(directory, f"{day.isoformat()}_oil_xls_{day:%Y%m%d}162000.xls")
+            write_bulletin_xls(path, day, rows, seed=len(paths))
+            paths.append(path)
+        day += timedelta(days=1)
+    return paths
@@ -2,12 +2,21 @@ import os
 import re
 import glob
 import asyncio
+import hashlib
+import io
+import json
+import random
 import time
 import datetime as dt
+import multiprocessing
 import sys
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
 from dotenv import load_dotenv
 from urllib.parse import urljoin
 from urllib.parse import urljoin, urlparse
+from zoneinfo import ZoneInfo
 
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -16,10 +25,15 @@ import aiohttp
 import aiofiles
 import pandas as pd
 from bs4 import BeautifulSoup
+from redis.asyncio import Redis
 
-from sqlalchemy import Column, Integer, Numeric, Text, Date, DateTime, insert
+from sqlalchemy import BigInteger, Column, Integer, Numeric, Text, Date, DateTime, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncSession
+
+from scripts.migrations import upgrade as migrate
+from scripts.partitions import ensure_partitions
 
 
 load_dotenv()
@@ -39,6 +53,36 @@ START_DATE = dt.date.fromisoformat(
     os.getenv("START_DATE", "2025-07-15")
 )
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://host.docker.internal:6379")
+CACHE_GENERATION_KEY = os.getenv("CACHE_GENERATION_KEY", "cache:generation")
+CACHE_GENERATION_CHANNEL = os.getenv("CACHE_GENERATION_CHANNEL", "cache:generation")
+INGEST_EVENTS_CHANNEL = os.getenv("INGEST_EVENTS_CHANNEL", "ingest:events")
+
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", "20"))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "5"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "4"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+VALIDATORS_SUFFIX = ".http.json"
+RECHECK_DAYS = int(os.getenv("RECHECK_DAYS", "3"))
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", "8"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or None
+
+DAEMON_INTERVAL = float(os.getenv("DAEMON_INTERVAL", "3600"))
+# Local time range in which the day's bulletin usually appears
+DAEMON_WINDOW = os.getenv("DAEMON_WINDOW", "15:00-19:00")
+DAEMON_WINDOW_INTERVAL = float(os.getenv("DAEMON_WINDOW_INTERVAL", "300"))
+DAEMON_TZ = ZoneInfo(os.getenv("DAEMON_TZ", "Europe/Moscow"))
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_WRITERS = int(os.getenv("INGEST_WRITERS", "1"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
 ASYNC_DATABASE_URL = (
     f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
@@ -68,6 +112,18 @@ class TradingResult(Base):
     updated_on = Column(DateTime)
 
 
+class IngestLedger(Base):
+    __tablename__ = 'ingest_ledger'
+    file_name = Column(Text, primary_key=True)
+    file_date = Column(Date)
+    size_bytes = Column(BigInteger)
+    sha256 = Column(Text)
+    row_count = Column(Integer)
+    loaded_on = Column(DateTime)
+    etag = Column(Text)
+    last_modified = Column(Text)
+
+
 engine = create_async_engine(
     ASYNC_DATABASE_URL,
     pool_pre_ping=True,
@@ -81,39 +137,142 @@ AsyncSessionLocal = sessionmaker(
 
 
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await migrate(engine)
+    await ensure_partitions(engine, [dt.date.today()])
+
+
+def make_http_session() -> aiohttp.ClientSession:
+    """One keep-alive connection pool shared by listing pages and files"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE,
+        ttl_dns_cache=300,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TIMEOUT,
+        connect=HTTP_CONNECT_TIMEOUT,
+        sock_read=HTTP_READ_TIMEOUT,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={"User-Agent": "async-spimex/1.0"},
+    )
+
+
+async def with_retries(attempt: Callable[[], Awaitable], what: str):
+    """Run attempt(), retrying network errors and 429/5xx with backoff"""
+    for n in range(HTTP_RETRIES + 1):
+        try:
+            return await attempt()
+        except aiohttp.ClientResponseError as exc:
+            if exc.status not in RETRY_STATUSES or n == HTTP_RETRIES:
+                raise
+            error = exc
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            if n == HTTP_RETRIES:
+                raise
+            error = exc
+        delay = HTTP_BACKOFF * 2 ** n * random.uniform(0.5, 1.0)
+        print(f"[RETRY] {what}: {error!r}, retrying in {delay:.2f} sec")
+        await asyncio.sleep(delay)
+
+
+def read_validators(out_path: str) -> dict:
+    """ETag / Last-Modified stored next to a downloaded file"""
+    try:
+        with open(out_path + VALIDATORS_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def response_validators(headers) -> dict:
+    """ETag / Last-Modified of a response, keyed 'etag' / 'last_modified'"""
+    return {
+        key: headers[header]
+        for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified'))
+        if header in headers
+    }
+
+
+def conditional_headers(validators: Optional[dict]) -> dict:
+    """If-None-Match / If-Modified-Since from stored validators"""
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def write_validators(out_path: str, headers) -> None:
+    validators = response_validators(headers)
+    tmp_path = out_path + VALIDATORS_SUFFIX + '.part'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(validators, f)
+    os.replace(tmp_path, out_path + VALIDATORS_SUFFIX)
 
 
 async def download_file(
         session: aiohttp.ClientSession, url: str, out_path: str
-        ):
-    async with session.get(url) as resp:
-        resp.raise_for_status()
-        async with aiofiles.open(out_path, mode="wb") as f:
-            await f.write(await resp.read())
-    print(f"[OK] {out_path}")
+        ) -> bool:
+    """Stream url to out_path; False if the server says it is unchanged.
 
+    The body goes to out_path + '.part' chunk by chunk and is renamed
+    over out_path only once complete. An existing file is re-fetched
+    conditionally with its stored ETag / Last-Modified.
+    """
+    headers = conditional_headers(read_validators(out_path)) if os.path.exists(out_path) else {}
+    tmp_path = out_path + '.part'
 
-async def fetch_download_links(session: aiohttp.ClientSession):
-    os.makedirs(OUT_DIR, exist_ok=True)
+    async def attempt():
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 304:
+                return False
+            resp.raise_for_status()
+            async with aiofiles.open(tmp_path, mode="wb") as f:
+                async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+            os.replace(tmp_path, out_path)
+            write_validators(out_path, resp.headers)
+            return True
+
+    try:
+        changed = await with_retries(attempt, url)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"[OK] {out_path}" if changed else f"[NOT MODIFIED] {out_path}")
+    return changed
+
+
+async def fetch_page(session: aiohttp.ClientSession, url: str) -> str:
+    async def attempt():
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            return await resp.text()
+    return await with_retries(attempt, url)
+
+
+async def iter_listing(session: aiohttp.ClientSession, newer_than: Optional[dt.date] = None):
+    """(file date, url, file name) of bulletins, newest first, to START_DATE.
+
+    With newer_than, stops at the first bulletin of that date or older, so
+    when nothing was published only the first page is requested.
+    """
     page_number = 1
     next_url = BASE_URL
-    done_earlier = False
-    sem = asyncio.Semaphore(5)
-    tasks = []
-
     while next_url:
         print(f"Fetching page {page_number}: {next_url}")
-        async with session.get(next_url) as resp:
-            resp.raise_for_status()
-            html = await resp.text()
+        html = await fetch_page(session, next_url)
         soup = BeautifulSoup(html, "html.parser")
 
         links = soup.find_all("a", href=re.compile(r"xls", re.IGNORECASE))
         if not links:
             print("Нет ссылок на файлы на текущей странице.")
-            break
+            return
 
         for a in links:
             href = a["href"]
@@ -125,34 +284,164 @@ async def fetch_download_links(session: aiohttp.ClientSession):
             file_date = dt.datetime.strptime(m.group(1), "%Y%m%d").date()
 
             if file_date < START_DATE:
-                done_earlier = True
-                break
+                print(f"Дошли до {START_DATE}, выходим.")
+                return
+            if newer_than is not None and file_date <= newer_than:
+                print(f"Дошли до загруженной даты {newer_than}, выходим.")
+                return
 
             clean_path = urlparse(href).path
             fname_only = os.path.basename(clean_path)
-            fname = f"{file_date.isoformat()}_{fname_only}"
-            out_path = os.path.join(OUT_DIR, fname)
+            yield file_date, full_url, f"{file_date.isoformat()}_{fname_only}"
+
+        page_number += 1
+        next_url = f"{BASE_URL}?page=page-{page_number}"
+
 
-            if not os.path.exists(out_path):
-                async def sem_task(u, p):
-                    async with sem:
-                        await download_file(session, u, p)
-                tasks.append(asyncio.create_task(sem_task(full_url, out_path)))
-            else:
+async def fetch_download_links(session: aiohttp.ClientSession) -> List[str]:
+    """Download bulletins back to START_DATE; returns the changed files.
+
+    Files already on disk are skipped, except those of the last
+    RECHECK_DAYS days, which are re-fetched conditionally. Downloads run
+    while the following listing pages are fetched, bounded by the
+    session's connection limits.
+    """
+    os.makedirs(OUT_DIR, exist_ok=True)
+    recheck_from = dt.date.today() - dt.timedelta(days=RECHECK_DAYS)
+    downloads = {}
+
+    try:
+        async for file_date, full_url, fname in iter_listing(session):
+            out_path = os.path.join(OUT_DIR, fname)
+            if out_path in downloads:
+                continue
+            if os.path.exists(out_path) and file_date < recheck_from:
                 print(f"[SKIP] {out_path} already exists")
+                continue
+            downloads[out_path] = asyncio.create_task(
+                download_file(session, full_url, out_path)
+            )
+        results = await asyncio.gather(*downloads.values(), return_exceptions=True)
+    finally:
+        for task in downloads.values():
+            task.cancel()
 
-        if done_earlier:
-            print(f"Дошли до {START_DATE}, выходим.")
-            break
+    changed = []
+    for out_path, result in zip(downloads, results):
+        if isinstance(result, Exception):
+            print(f"[ERROR] {out_path}: {result!r}")
+        elif result:
+            changed.append(out_path)
+    return changed
 
-        page_number += 1
-        next_url = f"{BASE_URL}?page=page-{page_number}"
 
-    if tasks:
-        await asyncio.gather(*tasks)
+class Bulletin(NamedTuple):
+    """A downloaded file kept in memory; path is just its file name"""
+    path: str
+    content: bytes
+    validators: Optional[dict] = None
+
+
+async def fetch_bytes(
+    session: aiohttp.ClientSession, url: str, validators: Optional[dict] = None
+) -> Optional[Tuple[bytes, dict]]:
+    """Body and validators of url; None if the server answers 304 to a
+    request conditional on validators"""
+    async def attempt():
+        async with session.get(url, headers=conditional_headers(validators)) as resp:
+            if resp.status == 304:
+                return None
+            resp.raise_for_status()
+            return await resp.read(), response_validators(resp.headers)
+    return await with_retries(attempt, url)
 
 
-def prepare_df(path: str) -> pd.DataFrame:
+async def archive_bulletin(archive_dir: str, bulletin: Bulletin) -> None:
+    out_path = os.path.join(archive_dir, bulletin.path)
+    try:
+        async with aiofiles.open(out_path + '.part', mode="wb") as f:
+            await f.write(bulletin.content)
+        os.replace(out_path + '.part', out_path)
+    except OSError as exc:
+        print(f"[WARN] Не удалось сохранить {out_path}: {exc}")
+
+
+async def stream_bulletins(
+    session: aiohttp.ClientSession,
+    ledger: dict,
+    archive_dir: Optional[str] = None,
+    buffer: int = STREAM_BUFFER,
+    newer_than: Optional[dt.date] = None,
+    validators: Optional[dict] = None,
+):
+    """Yield bulletins as their downloads complete, listing pages permitting.
+
+    Files in the ledger older than RECHECK_DAYS are not downloaded; newer
+    ones are re-fetched conditionally on their `validators` (file name ->
+    ETag / Last-Modified) and skipped on 304. At most `buffer` bodies are
+    being fetched or waiting to be consumed. With archive_dir each body
+    is also written there in the background.
+    """
+    validators = validators or {}
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    recheck_from = dt.date.today() - dt.timedelta(days=RECHECK_DAYS)
+    ready = asyncio.Queue()
+    slots = asyncio.Semaphore(buffer)
+    archiving = set()
+
+    async def fetch(url, name):
+        try:
+            fetched = await fetch_bytes(session, url, validators.get(name) if name in ledger else None)
+        except Exception as exc:
+            print(f"[ERROR] {name}: {exc!r}")
+            slots.release()
+            return
+        if fetched is None:
+            print(f"[NOT MODIFIED] {name}")
+            slots.release()
+            return
+        bulletin = Bulletin(name, *fetched)
+        print(f"[OK] {name} ({len(bulletin.content)} bytes)")
+        if archive_dir:
+            task = asyncio.create_task(archive_bulletin(archive_dir, bulletin))
+            archiving.add(task)
+            task.add_done_callback(archiving.discard)
+        ready.put_nowait(bulletin)
+
+    async def crawl():
+        fetches = []
+        seen = set()
+        try:
+            async for file_date, full_url, fname in iter_listing(session, newer_than):
+                if fname in seen or (fname in ledger and file_date < recheck_from):
+                    continue
+                seen.add(fname)
+                await slots.acquire()
+                fetches.append(asyncio.create_task(fetch(full_url, fname)))
+            await asyncio.gather(*fetches)
+        finally:
+            for task in fetches:
+                task.cancel()
+            ready.put_nowait(None)
+
+    crawler = asyncio.create_task(crawl())
+    try:
+        while True:
+            bulletin = await ready.get()
+            if bulletin is None:
+                break
+            yield bulletin
+            slots.release()
+        await crawler
+        if archiving:
+            await asyncio.gather(*archiving)
+    finally:
+        crawler.cancel()
+
+
+def prepare_df_legacy(path: str) -> pd.DataFrame:
+    """Original parser: every column of every sheet, cleaned per column"""
     m = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(path))
     file_date = pd.to_datetime(m.group(1)).date() if m else None
 
@@ -233,44 +522,566 @@ def prepare_df(path: str) -> pd.DataFrame:
     return result.loc[:, ~result.columns.duplicated()]
 
 
-async def save_to_db():
-    files = (
+NUMERIC_COLS = ['volume', 'total', 'count']
+# str.translate table: drop every whitespace character, decimal comma -> dot
+NUMBER_TRANSLATION = {ord(c): None for c in map(chr, range(0x3001)) if c.isspace()}
+NUMBER_TRANSLATION[ord(',')] = '.'
+
+
+@lru_cache(maxsize=None)
+def header_target(header) -> Optional[str]:
+    """Table column for a raw bulletin header, None if it is not loaded"""
+    if not isinstance(header, str):
+        return None
+    name = ' '.join(header.split())
+    if 'Код Инструмента' in name:
+        return 'exchange_product_id'
+    if 'Наименование Инструмента' in name:
+        return 'exchange_product_name'
+    if 'Базис поставки' in name:
+        return 'delivery_basis_name'
+    if 'Объем Договоров в единицах измерения' in name:
+        return 'volume'
+    if 'Обьем Договоров' in name or ('Объем Договоров' in name and 'руб' in name.lower()):
+        return 'total'
+    if 'Количество Договоров' in name:
+        return 'count'
+    return None
+
+
+@lru_cache(maxsize=None)
+def column_map(headers: tuple) -> dict:
+    """{raw header: column} for one sheet layout, first occurrence wins"""
+    mapping = {}
+    for header in headers:
+        target = header_target(header)
+        if target is not None and target not in mapping.values():
+            mapping[header] = target
+    return mapping
+
+
+def parse_numbers(df: pd.DataFrame, columns: List[str]) -> List[pd.Series]:
+    """Numeric series for columns, converted in one pass over all cells"""
+    cells = pd.concat([df[c] for c in columns], ignore_index=True)
+    values = pd.to_numeric(
+        cells.astype(str).str.translate(NUMBER_TRANSLATION), errors='coerce'
+    ).to_numpy(dtype='float64')
+    n = len(df)
+    return [
+        pd.Series(values[i * n:(i + 1) * n], index=df.index) for i in range(len(columns))
+    ]
+
+
+def prepare_df(path: str, fast: bool = True, content: Optional[bytes] = None) -> pd.DataFrame:
+    """Traded rows of a bulletin in table columns (fast=False: legacy parser).
+
+    content, if given, is the file itself and path only its name.
+
+    Only the mapped columns are read, the three number columns are
+    converted together, and strings stay strings; the result matches
+    prepare_df_legacy on every table column.
+    """
+    if not fast:
+        return prepare_df_legacy(path)
+    file_date = file_date_from_name(path)
+
+    sheets = pd.read_excel(
+        io.BytesIO(content) if content is not None else path,
+        sheet_name=None, header=6, engine="xlrd",
+        usecols=lambda header: header_target(header) is not None,
+    )
+    now = pd.Timestamp.now(tz='UTC').tz_convert(None)
+    frames = []
+    for df in sheets.values():
+        mapping = column_map(tuple(df.columns))
+        if not {'exchange_product_id', 'count'} <= set(mapping.values()):
+            continue
+        df = df[list(mapping)].rename(columns=mapping)
+
+        ids = df['exchange_product_id'].astype(str)
+        df = df[ids.str.match(r'^[A-Za-z0-9]').to_numpy()]
+        if df.empty:
+            continue
+
+        numeric = [c for c in NUMERIC_COLS if c in df.columns]
+        for col, values in zip(numeric, parse_numbers(df, numeric)):
+            df[col] = values
+        df['count'] = df['count'].fillna(0).astype(int)
+        df = df[df['count'] > 0]
+        if df.empty:
+            continue
+
+        product = df['exchange_product_id'].str
+        df['oil_id'] = product[:4]
+        df['delivery_basis_id'] = product[4:7]
+        df['delivery_type_id'] = product[-1]
+        df['date'] = file_date
+        df['created_on'] = now
+        df['updated_on'] = now
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+COLS = [
+    'exchange_product_id',
+    'exchange_product_name',
+    'oil_id',
+    'delivery_basis_id',
+    'delivery_basis_name',
+    'delivery_type_id',
+    'volume',
+    'total',
+    'count',
+    'date',
+    'created_on',
+    'updated_on',
+]
+
+
+NATURAL_KEY = ['date', 'exchange_product_id', 'delivery_basis_id']
+UPDATE_COLS = [c for c in COLS if c not in NATURAL_KEY and c != 'created_on']
+COMPARE_COLS = [c for c in UPDATE_COLS if c != 'updated_on']
+
+UPSERT_FROM_STAGING = (
+    f"INSERT INTO trading_results ({', '.join(COLS)})"
+    f" SELECT {', '.join(COLS)} FROM trading_results_staging"
+    f" ON CONFLICT ({', '.join(NATURAL_KEY)}) DO UPDATE SET "
+    + ", ".join(f"{c} = EXCLUDED.{c}" for c in UPDATE_COLS)
+    + f" WHERE ({', '.join('trading_results.' + c for c in COMPARE_COLS)})"
+    f" IS DISTINCT FROM ({', '.join('EXCLUDED.' + c for c in COMPARE_COLS)})"
+)
+
+DELETE_STALE = text(
+    "DELETE FROM trading_results t"
+    " WHERE t.date = ANY(CAST(:dates AS date[]))"
+    " AND NOT EXISTS ("
+    "  SELECT 1 FROM unnest("
+    "   CAST(:key_dates AS date[]), CAST(:product_ids AS text[]), CAST(:basis_ids AS text[])"
+    "  ) AS k(date, exchange_product_id, delivery_basis_id)"
+    "  WHERE k.date = t.date"
+    "  AND k.exchange_product_id = t.exchange_product_id"
+    "  AND k.delivery_basis_id = t.delivery_basis_id)"
+)
+
+
+REFRESH_DAILY_ROLLUP = text(
+    "SELECT refresh_trading_results_daily(CAST(:dates AS date[]))"
+)
+
+
+def clean_df(df: pd.DataFrame) -> pd.DataFrame:
+    """prepare_df output reduced to the table columns and loadable rows"""
+    if df.empty:
+        return df
+    df = df.reindex(columns=COLS)
+    df = df[df['exchange_product_id'].notna() & df['date'].notna()]
+    df = df.drop_duplicates(subset=NATURAL_KEY, keep='last')
+    return df.where(pd.notnull(df), None)
+
+
+def df_to_records(df: pd.DataFrame) -> list:
+    """Row tuples in COLS order, built column-wise (no dict per row)"""
+    columns = []
+    for col in COLS:
+        series = df[col]
+        values = series.tolist()
+        if series.dtype.kind == 'f' or series.dtype == object:
+            mask = series.isna().tolist()
+            if any(mask):
+                values = [None if na else v for v, na in zip(values, mask)]
+        columns.append(values)
+    return list(zip(*columns))
+
+
+async def delete_stale(conn: AsyncConnection, df: pd.DataFrame) -> int:
+    """Drop rows of the frame's dates that the frame no longer contains.
+
+    A bulletin covers its whole trading day, so a re-published file
+    replaces that day: changed rows are upserted, vanished ones removed.
+    Returns the number of rows removed.
+    """
+    result = await conn.execute(DELETE_STALE, {
+        'dates': sorted(set(df['date'])),
+        'key_dates': df['date'].tolist(),
+        'product_ids': df['exchange_product_id'].tolist(),
+        'basis_ids': df['delivery_basis_id'].tolist(),
+    })
+    return result.rowcount
+
+
+async def insert_df(conn: AsyncConnection, df: pd.DataFrame) -> int:
+    """ORM-style executemany upsert of one dict per row; returns the
+    number of rows inserted, changed or removed"""
+    table = TradingResult.__table__
+    stmt = pg_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=NATURAL_KEY,
+        set_={c: stmt.excluded[c] for c in UPDATE_COLS},
+        where=tuple_(*(table.c[c] for c in COMPARE_COLS)).is_distinct_from(
+            tuple_(*(stmt.excluded[c] for c in COMPARE_COLS))
+        ),
+    ).returning(table.c.id)
+    result = await conn.execute(stmt, df.to_dict(orient='records'))
+    changed = len(result.all())
+    return changed + await delete_stale(conn, df)
+
+
+async def copy_df(conn: AsyncConnection, df: pd.DataFrame) -> int:
+    """COPY the frame's columns into a staging table, then upsert; returns
+    the number of rows inserted, changed or removed"""
+    await conn.exec_driver_sql(
+        "CREATE TEMP TABLE trading_results_staging ON COMMIT DROP AS"
+        f" SELECT {', '.join(COLS)} FROM trading_results WITH NO DATA"
+    )
+    raw = await conn.get_raw_connection()
+    records = df_to_records(df)
+    await raw.driver_connection.copy_records_to_table(
+        'trading_results_staging', records=records, columns=COLS
+    )
+    result = await conn.exec_driver_sql(UPSERT_FROM_STAGING)
+    return result.rowcount + await delete_stale(conn, df)
+
+
+def file_fingerprint(path: str) -> tuple:
+    """(size in bytes, sha256 hex digest) of a downloaded file"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def file_date_from_name(path: str):
+    m = re.search(r"(\d{4}-\d{2}-\d{2})", os.path.basename(path))
+    return dt.date.fromisoformat(m.group(1)) if m else None
+
+
+async def load_ledger(conn: AsyncConnection) -> dict:
+    """{file name: sha256} of every file loaded so far"""
+    rows = await conn.execute(text("SELECT file_name, sha256 FROM ingest_ledger"))
+    return dict(rows.fetchall())
+
+
+async def load_validators(conn: AsyncConnection) -> dict:
+    """{file name: {'etag': ..., 'last_modified': ...}} of ledger files
+    served with validators"""
+    rows = await conn.execute(text(
+        "SELECT file_name, etag, last_modified FROM ingest_ledger"
+        " WHERE etag IS NOT NULL OR last_modified IS NOT NULL"
+    ))
+    return {name: {'etag': etag, 'last_modified': modified} for name, etag, modified in rows}
+
+
+async def newest_ingested(conn: AsyncConnection) -> Optional[dt.date]:
+    rows = await conn.execute(text("SELECT max(file_date) FROM ingest_ledger"))
+    return rows.scalar_one()
+
+
+async def record_ingest(
+    conn: AsyncConnection, path: str, size: int, checksum: str, row_count: int,
+    validators: Optional[dict] = None,
+) -> None:
+    validators = validators or {}
+    stmt = pg_insert(IngestLedger).values(
+        file_name=os.path.basename(path),
+        file_date=file_date_from_name(path),
+        size_bytes=size,
+        sha256=checksum,
+        row_count=row_count,
+        loaded_on=dt.datetime.utcnow(),
+        etag=validators.get('etag'),
+        last_modified=validators.get('last_modified'),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['file_name'],
+        set_={c: stmt.excluded[c] for c in (
+            'file_date', 'size_bytes', 'sha256', 'row_count', 'loaded_on', 'etag', 'last_modified',
+        )},
+    )
+    await conn.execute(stmt)
+
+
+async def record_validators(conn: AsyncConnection, path: str, validators: dict) -> None:
+    """New validators of an unchanged ledger file"""
+    await conn.execute(
+        text(
+            "UPDATE ingest_ledger SET etag = :etag, last_modified = :last_modified"
+            " WHERE file_name = :file_name"
+        ),
+        {
+            'file_name': os.path.basename(path),
+            'etag': validators.get('etag'),
+            'last_modified': validators.get('last_modified'),
+        },
+    )
+
+
+LOADERS = {
+    'copy': copy_df,
+    'orm': insert_df,
+}
+
+
+class ParsedFile(NamedTuple):
+    """A worker's result: df is None when the file is unchanged.
+    validators are those the bulletin was downloaded with."""
+    path: str
+    size: int
+    checksum: str
+    df: Optional[pd.DataFrame]
+    validators: Optional[dict] = None
+
+
+def parse_file(
+    path: str, known_checksum: Optional[str] = None, content: Optional[bytes] = None
+) -> ParsedFile:
+    """Fingerprint and parse one file (or in-memory body); runs in a pool worker.
+
+    The frame is reduced by clean_df before it is sent back, so only the
+    table columns cross the process boundary.
+    """
+    if content is None:
+        size, checksum = file_fingerprint(path)
+    else:
+        size, checksum = len(content), hashlib.sha256(content).hexdigest()
+    if checksum == known_checksum:
+        return ParsedFile(path, size, checksum, None)
+    if content is None:
+        return ParsedFile(path, size, checksum, clean_df(prepare_df(path)))
+    return ParsedFile(path, size, checksum, clean_df(prepare_df(path, content=content)))
+
+
+def make_writer(db_engine, load) -> Callable[[ParsedFile], Awaitable[int]]:
+    """Load a parsed file, refresh its days in the daily rollup and record
+    it in the ledger, in one transaction. For an unchanged file only its
+    validators are updated."""
+    async def write(parsed: ParsedFile) -> int:
+        df = parsed.df
+        if df is None:
+            async with db_engine.begin() as conn:
+                await record_validators(conn, parsed.path, parsed.validators or {})
+            return 0
+        if not df.empty:
+            await ensure_partitions(db_engine, set(df['date']))
+        async with db_engine.begin() as conn:
+            changed = 0
+            if not df.empty:
+                changed = await load(conn, df)
+                if changed:
+                    await conn.execute(REFRESH_DAILY_ROLLUP, {'dates': sorted(set(df['date']))})
+            await record_ingest(
+                conn, parsed.path, parsed.size, parsed.checksum, len(df), parsed.validators,
+            )
+        return changed
+    return write
+
+
+class IngestReport:
+    def __init__(self):
+        self.inserted = 0
+        self.loaded = 0
+        self.skipped = 0
+        self.failed = []
+        self.files = []
+        self.dates = set()
+
+    def event(self) -> dict:
+        """Summary published on INGEST_EVENTS_CHANNEL"""
+        return {
+            'rows': self.inserted,
+            'files': sorted(os.path.basename(p) for p in self.files),
+            'dates': sorted(d.isoformat() for d in self.dates),
+        }
+
+
+async def _aiter(items):
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_pipeline(
+    files: Union[Iterable[str], AsyncIterable[Bulletin]],
+    ledger: dict,
+    write: Callable[[ParsedFile], Awaitable[int]],
+    workers: int = 0,
+    writers: int = 1,
+    queue_size: int = INGEST_QUEUE_SIZE,
+) -> IngestReport:
+    """Parse files in a process pool and feed them to async writers.
+
+    At most `workers` files are parsed at a time and at most `queue_size`
+    parsed files wait for a writer, so memory does not grow with the
+    number of files. workers=0 parses on the loop's default thread pool.
+    files are paths or, for the in-memory ingest, an async iterable of
+    Bulletin, consumed only as fast as the parsers take them.
+    """
+    writers = max(writers, 1)
+    report = IngestReport()
+    queue = asyncio.Queue(maxsize=max(queue_size, 1))
+    parsing = asyncio.Semaphore(max(workers, 1))
+    loop = asyncio.get_running_loop()
+    pool = None
+    if workers > 0:
+        # Not fork: the loop, its sockets, the engine's pool and threads
+        # must not be copied into the workers.
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(
+            "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        ))
+
+    async def parse(item):
+        path, content, validators = (item, None, None) if isinstance(item, str) else item
+        known = ledger.get(os.path.basename(path))
+        try:
+            parsed = await loop.run_in_executor(pool, parse_file, path, known, content)
+            if validators:
+                parsed = parsed._replace(validators=validators)
+            # Released only once queued: a full queue stalls the workers.
+            await queue.put(parsed)
+        except Exception as exc:
+            report.failed.append(path)
+            print(f"[ERROR] {path}: {exc}")
+        finally:
+            parsing.release()
+
+    async def produce():
+        pending = set()
+        async for item in _aiter(files):
+            await parsing.acquire()
+            task = asyncio.create_task(parse(item))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+        for _ in range(writers):
+            await queue.put(None)
+
+    async def consume():
+        while True:
+            parsed = await queue.get()
+            if parsed is None:
+                return
+            if parsed.df is None:
+                report.skipped += 1
+                if parsed.validators:
+                    try:
+                        await write(parsed)
+                    except Exception as exc:
+                        print(f"[WARN] {parsed.path}: {exc}")
+                continue
+            try:
+                rows = await write(parsed)
+                report.inserted += rows
+                report.loaded += 1
+                report.files.append(parsed.path)
+                report.dates.update(parsed.df['date'])
+            except Exception as exc:
+                report.failed.append(parsed.path)
+                print(f"[ERROR] {parsed.path}: {exc}")
+
+    try:
+        await asyncio.gather(produce(), *(consume() for _ in range(writers)))
+    finally:
+        if pool is not None:
+            # Without waiting: in-flight parses must not block the loop.
+            pool.shutdown(wait=False, cancel_futures=True)
+    return report
+
+
+async def ingest(files, ledger: dict, loader: str, workers: int, writers: int, queue_size: int) -> int:
+    """run_pipeline into trading_results, with the summary and cache bump"""
+    start = time.perf_counter()
+    report = await run_pipeline(
+        files, ledger, make_writer(engine, LOADERS[loader]),
+        workers=workers, writers=writers, queue_size=queue_size,
+    )
+    inserted = report.inserted
+    elapsed = time.perf_counter() - start
+    rate = inserted / elapsed if elapsed else 0.0
+    print(
+        f"All data saved: {inserted} rows from {report.loaded} files, {report.skipped} unchanged"
+        f" files skipped, in {elapsed:.2f} sec ({rate:.0f} rows/sec, loader={loader},"
+        f" workers={workers})"
+    )
+    if report.failed:
+        print(f"[WARN] {len(report.failed)} files failed: {', '.join(report.failed)}")
+    if inserted:
+        await bump_cache_generation(report.event())
+    return inserted
+
+
+async def save_to_db(
+    loader: str = 'copy',
+    workers: int = 0,
+    writers: int = 1,
+    queue_size: int = INGEST_QUEUE_SIZE,
+):
+    """Load new or changed downloaded files, one transaction per file.
+
+    Files recorded in ingest_ledger with the same checksum are skipped
+    without being parsed. A file that fails to parse or load is reported
+    and skipped without rolling back the files loaded before it.
+    """
+    files = sorted(
         glob.glob(os.path.join(OUT_DIR, '*.xls')) +
         glob.glob(os.path.join(OUT_DIR, '*.xlsx'))
     )
-    cols = [
-        'exchange_product_id',
-        'exchange_product_name',
-        'oil_id',
-        'delivery_basis_id',
-        'delivery_basis_name',
-        'delivery_type_id',
-        'volume',
-        'total',
-        'count',
-        'date',
-        'created_on',
-        'updated_on',
-    ]
+    async with engine.connect() as conn:
+        ledger = await load_ledger(conn)
+    return await ingest(files, ledger, loader, workers, writers, queue_size)
 
-    async with AsyncSessionLocal() as session:
-        async with session.begin():
-            for path in files:
-                loop = asyncio.get_event_loop()
-                df = await loop.run_in_executor(None, prepare_df, path)
-                if df.empty:
-                    continue
-                df = df.reindex(columns=cols)
-                df = df[df['exchange_product_id'].notna()]
-                if df.empty:
-                    continue
-                df = df.where(pd.notnull(df), None)
-                await session.execute(
-                    insert(TradingResult),
-                    df.to_dict(orient='records')
-                )
 
-    print("All data saved")
+async def stream_to_db(
+    session: aiohttp.ClientSession,
+    loader: str = 'copy',
+    workers: int = 0,
+    writers: int = 1,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    archive_dir: Optional[str] = None,
+    newer_than: Optional[dt.date] = None,
+):
+    """Download, parse and load bulletins in memory, file by file.
+
+    Each body is parsed as soon as it arrives, so the first files are in
+    the database while older listing pages are still being fetched.
+    Nothing is written to OUT_DIR; archive_dir optionally keeps copies.
+    newer_than limits the run to bulletins published after that date.
+    """
+    async with engine.connect() as conn:
+        ledger = await load_ledger(conn)
+        validators = await load_validators(conn)
+    bulletins = stream_bulletins(
+        session, ledger, archive_dir, newer_than=newer_than, validators=validators,
+    )
+    return await ingest(bulletins, ledger, loader, workers, writers, queue_size)
+
+
+async def bump_cache_generation(event: Optional[dict] = None):
+    """Invalidate API caches: new generation, announced to all workers.
+
+    event (what was ingested) is published on INGEST_EVENTS_CHANNEL
+    together with the new generation.
+    """
+    redis = Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        generation = await redis.incr(CACHE_GENERATION_KEY)
+        await redis.publish(CACHE_GENERATION_CHANNEL, generation)
+        if event is not None:
+            await redis.publish(
+                INGEST_EVENTS_CHANNEL, json.dumps({**event, 'generation': generation})
+            )
+        print(f"Cache generation bumped to {generation}")
+    except Exception as exc:
+        print(f"[WARN] Не удалось обновить поколение кэша: {exc}")
+    finally:
+        await redis.aclose()
 
 
 def sync_run():
@@ -281,20 +1092,138 @@ def sync_run():
     print(f"[SYNC] elapsed: {time.perf_counter() - start:.2f} sec")
 
 
-async def async_run():
+async def async_run(
+    loader: str = 'copy',
+    workers: int = INGEST_WORKERS,
+    writers: int = INGEST_WRITERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+):
     start = time.perf_counter()
     await init_db()
-    async with aiohttp.ClientSession(
-        headers={"User-Agent": "async-spimex/1.0"}
-    ) as session:
+    async with make_http_session() as session:
         await fetch_download_links(session)
-    await save_to_db()
+    await save_to_db(loader, workers, writers, queue_size)
     print(f"[ASYNC] elapsed: {time.perf_counter() - start:.2f} sec")
 
+
+async def stream_run(
+    loader: str = 'copy',
+    workers: int = INGEST_WORKERS,
+    writers: int = INGEST_WRITERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    archive_dir: Optional[str] = ARCHIVE_DIR,
+):
+    start = time.perf_counter()
+    await init_db()
+    async with make_http_session() as session:
+        await stream_to_db(session, loader, workers, writers, queue_size, archive_dir)
+    print(f"[STREAM] elapsed: {time.perf_counter() - start:.2f} sec")
+
+
+def parse_window(spec: str) -> tuple:
+    start, end = spec.split('-')
+    return dt.time.fromisoformat(start.strip()), dt.time.fromisoformat(end.strip())
+
+
+def next_poll_delay(now: dt.datetime, newest: Optional[dt.date]) -> float:
+    """Seconds until the next poll.
+
+    Every DAEMON_WINDOW_INTERVAL inside the publication window of a
+    weekday whose bulletin is not loaded yet, otherwise every
+    DAEMON_INTERVAL but never past the start of the next window.
+    """
+    start, end = parse_window(DAEMON_WINDOW)
+    today = now.date()
+    waiting = newest is None or newest < today
+    if now.weekday() < 5 and start <= now.time() < end and waiting:
+        return DAEMON_WINDOW_INTERVAL
+    window = dt.datetime.combine(today, start, now.tzinfo)
+    if now >= window:
+        window += dt.timedelta(days=1)
+    return max(min(DAEMON_INTERVAL, (window - now).total_seconds()), 1.0)
+
+
+async def poll_once(session: aiohttp.ClientSession, loader: str = 'copy', **kwargs) -> int:
+    """Ingest bulletins of the last RECHECK_DAYS before the newest one in
+    the ledger and after it.
+
+    Looking back RECHECK_DAYS retries bulletins that failed after a later
+    one was loaded and re-checks republished ones. Loaded files are
+    re-checked with conditional requests (the ledger's ETag /
+    Last-Modified), so once up to date a poll transfers no bulletin
+    bodies; a file served anyway is skipped if its checksum is unchanged.
+    """
+    async with engine.connect() as conn:
+        newest = await newest_ingested(conn)
+    if newest is not None:
+        newest -= dt.timedelta(days=RECHECK_DAYS)
+    return await stream_to_db(session, loader, newer_than=newest, **kwargs)
+
+
+async def daemon_run(
+    loader: str = 'copy',
+    workers: int = INGEST_WORKERS,
+    writers: int = INGEST_WRITERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    archive_dir: Optional[str] = ARCHIVE_DIR,
+):
+    """Poll for new bulletins forever; see next_poll_delay for the schedule"""
+    await init_db()
+    async with make_http_session() as session:
+        while True:
+            newest = None
+            try:
+                await poll_once(
+                    session, loader, workers=workers, writers=writers,
+                    queue_size=queue_size, archive_dir=archive_dir,
+                )
+                async with engine.connect() as conn:
+                    newest = await newest_ingested(conn)
+            except Exception as exc:
+                print(f"[ERROR] poll failed: {exc!r}")
+            delay = next_poll_delay(dt.datetime.now(DAEMON_TZ), newest)
+            print(f"[DAEMON] newest bulletin {newest}, next poll in {delay:.0f} sec")
+            await asyncio.sleep(delay)
+
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="SPIMEX bulletins scraper")
+    parser.add_argument('mode', nargs='?', default='async', type=str.lower)
+    parser.add_argument(
+        '--loader', choices=sorted(LOADERS), default='copy',
+        help="bulk COPY (default) or ORM executemany",
+    )
+    parser.add_argument(
+        '--workers', type=int, default=INGEST_WORKERS,
+        help="parser processes (0: parse in-process threads)",
+    )
+    parser.add_argument(
+        '--writers', type=int, default=INGEST_WRITERS,
+        help="concurrent DB writers",
+    )
+    parser.add_argument(
+        '--queue-size', type=int, default=INGEST_QUEUE_SIZE,
+        help="parsed files waiting for a writer",
+    )
+    parser.add_argument(
+        '--archive', dest='archive_dir', default=ARCHIVE_DIR,
+        help="stream and daemon modes: also keep the downloaded files in this directory",
+    )
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
-    import sys
-    mode = sys.argv[1].lower() if len(sys.argv) > 1 else 'async'
-    if mode == 'sync':
+    args = parse_args()
+    if args.mode == 'sync':
         sync_run()
+    elif args.mode == 'daemon':
+        asyncio.run(daemon_run(
+            args.loader, args.workers, args.writers, args.queue_size, args.archive_dir,
+        ))
+    elif args.mode == 'stream':
+        asyncio.run(stream_run(
+            args.loader, args.workers, args.writers, args.queue_size, args.archive_dir,
+        ))
     else:
-        asyncio.run(async_run())
+        asyncio.run(async_run(args.loader, args.workers, args.writers, args.queue_size))
@@ -0,0 +1,96 @@
+"""Versioned schema migrations for the trading_results database.
+
+Migrations are plain SQL files in versions/, named NNNN_description.sql
+and applied in order. Applied versions are recorded in
+schema_migrations; an advisory lock keeps concurrent runs (several
+scraper containers) from applying the same migration twice.
+"""
+import re
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+
+VERSIONS_DIR = Path(__file__).parent / "versions"
+ADVISORY_LOCK_ID = 7_262_001
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    path: Path
+
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+
+def discover() -> List[Migration]:
+    migrations = []
+    for path in sorted(VERSIONS_DIR.glob("*.sql")):
+        m = re.match(r"^(\d{4})_(\w+)\.sql$", path.name)
+        if not m:
+            raise RuntimeError(f"Bad migration file name: {path.name}")
+        migrations.append(Migration(m.group(1), m.group(2), path))
+    return migrations
+
+
+async def _ensure_table(conn: AsyncConnection) -> None:
+    await conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version TEXT PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " applied_on TIMESTAMP NOT NULL DEFAULT now()"
+        ")"
+    )
+
+
+async def applied_versions(conn: AsyncConnection) -> List[str]:
+    await _ensure_table(conn)
+    rows = await conn.exec_driver_sql(
+        "SELECT version FROM schema_migrations ORDER BY version"
+    )
+    return [r[0] for r in rows.fetchall()]
+
+
+async def _execute_script(conn: AsyncConnection, sql: str) -> None:
+    # asyncpg runs multi-statement scripts only without bind parameters,
+    # through the driver connection (same transaction as conn).
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.execute(sql)
+
+
+async def upgrade(engine: AsyncEngine, target: Optional[str] = None) -> List[str]:
+    """Apply pending migrations (up to target) in one transaction.
+
+    Returns the versions applied.
+    """
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            f"SELECT pg_advisory_xact_lock({ADVISORY_LOCK_ID})"
+        )
+        done = set(await applied_versions(conn))
+        applied = []
+        for migration in discover():
+            if target is not None and migration.version > target:
+                break
+            if migration.version in done:
+                continue
+            await _execute_script(conn, migration.sql())
+            await conn.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                (migration.version, migration.name),
+            )
+            applied.append(migration.version)
+            print(f"[MIGRATE] {migration.version}_{migration.name}")
+    return applied
+
+
+async def status(engine: AsyncEngine) -> List[str]:
+    """Lines like '0001_create_trading_results applied|pending'"""
+    async with engine.begin() as conn:
+        done = set(await applied_versions(conn))
+    return [
+        f"{m.version}_{m.name} {'applied' if m.version in done else 'pending'}"
+        for m in discover()
+    ]
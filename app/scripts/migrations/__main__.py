@@ -0,0 +1,24 @@
+import asyncio
+import sys
+from typing import Optional
+
+from scripts.hw import engine
+from scripts.migrations import status, upgrade
+
+
+async def main(command: str, target: Optional[str] = None) -> None:
+    try:
+        if command == "upgrade":
+            applied = await upgrade(engine, target)
+            print(f"Applied {len(applied)} migration(s)")
+        elif command == "status":
+            for line in await status(engine):
+                print(line)
+        else:
+            raise SystemExit(f"Unknown command: {command} (upgrade [VERSION]|status)")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*sys.argv[1:3]) if len(sys.argv) > 1 else main("upgrade"))
@@ -0,0 +1,16 @@
+-- Baseline: the table as previously created by Base.metadata.create_all.
+CREATE TABLE IF NOT EXISTS trading_results (
+    id SERIAL PRIMARY KEY,
+    exchange_product_id TEXT,
+    exchange_product_name TEXT,
+    oil_id TEXT,
+    delivery_basis_id TEXT,
+    delivery_basis_name TEXT,
+    delivery_type_id TEXT,
+    volume NUMERIC,
+    total NUMERIC,
+    count INTEGER,
+    date DATE,
+    created_on TIMESTAMP WITHOUT TIME ZONE,
+    updated_on TIMESTAMP WITHOUT TIME ZONE
+);
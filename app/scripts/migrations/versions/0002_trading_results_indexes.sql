@@ -0,0 +1,24 @@
+-- Indexes matched to the queries in api/models/crud.py.
+--
+-- (date, id): max(date), SELECT DISTINCT date ... ORDER BY date DESC
+-- without filters, date ranges, and the (date, id) keyset of
+-- /trading_results.
+CREATE INDEX IF NOT EXISTS ix_trading_results_date_id
+    ON trading_results (date, id);
+
+-- One (filter, date, id) index per filter column. The other two filter
+-- columns are INCLUDEd so the distinct-dates query stays an index-only
+-- scan whatever combination of filters is given.
+CREATE INDEX IF NOT EXISTS ix_trading_results_oil_id_date
+    ON trading_results (oil_id, date, id)
+    INCLUDE (delivery_basis_id, delivery_type_id);
+
+CREATE INDEX IF NOT EXISTS ix_trading_results_delivery_basis_id_date
+    ON trading_results (delivery_basis_id, date, id)
+    INCLUDE (oil_id, delivery_type_id);
+
+CREATE INDEX IF NOT EXISTS ix_trading_results_delivery_type_id_date
+    ON trading_results (delivery_type_id, date, id)
+    INCLUDE (oil_id, delivery_basis_id);
+
+ANALYZE trading_results;
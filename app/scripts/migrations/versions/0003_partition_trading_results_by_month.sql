@@ -0,0 +1,100 @@
+-- Range-partition trading_results by month on date.
+--
+-- Partitions are named trading_results_pYYYY_MM and created on demand by
+-- ensure_trading_results_partition(); rows for months without a
+-- partition land in trading_results_default and are moved out when
+-- that month's partition is created. The partition key must be part of
+-- the primary key, so it becomes (id, date) and date is NOT NULL; rows
+-- without a date cannot be routed (nor found by any endpoint) and are
+-- not carried over.
+
+DROP INDEX IF EXISTS ix_trading_results_date_id;
+DROP INDEX IF EXISTS ix_trading_results_oil_id_date;
+DROP INDEX IF EXISTS ix_trading_results_delivery_basis_id_date;
+DROP INDEX IF EXISTS ix_trading_results_delivery_type_id_date;
+ALTER TABLE trading_results RENAME TO trading_results_flat;
+ALTER TABLE trading_results_flat RENAME CONSTRAINT trading_results_pkey TO trading_results_flat_pkey;
+
+CREATE TABLE trading_results (
+    id INTEGER NOT NULL DEFAULT nextval('trading_results_id_seq'),
+    exchange_product_id TEXT,
+    exchange_product_name TEXT,
+    oil_id TEXT,
+    delivery_basis_id TEXT,
+    delivery_basis_name TEXT,
+    delivery_type_id TEXT,
+    volume NUMERIC,
+    total NUMERIC,
+    count INTEGER,
+    date DATE NOT NULL,
+    created_on TIMESTAMP WITHOUT TIME ZONE,
+    updated_on TIMESTAMP WITHOUT TIME ZONE,
+    CONSTRAINT trading_results_pkey PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+ALTER SEQUENCE trading_results_id_seq OWNED BY trading_results.id;
+
+CREATE TABLE trading_results_default PARTITION OF trading_results DEFAULT;
+
+-- Same indexes as 0002, now partitioned: every partition gets them.
+CREATE INDEX ix_trading_results_date_id
+    ON trading_results (date, id);
+CREATE INDEX ix_trading_results_oil_id_date
+    ON trading_results (oil_id, date, id)
+    INCLUDE (delivery_basis_id, delivery_type_id);
+CREATE INDEX ix_trading_results_delivery_basis_id_date
+    ON trading_results (delivery_basis_id, date, id)
+    INCLUDE (oil_id, delivery_type_id);
+CREATE INDEX ix_trading_results_delivery_type_id_date
+    ON trading_results (delivery_type_id, date, id)
+    INCLUDE (oil_id, delivery_basis_id);
+
+CREATE OR REPLACE FUNCTION ensure_trading_results_partition(day DATE)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    lower_bound DATE := date_trunc('month', day)::DATE;
+    upper_bound DATE := (date_trunc('month', day) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'trading_results_p' || to_char(day, 'YYYY_MM');
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext(partition_name));
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE %I (LIKE trading_results INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        partition_name
+    );
+    -- Lets ATTACH skip the validation scan of the new table.
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I CHECK (date >= %L AND date < %L)',
+        partition_name, partition_name || '_range', lower_bound, upper_bound
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM trading_results_default'
+        ' WHERE date >= %L AND date < %L RETURNING *)'
+        ' INSERT INTO %I SELECT * FROM moved',
+        lower_bound, upper_bound, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE trading_results ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, lower_bound, upper_bound
+    );
+    RETURN partition_name;
+END
+$$;
+
+SELECT ensure_trading_results_partition(month::DATE)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT min(date) FROM trading_results_flat), current_date)),
+    date_trunc('month', GREATEST((SELECT max(date) FROM trading_results_flat), current_date)) + INTERVAL '1 month',
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO trading_results
+SELECT * FROM trading_results_flat WHERE date IS NOT NULL;
+
+DROP TABLE trading_results_flat;
+
+ANALYZE trading_results;
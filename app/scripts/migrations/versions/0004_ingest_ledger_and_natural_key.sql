@@ -0,0 +1,28 @@
+-- Idempotent ingestion.
+--
+-- ingest_ledger records every loaded bulletin file, so unchanged files
+-- are skipped without being parsed. trading_results gets a unique
+-- natural key (date, exchange_product_id, delivery_basis_id) that the
+-- loader upserts on; duplicates left by earlier re-runs are removed
+-- first, keeping the newest row of each key.
+
+CREATE TABLE IF NOT EXISTS ingest_ledger (
+    file_name TEXT PRIMARY KEY,
+    file_date DATE,
+    size_bytes BIGINT NOT NULL,
+    sha256 TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    loaded_on TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now()
+);
+
+DELETE FROM trading_results t
+USING trading_results newer
+WHERE newer.date = t.date
+  AND newer.exchange_product_id = t.exchange_product_id
+  AND newer.delivery_basis_id = t.delivery_basis_id
+  AND newer.id > t.id;
+
+CREATE UNIQUE INDEX uq_trading_results_date_product_basis
+    ON trading_results (date, exchange_product_id, delivery_basis_id);
+
+ANALYZE trading_results;
@@ -0,0 +1,53 @@
+-- Daily rollup behind /dynamics/aggregate.
+--
+-- One row per (date, oil_id, delivery_basis_id, delivery_type_id) with
+-- the sums of volume, total and count; weeks, months and coarser
+-- groupings are summed from it at query time. The scraper calls
+-- refresh_trading_results_daily(dates) in the transaction that loads a
+-- file, so only the dates it just ingested are recomputed.
+
+CREATE TABLE IF NOT EXISTS trading_results_daily (
+    date DATE NOT NULL,
+    oil_id TEXT NOT NULL,
+    delivery_basis_id TEXT NOT NULL,
+    delivery_type_id TEXT NOT NULL,
+    volume NUMERIC NOT NULL,
+    total NUMERIC NOT NULL,
+    count BIGINT NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (date, oil_id, delivery_basis_id, delivery_type_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_trading_results_daily_oil_id_date
+    ON trading_results_daily (oil_id, date);
+CREATE INDEX IF NOT EXISTS ix_trading_results_daily_delivery_basis_id_date
+    ON trading_results_daily (delivery_basis_id, date);
+CREATE INDEX IF NOT EXISTS ix_trading_results_daily_delivery_type_id_date
+    ON trading_results_daily (delivery_type_id, date);
+
+CREATE OR REPLACE FUNCTION refresh_trading_results_daily(days DATE[])
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    refreshed INTEGER;
+BEGIN
+    DELETE FROM trading_results_daily WHERE date = ANY(days);
+    INSERT INTO trading_results_daily
+        (date, oil_id, delivery_basis_id, delivery_type_id, volume, total, count, rows)
+    SELECT date, oil_id, delivery_basis_id, delivery_type_id,
+           coalesce(sum(volume), 0), coalesce(sum(total), 0), coalesce(sum(count), 0), count(*)
+    FROM trading_results
+    WHERE date = ANY(days)
+      AND oil_id IS NOT NULL
+      AND delivery_basis_id IS NOT NULL
+      AND delivery_type_id IS NOT NULL
+    GROUP BY date, oil_id, delivery_basis_id, delivery_type_id;
+    GET DIAGNOSTICS refreshed = ROW_COUNT;
+    RETURN refreshed;
+END;
+$$;
+
+SELECT refresh_trading_results_daily(ARRAY(SELECT DISTINCT date FROM trading_results));
+
+ANALYZE trading_results_daily;
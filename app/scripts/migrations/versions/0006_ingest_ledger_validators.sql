@@ -0,0 +1,9 @@
+-- HTTP validators of ledger files.
+--
+-- The ETag / Last-Modified a bulletin was served with, so that the
+-- daemon re-checks recent files with conditional requests instead of
+-- downloading them again.
+
+ALTER TABLE ingest_ledger
+    ADD COLUMN IF NOT EXISTS etag TEXT,
+    ADD COLUMN IF NOT EXISTS last_modified TEXT;
@@ -0,0 +1,184 @@
+"""Monthly partitions of trading_results (see migrations/0003).
+
+    python -m scripts.partitions list
+    python -m scripts.partitions ensure --from 2025-07-01 --to 2025-09-01
+    python -m scripts.partitions detach --before 2023-01-01 [--export DIR] [--drop]
+
+detach removes every partition whose months end on or before --before
+from trading_results (and their days from the daily rollup). Detached
+partitions are moved to the `archive` schema (queryable, invisible to
+the API); --export additionally writes
+each one to DIR/<partition>.csv and --drop deletes them instead of
+archiving. Either way the rows disappear from the API, so the cache
+generation is bumped when anything was detached.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import os
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+ARCHIVE_SCHEMA = "archive"
+PARTITIONS_AHEAD = int(os.getenv("PARTITIONS_AHEAD", "1"))
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: Optional[dt.date]
+    upper: Optional[dt.date]
+    rows: int
+
+
+def month_start(day: dt.date) -> dt.date:
+    return day.replace(day=1)
+
+
+def add_months(day: dt.date, months: int) -> dt.date:
+    month = day.month - 1 + months
+    return dt.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def months_to_ensure(dates: Iterable[dt.date], ahead: int = PARTITIONS_AHEAD) -> List[dt.date]:
+    """First days of the months covering dates, plus `ahead` upcoming months"""
+    months = {month_start(d) for d in dates if d is not None}
+    if not months:
+        return []
+    last = max(months)
+    months.update(add_months(last, n) for n in range(1, ahead + 1))
+    return sorted(months)
+
+
+async def ensure_partitions(
+    engine: AsyncEngine,
+    dates: Iterable[dt.date],
+    ahead: int = PARTITIONS_AHEAD,
+) -> List[str]:
+    """Create missing partitions for dates (and upcoming months).
+
+    Runs in its own short transaction so the DDL never holds locks on
+    trading_results for the length of an ingest.
+    """
+    months = months_to_ensure(dates, ahead)
+    if not months:
+        return []
+    async with engine.begin() as conn:
+        rows = await conn.execute(
+            text("SELECT ensure_trading_results_partition(m) FROM unnest(CAST(:months AS date[])) AS m"),
+            {"months": months},
+        )
+        return [r[0] for r in rows.fetchall()]
+
+
+async def list_partitions(engine: AsyncEngine) -> List[Partition]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint"
+            " FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid"
+            " WHERE i.inhparent = 'trading_results'::regclass"
+            " ORDER BY c.relname"
+        ))
+        return [_parse_partition(name, bound, rows) for name, bound, rows in rows.fetchall()]
+
+
+def _parse_partition(name: str, bound: str, rows: int) -> Partition:
+    # bound is "FOR VALUES FROM ('2025-07-01') TO ('2025-08-01')" or "DEFAULT"
+    if bound == "DEFAULT":
+        return Partition(name, None, None, max(rows, 0))
+    lower, upper = [part.split("'")[1] for part in bound.split(" TO ")]
+    return Partition(name, dt.date.fromisoformat(lower), dt.date.fromisoformat(upper), max(rows, 0))
+
+
+async def detach_partitions(
+    engine: AsyncEngine,
+    before: dt.date,
+    export_dir: Optional[str] = None,
+    drop: bool = False,
+) -> List[str]:
+    """Detach partitions ending on or before `before`; archive or drop them"""
+    detached = []
+    for partition in await list_partitions(engine):
+        if partition.upper is None or partition.upper > before:
+            continue
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql(
+                f'ALTER TABLE trading_results DETACH PARTITION "{partition.name}"'
+            )
+            if export_dir:
+                os.makedirs(export_dir, exist_ok=True)
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.copy_from_table(
+                    partition.name,
+                    output=os.path.join(export_dir, f"{partition.name}.csv"),
+                    format="csv",
+                    header=True,
+                )
+            await conn.execute(
+                text("DELETE FROM trading_results_daily WHERE date >= :lower AND date < :upper"),
+                {"lower": partition.lower, "upper": partition.upper},
+            )
+            if drop:
+                await conn.exec_driver_sql(f'DROP TABLE "{partition.name}"')
+            else:
+                await _archive(conn, partition.name)
+        detached.append(partition.name)
+        print(f"[DETACH] {partition.name} ({partition.lower} .. {partition.upper})")
+    return detached
+
+
+async def _archive(conn, name: str) -> None:
+    await conn.exec_driver_sql(f'CREATE SCHEMA IF NOT EXISTS "{ARCHIVE_SCHEMA}"')
+    archived = (await conn.exec_driver_sql(
+        f"SELECT to_regclass('\"{ARCHIVE_SCHEMA}\".\"{name}\"')"
+    )).scalar_one()
+    if archived is None:
+        await conn.exec_driver_sql(f'ALTER TABLE "{name}" SET SCHEMA "{ARCHIVE_SCHEMA}"')
+    else:
+        # The month was re-ingested after an earlier archive: append.
+        await conn.exec_driver_sql(
+            f'INSERT INTO "{ARCHIVE_SCHEMA}"."{name}" SELECT * FROM "{name}"'
+        )
+        await conn.exec_driver_sql(f'DROP TABLE "{name}"')
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    from scripts.hw import bump_cache_generation, engine
+
+    parser = argparse.ArgumentParser(description="Manage trading_results partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    ensure = sub.add_parser("ensure")
+    ensure.add_argument("--from", dest="start", type=dt.date.fromisoformat, required=True)
+    ensure.add_argument("--to", dest="end", type=dt.date.fromisoformat, required=True)
+    detach = sub.add_parser("detach")
+    detach.add_argument("--before", type=dt.date.fromisoformat, required=True)
+    detach.add_argument("--export", dest="export_dir")
+    detach.add_argument("--drop", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "list":
+            for p in await list_partitions(engine):
+                bounds = "DEFAULT" if p.lower is None else f"{p.lower} .. {p.upper}"
+                print(f"{p.name:<32} {bounds:<26} ~{p.rows} rows")
+        elif args.command == "ensure":
+            months = []
+            month = month_start(args.start)
+            while month <= args.end:
+                months.append(month)
+                month = add_months(month, 1)
+            for name in await ensure_partitions(engine, months, ahead=0):
+                print(name)
+        else:
+            if await detach_partitions(engine, args.before, args.export_dir, args.drop):
+                await bump_cache_generation()
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
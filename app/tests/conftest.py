@@ -0,0 +1,53 @@
+import os
+
+import pytest
+import pytest_asyncio
+
+from benchmarks import synthetic
+from benchmarks.synthetic import COLUMNS
+from scripts.migrations import upgrade
+from scripts.partitions import ensure_partitions
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+async def copy_rows(engine, rows, table: str = "trading_results") -> None:
+    rows = list(rows)
+    if table == "trading_results":
+        await ensure_partitions(engine, {row[COLUMNS.index("date")] for row in rows})
+    async with engine.begin() as conn:
+        raw = await conn.get_raw_connection()
+        await synthetic.copy_rows(raw.driver_connection, rows, table)
+        await conn.exec_driver_sql(f"ANALYZE {table}")
+
+
+@pytest.fixture(autouse=True)
+def api_db(monkeypatch):
+    """Route tests run without the app lifespan: give the API an engine,
+    which only connects if a test actually reaches the DB"""
+    from api.core.settings import Settings
+    from api.models import db
+
+    monkeypatch.setattr(db, "engine", None)
+    monkeypatch.setattr(db, "read_router", None)
+    db.init_db(Settings(database_url=TEST_DATABASE_URL or "postgresql+asyncpg://spimex@localhost/spimex"))
+
+
+@pytest_asyncio.fixture
+async def pg_engine():
+    """Migrated, empty database; the schema in TEST_DATABASE_URL is reset"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(TEST_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("DROP SCHEMA IF EXISTS archive CASCADE")
+        await conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+        await conn.exec_driver_sql("CREATE SCHEMA public")
+    await upgrade(engine)
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
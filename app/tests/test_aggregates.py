@@ -0,0 +1,132 @@
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import pandas as pd
+import pytest
+
+from api.entities.schemas import AggregateResponse
+from api.main import app
+from api.models.crud import get_aggregates
+from api.routers.services import get_aggregates_service
+from benchmarks.synthetic import COLUMNS, synthetic_rows
+from tests.conftest import copy_rows
+
+
+@pytest.mark.asyncio
+async def test_get_aggregates_groups_the_daily_rollup():
+    rows = MagicMock()
+    rows.all.return_value = []
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=rows)
+
+    await get_aggregates(
+        session,
+        start_date=date(2025, 1, 1),
+        end_date=date(2025, 3, 31),
+        period="month",
+        group_by=["oil_id"],
+        delivery_type_id="F",
+    )
+
+    sql = str(session.execute.await_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+    assert "FROM trading_results_daily" in sql
+    assert "date_trunc('month', trading_results_daily.date)" in sql
+    assert "GROUP BY" in sql and "trading_results_daily.oil_id" in sql
+    assert "trading_results_daily.delivery_type_id = 'F'" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_aggregates_service_rejects_inverted_range():
+    with pytest.raises(HTTPException) as excinfo:
+        await get_aggregates_service(AsyncMock(), date(2025, 2, 1), date(2025, 1, 1))
+    assert excinfo.value.status_code == 400
+
+
+def test_aggregate_route_parses_period_and_group_by(mocker):
+    service = mocker.patch(
+        "api.routers.aggregates.get_aggregates_service", new_callable=AsyncMock
+    )
+    service.return_value = AggregateResponse(period="week", group_by=["oil_id"], rows=[])
+    mocker.patch("api.core.cache.redis", AsyncMock(get=AsyncMock(return_value=None)))
+    client = TestClient(app)
+
+    response = client.get(
+        "/dynamics/aggregate?start_date=2025-01-01&end_date=2025-01-31"
+        "&period=week&group_by=oil_id&group_by=delivery_type_id"
+    )
+    assert response.status_code == 200
+    assert service.await_args.kwargs["period"] == "week"
+    assert service.await_args.kwargs["group_by"] == ["oil_id", "delivery_type_id"]
+
+    bad = client.get("/dynamics/aggregate?start_date=2025-01-01&end_date=2025-01-31&period=year")
+    assert bad.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_aggregates_match_raw_rows(pg_engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    rows = list(synthetic_rows(date(2025, 1, 1), days=90, products_per_day=20))
+    await copy_rows(pg_engine, rows)
+    async with pg_engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "SELECT refresh_trading_results_daily(ARRAY(SELECT DISTINCT date FROM trading_results))"
+        )
+
+    async with AsyncSession(pg_engine) as session:
+        result = await get_aggregates_service(
+            session,
+            start_date=date(2025, 1, 10),
+            end_date=date(2025, 3, 20),
+            period="month",
+            group_by=["oil_id", "oil_id"],
+            delivery_type_id="F",
+        )
+
+    raw = pd.DataFrame(rows, columns=COLUMNS)
+    raw = raw[(raw["date"] >= date(2025, 1, 10)) & (raw["date"] <= date(2025, 3, 20))]
+    raw = raw[raw["delivery_type_id"] == "F"]
+    raw["month"] = [d.replace(day=1) for d in raw["date"]]
+    expected = raw.groupby(["month", "oil_id"])[["volume", "total", "count"]].sum()
+
+    assert result.group_by == ["oil_id"]
+    assert len(result.rows) == len(expected)
+    for row in result.rows:
+        sums = expected.loc[(row.period_start, row.oil_id)]
+        assert row.delivery_basis_id is None
+        assert row.volume == pytest.approx(Decimal(str(sums["volume"])))
+        assert row.total == pytest.approx(Decimal(str(sums["total"])))
+        assert row.count == sums["count"]
+        assert row.avg_price == round(row.total / row.volume, 4)
+
+
+@pytest.mark.asyncio
+async def test_scraper_refreshes_only_the_ingested_dates(pg_engine):
+    from scripts.hw import LOADERS, ParsedFile, clean_df, make_writer
+
+    def frame(day):
+        return clean_df(pd.DataFrame(
+            list(synthetic_rows(day, days=1, products_per_day=6)), columns=COLUMNS
+        ))
+
+    write = make_writer(pg_engine, LOADERS["copy"])
+    await write(ParsedFile("2025-07-14_a.xls", 1, "a", frame(date(2025, 7, 14))))
+    await write(ParsedFile("2025-07-15_b.xls", 1, "b", frame(date(2025, 7, 15))))
+    async with pg_engine.begin() as conn:
+        await conn.exec_driver_sql("UPDATE trading_results_daily SET rows = -1")
+
+    republished = frame(date(2025, 7, 15)).iloc[1:]
+    await write(ParsedFile("2025-07-15_b.xls", 1, "c", republished))
+
+    async with pg_engine.connect() as conn:
+        daily = (await conn.exec_driver_sql(
+            "SELECT date, sum(rows) FROM trading_results_daily GROUP BY date ORDER BY date"
+        )).fetchall()
+        raw_rows = (await conn.exec_driver_sql(
+            "SELECT count(*) FROM trading_results WHERE date = '2025-07-15'"
+        )).scalar_one()
+    assert daily[1] == (date(2025, 7, 15), raw_rows)
+    assert daily[0][0] == date(2025, 7, 14) and daily[0][1] < 0
@@ -0,0 +1,370 @@
+import asyncio
+import gzip
+import inspect
+import json
+from datetime import date
+from typing import Optional
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+import pytest
+
+from api.core import cache
+from api.core.cache import build_cache_key, cache_response
+from api.core.cached_response import CachedResponse
+from api.core.generation import GenerationTracker
+from api.core.local_cache import LocalCache
+from api.entities.schemas import (
+    DynamicsResponse,
+    LastTradingDatesResponse,
+    TradingResultsResponse,
+)
+from api.main import app
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.set_keys = []
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.set_keys.append(key)
+        self.store[key] = value
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = asyncio.Queue()
+        redis.subscriber = self
+
+    async def subscribe(self, *channels):
+        self.channels = channels
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+def _json(response):
+    return json.loads(response.body)
+
+
+@pytest.fixture(autouse=True)
+def clean_local_cache():
+    cache.local_cache.clear()
+    cache.cache_stats.reset()
+    cache.generation.value = 0
+    yield
+    cache.local_cache.clear()
+    cache.cache_stats.reset()
+    cache.generation.value = 0
+
+
+@pytest.fixture
+def fake_redis(mocker):
+    redis = FakeRedis()
+    mocker.patch("api.core.cache.redis", redis)
+    return redis
+
+
+@pytest.fixture
+def session_factory(mocker):
+    factory = MagicMock(return_value=AsyncMock())
+    mocker.patch("api.models.db.AsyncSessionLocal", factory)
+    return factory
+
+
+def _dummy_route(
+    start_date: date,
+    oil_id: Optional[str] = None,
+    count: int = 5,
+    session=Depends(lambda: None),
+):
+    pass
+
+
+def test_build_cache_key_is_canonical():
+    sig = inspect.signature(_dummy_route)
+    key_a = build_cache_key("p", sig, (), {
+        "start_date": date(2025, 7, 1), "oil_id": None, "count": 5, "session": object(),
+    })
+    key_b = build_cache_key("p", sig, (date(2025, 7, 1),), {"session": object()})
+    assert key_a == key_b == 'p:{"count":5,"start_date":"2025-07-01"}'
+
+
+@pytest.mark.parametrize(
+    "service, response, urls",
+    [
+        (
+            "api.routers.dynamics.get_dynamics_service",
+            DynamicsResponse(trades=[]),
+            [
+                "/dynamics?start_date=2025-07-01&end_date=2025-07-10&oil_id=A100",
+                "/dynamics?oil_id=A100&end_date=2025-07-10&start_date=2025-07-01",
+            ],
+        ),
+        (
+            "api.routers.last_trading_dates.get_last_trading_dates_service",
+            LastTradingDatesResponse(dates=[date(2025, 7, 10)]),
+            ["/last_trading_dates", "/last_trading_dates?count=5"],
+        ),
+        (
+            "api.routers.trading_results.get_trading_results_service",
+            TradingResultsResponse(results=[]),
+            [
+                "/trading_results?oil_id=A100",
+                "/trading_results?limit=100&oil_id=A100",
+            ],
+        ),
+    ],
+)
+def test_identical_requests_share_key_and_skip_session_on_hit(
+    mocker, fake_redis, session_factory, service, response, urls
+):
+    mock_service = mocker.patch(service, new_callable=AsyncMock)
+    mock_service.return_value = response
+    client = TestClient(app)
+
+    first = client.get(urls[0])
+    assert first.status_code == 200
+    assert session_factory.call_count == 1
+    assert len(fake_redis.set_keys) == 1
+
+    second = client.get(urls[1])
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert session_factory.call_count == 1
+    assert mock_service.await_count == 1
+    assert len(fake_redis.store) == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_local_cache_evicts_by_entries_bytes_and_ttl():
+    clock = FakeClock()
+    local = LocalCache(max_entries=2, max_bytes=100, ttl=10, clock=clock)
+
+    local.set("a", 1, size=10)
+    local.set("b", 2, size=10)
+    assert local.get("a") == 1
+    local.set("c", 3, size=10)
+    assert local.get("b") is None
+    assert local.get("a") == 1 and local.get("c") == 3
+
+    local.set("big", 4, size=90)
+    assert len(local) == 2 and local.size_bytes <= 100
+    local.set("too_big", 5, size=101)
+    assert local.get("too_big") is None
+
+    clock.now = 11
+    assert local.get("big") is None
+    assert len(local) == 1
+
+
+@pytest.mark.asyncio
+async def test_local_hit_skips_redis(fake_redis):
+    calls = []
+
+    @cache_response("local")
+    async def route(count: int = 5):
+        calls.append(count)
+        return {"count": count}
+
+    assert _json(await route(count=3)) == {"count": 3}
+    fake_redis.store.clear()
+    assert _json(await route(count=3)) == {"count": 3}
+    assert calls == [3]
+    assert cache.cache_stats.snapshot()["local"] == {
+        "local_hits": 1, "redis_hits": 0, "misses": 1, "coalesced": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced(fake_redis):
+    release = asyncio.Event()
+    calls = []
+
+    @cache_response("coalesce")
+    async def route(count: int = 5):
+        calls.append(count)
+        await release.wait()
+        return {"count": count}
+
+    tasks = [asyncio.create_task(route(count=1)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert [_json(r) for r in results] == [{"count": 1}] * 5
+    assert calls == [1]
+    assert len(fake_redis.set_keys) == 1
+    stats = cache.cache_stats.snapshot()["coalesce"]
+    assert stats["misses"] == 1 and stats["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_share_errors(fake_redis):
+    release = asyncio.Event()
+
+    @cache_response("errors")
+    async def route(count: int = 5):
+        await release.wait()
+        raise ValueError("boom")
+
+    tasks = [asyncio.create_task(route()) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert fake_redis.store == {}
+
+
+@pytest.mark.asyncio
+async def test_new_generation_drops_local_cache_and_changes_key(fake_redis):
+    calls = []
+
+    @cache_response("gen")
+    async def route(count: int = 5):
+        calls.append(count)
+        return {"count": count, "generation": cache.generation.value}
+
+    assert _json(await route()) == {"count": 5, "generation": 0}
+    assert len(cache.local_cache) == 1
+
+    cache.generation.update(1)
+    assert len(cache.local_cache) == 0
+    assert _json(await route()) == {"count": 5, "generation": 1}
+    assert calls == [5, 5]
+    assert fake_redis.set_keys == [
+        'gen:g0:{"count":5}',
+        'gen:g1:{"count":5}',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_generation_tracker_applies_announcements(fake_redis):
+    changes = []
+    fake_redis.store["cache:generation"] = "3"
+    tracker = GenerationTracker(fake_redis, on_change=changes.append, poll_interval=5)
+
+    listener = asyncio.create_task(tracker.listen())
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert tracker.value == 3
+
+    fake_redis.subscriber.messages.put_nowait({"type": "message", "data": "4"})
+    for _ in range(10):
+        await asyncio.sleep(0)
+    listener.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await listener
+
+    assert tracker.value == 4
+    assert changes == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_generation_tracker_keeps_the_last_ingest_event(fake_redis):
+    events = []
+    tracker = GenerationTracker(fake_redis, on_ingest=events.append, poll_interval=5)
+
+    listener = asyncio.create_task(tracker.listen())
+    for _ in range(10):
+        await asyncio.sleep(0)
+    event = {"rows": 12, "files": ["2025-07-16_a.xls"], "dates": ["2025-07-16"], "generation": 2}
+    fake_redis.subscriber.messages.put_nowait(
+        {"type": "message", "channel": b"ingest:events", "data": json.dumps(event).encode()}
+    )
+    for _ in range(10):
+        await asyncio.sleep(0)
+    listener.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await listener
+
+    assert fake_redis.subscriber.channels == ("cache:generation", "ingest:events")
+    assert tracker.value == 2
+    assert tracker.last_ingest == event
+    assert events == [event]
+
+
+def test_cached_response_round_trip_and_compression():
+    body = json.dumps({"trades": [{"id": i} for i in range(500)]}).encode()
+    cached = CachedResponse.encode(body, compress_min_bytes=1024)
+    assert cached.encoding == "gzip" and len(cached) < len(body)
+
+    restored = CachedResponse.from_bytes(cached.to_bytes())
+    assert restored.encoding == "gzip" and restored.body == cached.body
+
+    compressed = restored.to_response("gzip, deflate")
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == body
+    plain = restored.to_response("")
+    assert "content-encoding" not in plain.headers
+    assert plain.body == body
+
+    assert CachedResponse.encode(b"{}", compress_min_bytes=1024).encoding is None
+    assert CachedResponse.from_bytes(b'{"legacy": "entry"}') is None
+
+
+@pytest.mark.parametrize("accept_encoding, compressed", [
+    ("gzip", True),
+    ("br;q=1.0, GZIP;q=0.5", True),
+    ("*", True),
+    ("", False),
+    ("deflate, br", False),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000, deflate", False),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False),
+    ("identity, *;q=0.1", True),
+])
+def test_cached_gzip_body_follows_the_accepted_encodings(accept_encoding, compressed):
+    body = b"x" * 4096
+    cached = CachedResponse.encode(body, compress_min_bytes=1024)
+
+    response = cached.to_response(accept_encoding)
+    assert ("content-encoding" in response.headers) is compressed
+    assert (gzip.decompress(response.body) if compressed else response.body) == body
+
+
+def test_hit_is_served_without_response_model_validation(
+    mocker, fake_redis, session_factory
+):
+    mock_service = mocker.patch(
+        "api.routers.dynamics.get_dynamics_service", new_callable=AsyncMock
+    )
+    mock_service.return_value = DynamicsResponse(trades=[])
+    client = TestClient(app)
+    url = "/dynamics?start_date=2025-07-01&end_date=2025-07-10"
+    first = client.get(url)
+
+    serialize = mocker.patch(
+        "fastapi.routing.serialize_response", side_effect=AssertionError
+    )
+    cache.local_cache.clear()
+    second = client.get(url)
+
+    assert second.status_code == 200
+    assert second.headers["content-type"] == "application/json"
+    assert second.content == first.content == b'{"trades":[]}'
+    serialize.assert_not_called()
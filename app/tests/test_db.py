@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+from fastapi.testclient import TestClient
+import pytest
+
+from api.core.settings import Settings
+from api.models import db
+from api.models.db import PoolStats, make_engine, pool_status, warm_pool
+from tests.conftest import TEST_DATABASE_URL
+
+
+def test_make_engine_uses_configured_pool(mocker):
+    create = mocker.patch("api.models.db.create_async_engine")
+    mocker.patch("api.core.metrics.instrument_engine")
+    mocker.patch("api.core.profiling.instrument_engine")
+    settings = Settings(database_url="postgresql+asyncpg://u:p@localhost/db", command_timeout=15.0)
+
+    make_engine(settings=settings, pool_size=7)
+    kwargs = create.call_args.kwargs
+
+    assert create.call_args.args == (settings.database_url,)
+    assert kwargs["poolclass"] is db.InstrumentedPool
+    assert kwargs["pool_size"] == 7
+    assert kwargs["max_overflow"] == settings.max_overflow
+    assert kwargs["pool_pre_ping"] is False
+    assert kwargs["connect_args"] == {
+        "ssl": False,
+        "statement_cache_size": settings.statement_cache_size,
+        "prepared_statement_cache_size": settings.prepared_statement_cache_size,
+        "command_timeout": 15.0,
+    }
+
+    mocker.stopall()
+    pool = make_engine(settings=settings, pool_size=3).pool
+    assert isinstance(pool, db.InstrumentedPool) and pool.size() == 3
+
+
+def test_settings_split_the_connection_budget_between_workers(monkeypatch):
+    monkeypatch.setattr("dotenv.load_dotenv", lambda: None)
+    monkeypatch.delenv("DB_POOL_SIZE", raising=False)
+    monkeypatch.delenv("DB_POOL_WARM", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "postgresql+asyncpg://u:p@db/spimex")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "40")
+
+    settings = Settings.from_env()
+    assert settings.database_url == "postgresql+asyncpg://u:p@db/spimex"
+    assert (settings.workers, settings.pool_size, settings.max_overflow) == (4, 10, 0)
+    assert settings.pool_warm == 10
+
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    assert (Settings.from_env().pool_size, Settings.from_env().max_overflow) == (3, 7)
+
+
+def test_the_budget_caps_the_example_env(monkeypatch):
+    """.env.example sets DB_POOL_SIZE; a small share must still cap
+    the pool and the warm-up, or warm_pool would wait out pool_timeout"""
+    from dotenv import dotenv_values
+
+    monkeypatch.setattr("dotenv.load_dotenv", lambda: None)
+    for name, value in dotenv_values(os.path.join(os.path.dirname(__file__), "..", ".env.example")).items():
+        monkeypatch.setenv(name, value or "")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "12")
+
+    settings = Settings.from_env()
+    assert (settings.pool_size, settings.max_overflow, settings.pool_warm) == (3, 0, 3)
+
+    monkeypatch.setenv("DB_POOL_WARM", "5")
+    assert Settings.from_env().pool_warm == 3
+
+
+def test_nothing_is_connected_before_the_lifespan(mocker):
+    mocker.patch("api.models.db.engine", None)
+    mocker.patch("api.models.db.read_router", None)
+    with pytest.raises(RuntimeError, match="init_db"):
+        db.read_engine()
+
+
+def test_pool_stats_buckets_wait_times():
+    stats = PoolStats()
+    for seconds in (0.0005, 0.002, 0.2, 7.0):
+        stats.observe(seconds)
+    snapshot = stats.snapshot()
+
+    assert snapshot["checkouts"] == 4
+    assert snapshot["wait_seconds_max"] == 7.0
+    assert snapshot["wait_buckets"]["0.001"] == 1
+    assert snapshot["wait_buckets"]["0.005"] == 1
+    assert snapshot["wait_buckets"]["0.5"] == 1
+    assert snapshot["wait_buckets"]["+Inf"] == 1
+
+
+def test_lifespan_creates_clients_from_settings_and_closes_them(mocker):
+    from api import main
+
+    settings = Settings(database_url="postgresql+asyncpg://u:p@localhost/db", pool_warm=3)
+    mocker.patch("api.main.get_settings", return_value=settings)
+    init_redis = mocker.patch("api.main.init_redis")
+    close_redis = mocker.patch("api.main.close_redis", new_callable=AsyncMock)
+    engine = MagicMock()
+    init_db = mocker.patch("api.main.db.init_db", return_value=engine)
+    close_db = mocker.patch("api.main.db.close_db", new_callable=AsyncMock)
+    mocker.patch("api.main.db.read_router", MagicMock(replicas=[]))
+    warm = mocker.patch("api.main.db.warm_pool", new_callable=AsyncMock)
+    liveness = mocker.patch("api.main.db.check_liveness", new_callable=AsyncMock)
+    mocker.patch.object(main.generation, "listen", new_callable=AsyncMock)
+    refresh = mocker.patch.object(main.generation, "refresh", new_callable=AsyncMock)
+
+    with TestClient(main.app):
+        assert main.app.state.settings is settings
+        refresh.assert_awaited_once()
+        init_redis.assert_called_once_with(settings.redis_url)
+        init_db.assert_called_once_with(settings)
+        warm.assert_awaited_once_with(engine, 3)
+        close_db.assert_not_awaited()
+    liveness.assert_called_once_with(engine, settings.liveness_interval)
+    close_db.assert_awaited_once()
+    close_redis.assert_awaited_once()
+
+
+def test_lifespan_reads_the_generation_before_serving(mocker):
+    from api import main
+
+    mocker.patch("api.main.get_settings", return_value=Settings(
+        database_url="postgresql+asyncpg://u:p@localhost/db", pool_warm=0, liveness_interval=0,
+        generation_key="test:generation",
+    ))
+    redis = MagicMock(get=AsyncMock(return_value=b"7"), aclose=AsyncMock())
+    mocker.patch("redis.asyncio.Redis.from_url", return_value=redis)
+    mocker.patch("api.main.db.close_db", new_callable=AsyncMock)
+    mocker.patch.object(main.generation, "listen", new_callable=AsyncMock)
+    mocker.patch.object(main.generation, "value", 0)
+    mocker.patch.object(main.generation, "key", main.generation.key)
+
+    with TestClient(main.app):
+        assert main.generation.value == 7
+    redis.get.assert_awaited_with("test:generation")
+
+    redis.get.side_effect = ConnectionError("redis is down")
+    with TestClient(main.app) as client:
+        assert client.get("/cache/stats").status_code == 200
+
+
+def test_pool_wait_leaves_out_opening_connections_and_is_kept_per_pool():
+    def connect():
+        time.sleep(0.05)
+        return MagicMock()
+
+    primary = db.InstrumentedPool(connect, pool_size=1, max_overflow=0)
+    replica = db.InstrumentedPool(connect, pool_size=1, max_overflow=0)
+    primary.connect().close()
+
+    assert primary.stats.checkouts == 1 and primary.stats.wait_seconds_max < 0.01
+    assert replica.stats.checkouts == 0
+    assert primary.recreate().stats is primary.stats
+
+
+@pytest.fixture
+def pool_engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return make_engine(TEST_DATABASE_URL, pool_size=2, max_overflow=0, pool_timeout=0.2)
+
+
+@pytest.mark.asyncio
+async def test_warm_pool_and_contention_are_reported(pool_engine):
+    try:
+        assert await warm_pool(pool_engine, 2) == 2
+        status = pool_status(pool_engine)
+        assert (status["idle"], status["checked_out"]) == (2, 0)
+
+        async def hold(seconds):
+            async with pool_engine.connect() as conn:
+                await conn.exec_driver_sql(f"SELECT pg_sleep({seconds})")
+
+        await asyncio.gather(hold(0.05), hold(0.05), hold(0.05))
+        status = pool_status(pool_engine)
+        assert status["checkouts"] == 5
+        assert status["wait_seconds_max"] >= 0.04
+
+        with pytest.raises(Exception, match="QueuePool limit"):
+            await asyncio.gather(hold(0.5), hold(0.5), hold(0.5))
+        assert pool_status(pool_engine)["timeouts"] == 1
+    finally:
+        await pool_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_failed_liveness_check_drops_pooled_connections(mocker):
+    conn = AsyncMock()
+    conn.exec_driver_sql.side_effect = [None, OSError("connection refused")]
+    engine = MagicMock(dispose=AsyncMock())
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 2:
+            raise asyncio.CancelledError
+
+    mocker.patch("api.models.db.asyncio.sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await db.check_liveness(engine, interval=5)
+
+    assert sleeps == [5, 5, 5]
+    assert conn.exec_driver_sql.await_count == 2
+    engine.dispose.assert_awaited_once()
@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from datetime import date, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from scripts.hw import (
+    fetch_download_links,
+    make_http_session,
+    poll_once,
+    read_validators,
+    stream_to_db,
+)
+
+
+PAGES = {
+    None: ["20250716", "20250715", "20250715"],
+    "page-2": ["20250714", "20250711"],
+}
+
+
+class StandIn:
+    """Fake spimex.com: listing pages and bulletins with ETags"""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.not_modified = Counter()
+        self.failures = Counter()
+        self.bodies = {}
+        self.before_page = {}
+        self.app = web.Application()
+        self.app.router.add_get("/results/", self.listing)
+        self.app.router.add_get("/upload/{name}", self.bulletin)
+
+    async def listing(self, request):
+        self.hits["listing"] += 1
+        page = request.query.get("page")
+        if page in self.before_page:
+            await self.before_page[page]()
+        days = PAGES.get(page, [])
+        links = "".join(
+            f'<a href="/upload/oil_xls_{day}162000.xls?r=1">{day}</a>' for day in days
+        )
+        return web.Response(text=f"<html><body>{links}</body></html>", content_type="text/html")
+
+    async def bulletin(self, request):
+        name = request.match_info["name"]
+        self.hits[name] += 1
+        if self.failures[name] > 0:
+            self.failures[name] -= 1
+            return web.Response(status=503)
+        if name in self.bodies:
+            etag = f'"{hashlib.sha256(self.bodies[name]).hexdigest()[:16]}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.not_modified[name] += 1
+                return web.Response(status=304)
+            return web.Response(body=self.bodies[name], headers={"ETag": etag})
+        if name == "oil_xls_20250714162000.xls":
+            return web.Response(status=404)
+        etag = f'"{name}-v1"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(body=name.encode() * 10_000, headers={"ETag": etag})
+
+
+@pytest_asyncio.fixture
+async def stand_in(tmp_path, mocker):
+    site = StandIn()
+    server = TestServer(site.app)
+    await server.start_server()
+    mocker.patch("scripts.hw.BASE_URL", str(server.make_url("/results/")))
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path))
+    mocker.patch("scripts.hw.START_DATE", date(2025, 7, 14))
+    mocker.patch("scripts.hw.HTTP_BACKOFF", 0)
+    mocker.patch("scripts.hw.RECHECK_DAYS", 0)
+    try:
+        yield site
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_downloads_stream_to_disk_with_retries(stand_in, tmp_path):
+    stand_in.failures["oil_xls_20250715162000.xls"] = 2
+
+    async with make_http_session() as session:
+        changed = await fetch_download_links(session)
+
+    names = sorted(os.path.basename(p) for p in changed)
+    assert names == ["2025-07-15_oil_xls_20250715162000.xls", "2025-07-16_oil_xls_20250716162000.xls"]
+    assert stand_in.hits["oil_xls_20250715162000.xls"] == 3
+    assert stand_in.hits["oil_xls_20250714162000.xls"] == 1
+    assert stand_in.hits["listing"] == 2
+    path = tmp_path / "2025-07-16_oil_xls_20250716162000.xls"
+    assert path.read_bytes() == b"oil_xls_20250716162000.xls" * 10_000
+    assert read_validators(str(path)) == {"etag": '"oil_xls_20250716162000.xls-v1"'}
+    assert not list(tmp_path.glob("*.part"))
+
+
+@pytest.mark.asyncio
+async def test_existing_files_are_skipped_or_fetched_conditionally(stand_in, mocker):
+    async with make_http_session() as session:
+        await fetch_download_links(session)
+        stand_in.hits.clear()
+
+        assert await fetch_download_links(session) == []
+        assert stand_in.hits["oil_xls_20250716162000.xls"] == 0
+
+        mocker.patch("scripts.hw.RECHECK_DAYS", (date.today() - date(2025, 7, 1)).days)
+        assert await fetch_download_links(session) == []
+    assert stand_in.hits["oil_xls_20250716162000.xls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_loads_first_files_before_later_pages_are_listed(
+    stand_in, pg_engine, tmp_path, mocker
+):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletin_xls
+
+    for n, day in enumerate([date(2025, 7, 16), date(2025, 7, 15), date(2025, 7, 14)]):
+        path = tmp_path / f"{day:%Y%m%d}.xls"
+        write_bulletin_xls(str(path), day, rows=30, seed=n)
+        stand_in.bodies[f"oil_xls_{day:%Y%m%d}162000.xls"] = path.read_bytes()
+        path.unlink()
+
+    async def first_files_loaded():
+        for _ in range(100):
+            async with pg_engine.connect() as conn:
+                if (await conn.exec_driver_sql("SELECT count(*) FROM ingest_ledger")).scalar_one():
+                    return
+            await asyncio.sleep(0.05)
+        raise AssertionError("page 2 requested before anything was loaded")
+
+    stand_in.before_page["page-2"] = first_files_loaded
+    archive = tmp_path / "archive"
+    mocker.patch("scripts.hw.engine", pg_engine)
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path / "out"))
+    mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    async with make_http_session() as session:
+        inserted = await stream_to_db(session, workers=0, archive_dir=str(archive))
+        assert inserted > 0
+        assert await stream_to_db(session, workers=0) == 0
+
+    async with pg_engine.connect() as conn:
+        dates = (await conn.exec_driver_sql(
+            "SELECT DISTINCT date FROM trading_results ORDER BY date"
+        )).scalars().all()
+    assert dates == [date(2025, 7, 14), date(2025, 7, 15), date(2025, 7, 16)]
+    assert not (tmp_path / "out").exists()
+    assert sorted(p.name for p in archive.iterdir()) == [
+        "2025-07-14_oil_xls_20250714162000.xls",
+        "2025-07-15_oil_xls_20250715162000.xls",
+        "2025-07-16_oil_xls_20250716162000.xls",
+    ]
+    assert stand_in.hits["oil_xls_20250716162000.xls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_daemon_poll_costs_one_request_once_up_to_date(stand_in, pg_engine, tmp_path, mocker):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletin_xls
+
+    for n, day in enumerate([date(2025, 7, 16), date(2025, 7, 15), date(2025, 7, 14)]):
+        path = tmp_path / f"{day:%Y%m%d}.xls"
+        write_bulletin_xls(str(path), day, rows=30, seed=n)
+        stand_in.bodies[f"oil_xls_{day:%Y%m%d}162000.xls"] = path.read_bytes()
+    mocker.patch("scripts.hw.engine", pg_engine)
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    async with make_http_session() as session:
+        assert await poll_once(session, workers=0) > 0
+        assert bump.await_args.args[0]["dates"] == ["2025-07-14", "2025-07-15", "2025-07-16"]
+        stand_in.hits.clear()
+
+        assert await poll_once(session, workers=0) == 0
+        assert dict(stand_in.hits) == {"listing": 1}
+
+        PAGES[None].insert(0, "20250717")
+        path = tmp_path / "20250717.xls"
+        write_bulletin_xls(str(path), date(2025, 7, 17), rows=30, seed=9)
+        stand_in.bodies["oil_xls_20250717162000.xls"] = path.read_bytes()
+        try:
+            assert await poll_once(session, workers=0) > 0
+        finally:
+            PAGES[None].pop(0)
+    assert dict(stand_in.hits) == {"listing": 2, "oil_xls_20250717162000.xls": 1}
+    assert bump.await_args.args[0]["files"] == ["2025-07-17_oil_xls_20250717162000.xls"]
+
+
+@pytest.mark.asyncio
+async def test_daemon_rechecks_recent_bulletins_conditionally(stand_in, pg_engine, tmp_path, mocker):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletin_xls
+
+    today = date.today()
+    days = [today - timedelta(days=n) for n in range(3)]
+    names = [f"oil_xls_{day:%Y%m%d}162000.xls" for day in days]
+    for n, day in enumerate(days):
+        path = tmp_path / f"{day:%Y%m%d}.xls"
+        write_bulletin_xls(str(path), day, rows=30, seed=n)
+        stand_in.bodies[names[n]] = path.read_bytes()
+    # The first listing page ends with a day before START_DATE.
+    mocker.patch.dict(PAGES, {None: [f"{day:%Y%m%d}" for day in days + [today - timedelta(days=3)]]})
+    mocker.patch("scripts.hw.START_DATE", days[-1])
+    mocker.patch("scripts.hw.RECHECK_DAYS", 3)
+    mocker.patch("scripts.hw.engine", pg_engine)
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    async with make_http_session() as session:
+        assert await poll_once(session, workers=0) > 0
+        bump.reset_mock()
+        stand_in.hits.clear()
+
+        assert await poll_once(session, workers=0) == 0
+        assert dict(stand_in.hits) == {"listing": 1, **{name: 1 for name in names}}
+        assert dict(stand_in.not_modified) == {name: 1 for name in names}
+        bump.assert_not_awaited()
+
+        # Republished: served in full, loaded, and the new ETag stored.
+        path = tmp_path / "republished.xls"
+        write_bulletin_xls(str(path), days[0], rows=30, seed=7)
+        stand_in.bodies[names[0]] = path.read_bytes()
+        stand_in.not_modified.clear()
+        assert await poll_once(session, workers=0) > 0
+        assert await poll_once(session, workers=0) == 0
+    assert stand_in.not_modified[names[0]] == 1
+
+
+@pytest.mark.asyncio
+async def test_daemon_poll_retries_a_failed_older_bulletin(stand_in, pg_engine, tmp_path, mocker):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletin_xls
+
+    bodies = {}
+    for n, day in enumerate([date(2025, 7, 16), date(2025, 7, 15), date(2025, 7, 14)]):
+        path = tmp_path / f"{day:%Y%m%d}.xls"
+        write_bulletin_xls(str(path), day, rows=30, seed=n)
+        bodies[f"oil_xls_{day:%Y%m%d}162000.xls"] = path.read_bytes()
+    failed = "oil_xls_20250714162000.xls"
+    stand_in.bodies.update((name, body) for name, body in bodies.items() if name != failed)
+    mocker.patch("scripts.hw.engine", pg_engine)
+    mocker.patch("scripts.hw.RECHECK_DAYS", 3)
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    async with make_http_session() as session:
+        assert await poll_once(session, workers=0) > 0
+        assert bump.await_args.args[0]["dates"] == ["2025-07-15", "2025-07-16"]
+        stand_in.hits.clear()
+
+        stand_in.bodies[failed] = bodies[failed]
+        assert await poll_once(session, workers=0) > 0
+    assert bump.await_args.args[0]["files"] == ["2025-07-14_" + failed]
+    assert dict(stand_in.hits) == {"listing": 2, failed: 1}
@@ -1,4 +1,6 @@
 
+import tracemalloc
+from collections import namedtuple
 from datetime import date, datetime
 from decimal import Decimal
 from unittest.mock import AsyncMock, MagicMock
@@ -6,31 +8,39 @@ from unittest.mock import AsyncMock, MagicMock
 from fastapi import HTTPException
 import pytest
 
+from api.core.formats import encode_csv, encode_ndjson
 from api.entities.schemas import DynamicsResponse
-from api.models.crud import get_trading_results_by_date_range
-from api.routers.services import get_dynamics_service
-
-
-class DummyTradingResult:
-    id = 1
-    exchange_product_id = "ex_prod_1"
-    exchange_product_name = "Product 1"
-    oil_id = "oil_123"
-    delivery_basis_id = "basis_1"
-    delivery_basis_name = "Basis Name"
-    delivery_type_id = "type_1"
-    volume = Decimal("100.5")
-    total = Decimal("2000.75")
-    count = 5
-    date = date(2023, 8, 8)
-    created_on = datetime(2023, 8, 1, 12, 0, 0)
-    updated_on = datetime(2023, 8, 5, 12, 0, 0)
+from api.models.crud import TRADING_RESULT_COLUMNS, get_trading_results_by_date_range
+from api.routers.services import get_dynamics_service, stream_dynamics_service
+from benchmarks.synthetic import synthetic_rows
+from tests.conftest import copy_rows
+
+
+TradingResultRow = namedtuple("TradingResultRow", [c.name for c in TRADING_RESULT_COLUMNS])
+
+
+def DummyTradingResult():
+    return TradingResultRow(
+        id=1,
+        exchange_product_id="ex_prod_1",
+        exchange_product_name="Product 1",
+        oil_id="oil_123",
+        delivery_basis_id="basis_1",
+        delivery_basis_name="Basis Name",
+        delivery_type_id="type_1",
+        volume=Decimal("100.5"),
+        total=Decimal("2000.75"),
+        count=5,
+        date=date(2023, 8, 8),
+        created_on=datetime(2023, 8, 1, 12, 0, 0),
+        updated_on=datetime(2023, 8, 5, 12, 0, 0),
+    )
 
 
 @pytest.mark.asyncio
 async def test_get_trading_results_by_date_range(mocker):
     mock_rows = MagicMock()
-    mock_rows.scalars.return_value.all.return_value = ["record1", "record2"]
+    mock_rows.all.return_value = ["record1", "record2"]
 
     mock_session = AsyncMock()
     mock_session.execute.return_value = mock_rows
@@ -67,3 +77,111 @@ async def test_get_dynamics_service_valid_and_invalid_dates(mocker):
     assert trade.exchange_product_id == "ex_prod_1"
     assert isinstance(trade.volume, Decimal)
     assert trade.date == date(2023, 8, 8)
+
+
+def _row(**values):
+    row = MagicMock()
+    row._mapping = values
+    row.__iter__ = lambda self: iter(values.values())
+    return row
+
+
+def test_stream_encoders_render_values_like_the_json_endpoint():
+    row = _row(id=1, volume=Decimal("100.50"), date=date(2023, 8, 8),
+               created_on=datetime(2023, 8, 1, 12, 0), oil_id=None)
+
+    assert encode_ndjson([row]) == (
+        b'{"id": 1, "volume": "100.50", "date": "2023-08-08",'
+        b' "created_on": "2023-08-01T12:00:00", "oil_id": null}\n'
+    )
+    assert encode_csv([row], header=["id", "volume", "date", "created_on", "oil_id"]) == (
+        b"id,volume,date,created_on,oil_id\n1,100.50,2023-08-08,2023-08-01T12:00:00,\n"
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_dynamics_rejects_inverted_range():
+    with pytest.raises(HTTPException) as exc_info:
+        stream_dynamics_service(date(2023, 5, 2), date(2023, 5, 1), format="csv")
+    assert exc_info.value.status_code == 400
+
+
+async def _peak_memory(coro_fn):
+    tracemalloc.start()
+    try:
+        result = await coro_fn()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ["ndjson", "csv"])
+async def test_streamed_dynamics_memory_stays_flat(pg_engine, mocker, format):
+    await copy_rows(pg_engine, synthetic_rows(date(2024, 1, 1), days=365, products_per_day=60))
+    mocker.patch("api.routers.services.read_engine", return_value=pg_engine)
+
+    async def stream(end):
+        response = stream_dynamics_service(date(2024, 1, 1), end, format=format, chunk_size=500)
+        lines = 0
+        async for chunk in response.body_iterator:
+            lines += chunk.count(b"\n")
+        return lines - (format == "csv")
+
+    month, month_peak = await _peak_memory(lambda: stream(date(2024, 1, 31)))
+    year, year_peak = await _peak_memory(lambda: stream(date(2024, 12, 31)))
+
+    assert (month, year) == (1_380, 15_660)  # weekdays only
+    assert year_peak < 4 * 2 ** 20
+    assert year_peak < month_peak * 1.5
+
+
+def test_streamed_formats_bypass_the_response_cache(mocker):
+    from fastapi.responses import StreamingResponse
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    redis = AsyncMock()
+    mocker.patch("api.core.cache.redis", redis)
+
+    async def body():
+        yield b'{"id": 1}\n'
+
+    mocker.patch(
+        "api.routers.dynamics.stream_dynamics_service",
+        return_value=StreamingResponse(body(), media_type="application/x-ndjson"),
+    )
+    response = TestClient(app).get(
+        "/dynamics?start_date=2023-01-01&end_date=2023-01-31&format=ndjson"
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text == '{"id": 1}\n'
+    redis.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_column_rows_validate_like_orm_entities(pg_engine):
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from api.entities.schemas import TradingResultDetail
+    from api.models.models import TradingResult
+
+    await copy_rows(pg_engine, synthetic_rows(date(2024, 3, 1), days=10, products_per_day=20))
+    async with AsyncSession(pg_engine) as session:
+        result = await get_dynamics_service(session, date(2024, 3, 4), date(2024, 3, 8))
+        entities = (await session.execute(
+            select(TradingResult)
+            .where(TradingResult.date.between(date(2024, 3, 4), date(2024, 3, 8)))
+            .order_by(TradingResult.date, TradingResult.id)
+        )).scalars().all()
+
+    expected = DynamicsResponse(
+        trades=[TradingResultDetail.model_validate(e) for e in entities]
+    )
+    assert len(result.trades) == 100
+    # Ordered by (date, id) as returned, like the snapshot's answers
+    assert result.trades == expected.trades
+    assert result.model_dump_json() == DynamicsResponse(trades=result.trades).model_dump_json()
@@ -0,0 +1,129 @@
+import io
+from datetime import date
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+from fastapi import HTTPException, Response
+from fastapi.testclient import TestClient
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import select
+
+from api.core import cache, columnar
+from api.main import app
+from api.models.models import TradingResult
+from api.routers.services import export_dynamics_service
+from benchmarks.synthetic import synthetic_rows
+from tests.conftest import copy_rows
+from tests.test_cache import FakeRedis
+
+
+def _read(body: bytes, format: str) -> pa.Table:
+    if format == "parquet":
+        return pq.read_table(io.BytesIO(body))
+    return pa.ipc.open_stream(body).read_all()
+
+
+def test_table_from_csv_keeps_nulls_and_empty_strings_apart():
+    data = (
+        b'1,A592,"Product, ""A""",A5,ABS,"",F,10,1000.5,2,2025-01-10,'
+        b"2025-01-10 16:20:00,2025-01-10 16:20:00.123456\n"
+        b"2,B100,,B1,BRN,Base,,,,,2025-01-11,2025-01-11 16:20:00,\n"
+    )
+    table = columnar.table_from_csv(data)
+
+    assert table.schema == columnar.TRADING_RESULTS_SCHEMA
+    rows = table.to_pylist()
+    assert rows[0]["exchange_product_name"] == 'Product, "A"'
+    assert rows[0]["total"] == Decimal("1000.5")
+    assert rows[0]["delivery_basis_name"] == ""
+    assert rows[0]["updated_on"].microsecond == 123456
+    assert rows[1]["exchange_product_name"] is None
+    assert rows[1]["volume"] is None and rows[1]["count"] is None
+    assert rows[1]["date"] == date(2025, 1, 11)
+
+
+@pytest.mark.asyncio
+async def test_export_rejects_inverted_range():
+    with pytest.raises(HTTPException) as excinfo:
+        await export_dynamics_service(AsyncMock(), date(2025, 2, 1), date(2025, 1, 1))
+    assert excinfo.value.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+async def test_export_matches_the_stored_rows(pg_engine, format):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    rows = list(synthetic_rows(date(2024, 1, 1), days=60, products_per_day=10))
+    await copy_rows(pg_engine, rows)
+    async with pg_engine.begin() as conn:
+        # Beyond float64 precision
+        await conn.exec_driver_sql(
+            "UPDATE trading_results SET total = 123456789012345678.25 WHERE id = ("
+            " SELECT min(id) FROM trading_results"
+            " WHERE date BETWEEN '2024-01-15' AND '2024-02-15' AND delivery_type_id = 'F')"
+        )
+
+    async with AsyncSession(pg_engine) as session:
+        response = await export_dynamics_service(
+            session, date(2024, 1, 15), date(2024, 2, 15), format, delivery_type_id="F",
+        )
+        stored = (await session.execute(
+            columnar_query(date(2024, 1, 15), date(2024, 2, 15), "F")
+        )).mappings().all()
+
+    assert response.media_type == columnar.MEDIA_TYPES[format]
+    table = _read(response.body, format)
+    assert table.schema == columnar.TRADING_RESULTS_SCHEMA
+    assert table.num_rows == len(stored) > 0
+    assert Decimal("123456789012345678.25") in table.column("total").to_pylist()
+    by_id = lambda row: row["id"]
+    for got, want in zip(sorted(table.to_pylist(), key=by_id), sorted(stored, key=by_id)):
+        assert got["id"] == want["id"]
+        assert got["date"] == want["date"]
+        assert got["exchange_product_name"] == want["exchange_product_name"]
+        assert got["volume"] == want["volume"]
+        assert got["total"] == want["total"]
+        assert got["count"] == want["count"]
+
+    async with AsyncSession(pg_engine) as session:
+        empty = await export_dynamics_service(session, date(2023, 1, 1), date(2023, 1, 31), format)
+    assert _read(empty.body, format).num_rows == 0
+
+
+def columnar_query(start_date, end_date, delivery_type_id):
+    return (
+        select(*TradingResult.__table__.columns)
+        .where(
+            TradingResult.date >= start_date,
+            TradingResult.date <= end_date,
+            TradingResult.delivery_type_id == delivery_type_id,
+        )
+        .order_by(TradingResult.date)
+    )
+
+
+def test_export_is_cached_with_its_media_type(mocker):
+    redis = FakeRedis()
+    mocker.patch("api.core.cache.redis", redis)
+    cache.local_cache.clear()
+    service = mocker.patch(
+        "api.routers.export.export_dynamics_service",
+        new_callable=AsyncMock,
+        return_value=Response(b"PAR1...PAR1", media_type=columnar.MEDIA_TYPES["parquet"]),
+    )
+    client = TestClient(app)
+    url = "/dynamics/export?start_date=2025-01-01&end_date=2025-01-31&format=parquet"
+
+    first = client.get(url)
+    cache.local_cache.clear()
+    second = client.get(url)
+
+    assert first.content == second.content == b"PAR1...PAR1"
+    assert second.headers["content-type"] == "application/vnd.apache.parquet"
+    assert service.await_count == 1
+    assert service.await_args.kwargs["format"] == "parquet"
+    assert len(redis.store) == 1
+    cache.local_cache.clear()
@@ -1,5 +1,27 @@
+import asyncio
+import json
+import os
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from unittest.mock import AsyncMock
+
 import pandas as pd
-from scripts.hw import prepare_df
+import pytest
+
+from benchmarks.synthetic import COLUMNS, synthetic_rows
+from scripts.hw import (
+    COLS,
+    bump_cache_generation,
+    clean_df,
+    df_to_records,
+    file_fingerprint,
+    next_poll_delay,
+    parse_file,
+    prepare_df,
+    prepare_df_legacy,
+    run_pipeline,
+    save_to_db,
+)
 
 
 def test_prepare_df_with_valid_file(tmp_path):
@@ -24,3 +46,278 @@ def test_prepare_df_with_valid_file(tmp_path):
     assert "exchange_product_id" in result_df.columns
     assert result_df.iloc[0]["oil_id"] == "ABCD"
     assert result_df.iloc[0]["count"] == 1
+
+
+TABLE_COLS = [c for c in COLS if c not in ("created_on", "updated_on")]
+
+
+def test_prepare_df_matches_legacy_parser_on_fixture(tmp_path, mocker):
+    sheet = pd.DataFrame({
+        "Unnamed: 0": [None] * 5,
+        "Код\nИнструмента": ["ABCD123X", "EFGH456Y", "Итого:", "IJKL789Z", None],
+        "Наименование\nИнструмента": ["Oil A", "Oil B", None, "Oil C", None],
+        "Базис\nпоставки": ["Basis1", "Basis2", None, "Basis3", None],
+        "Объем\nДоговоров\nв единицах\nизмерения": ["1 000", "-", None, "2,5", None],
+        "Обьем\nДоговоров,\nруб.": ["1000", "2000", None, "-", None],
+        "Количество\nДоговоров,\nшт.": ["1", "2", "3", "-", None],
+    })
+    fake_file = tmp_path / "2025-07-20_test.xls"
+    fake_file.write_text("placeholder")
+    mocker.patch("pandas.read_excel", side_effect=lambda *a, **k: {"Sheet1": sheet.copy()})
+
+    fast = prepare_df(str(fake_file))
+    legacy = prepare_df_legacy(str(fake_file))
+
+    assert list(fast["exchange_product_id"]) == ["ABCD123X", "EFGH456Y"]
+    assert fast["volume"].dtype == "float64" and fast["count"].dtype == "int64"
+    assert fast.iloc[0]["volume"] == 1000
+    pd.testing.assert_frame_equal(fast[TABLE_COLS], legacy[TABLE_COLS], check_dtype=False)
+
+
+def test_prepare_df_matches_legacy_parser_on_bulletin(tmp_path):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletins
+
+    path = write_bulletins(str(tmp_path), files=1, rows=200)[0]
+    fast = prepare_df(path)
+    legacy = prepare_df(path, fast=False)
+
+    assert len(fast) > 0
+    pd.testing.assert_frame_equal(fast[TABLE_COLS], legacy[TABLE_COLS])
+
+
+@pytest.mark.asyncio
+async def test_bump_cache_generation_increments_and_publishes(mocker):
+    redis = AsyncMock()
+    redis.incr.return_value = 7
+    mocker.patch("scripts.hw.Redis.from_url", return_value=redis)
+
+    await bump_cache_generation()
+
+    redis.incr.assert_awaited_once_with("cache:generation")
+    redis.publish.assert_awaited_once_with("cache:generation", 7)
+    redis.aclose.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_bump_cache_generation_publishes_the_ingest_event(mocker):
+    redis = AsyncMock()
+    redis.incr.return_value = 8
+    mocker.patch("scripts.hw.Redis.from_url", return_value=redis)
+
+    await bump_cache_generation({"rows": 3, "files": ["a.xls"], "dates": ["2025-07-16"]})
+
+    channel, payload = redis.publish.await_args_list[1].args
+    assert channel == "ingest:events"
+    assert json.loads(payload) == {
+        "rows": 3, "files": ["a.xls"], "dates": ["2025-07-16"], "generation": 8,
+    }
+
+
+@pytest.mark.parametrize("now, newest, delay", [
+    # Thursday inside the 15:00-19:00 window, today's bulletin not loaded yet
+    (datetime(2025, 7, 17, 16, 0), date(2025, 7, 16), 300),
+    # ... and once it is loaded: back to hourly
+    (datetime(2025, 7, 17, 16, 0), date(2025, 7, 17), 3600),
+    # morning: hourly, but not past the window start
+    (datetime(2025, 7, 17, 14, 30), date(2025, 7, 16), 1800),
+    # Saturday afternoon: no bulletin expected
+    (datetime(2025, 7, 19, 16, 0), date(2025, 7, 18), 3600),
+    (datetime(2025, 7, 17, 23, 0), None, 3600),
+])
+def test_next_poll_delay_tightens_around_the_publication_window(mocker, now, newest, delay):
+    mocker.patch("scripts.hw.DAEMON_WINDOW", "15:00-19:00")
+    mocker.patch("scripts.hw.DAEMON_INTERVAL", 3600)
+    mocker.patch("scripts.hw.DAEMON_WINDOW_INTERVAL", 300)
+    now = now.replace(tzinfo=ZoneInfo("Europe/Moscow"))
+    assert next_poll_delay(now, newest) == delay
+
+
+def _frame(day, rows=5):
+    return pd.DataFrame(
+        list(synthetic_rows(day, days=1, products_per_day=rows)), columns=COLUMNS
+    )
+
+
+def test_df_to_records_is_column_ordered_and_maps_nan_to_none():
+    df = _frame(date(2025, 7, 14), rows=2)
+    df.loc[0, "volume"] = float("nan")
+    df = clean_df(df)
+    records = df_to_records(df)
+    assert len(records) == 2
+    assert records[0][COLS.index("volume")] is None
+    assert records[1][COLS.index("exchange_product_id")] == df.iloc[1]["exchange_product_id"]
+    assert records[1][COLS.index("date")] == date(2025, 7, 14)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("loader", ["copy", "orm"])
+async def test_save_to_db_loads_each_file_in_its_own_transaction(
+    pg_engine, tmp_path, mocker, loader
+):
+    frames = {
+        "2025-07-14_a.xls": _frame(date(2025, 7, 14)),
+        "2025-07-15_b.xls": _frame(date(2025, 7, 15)).assign(count="not a number"),
+        "2025-07-16_c.xls": _frame(date(2025, 7, 16)),
+    }
+    for name in frames:
+        (tmp_path / name).write_text("placeholder")
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path))
+    mocker.patch("scripts.hw.engine", pg_engine)
+    mocker.patch("scripts.hw.prepare_df", side_effect=lambda p: frames[os.path.basename(p)])
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    assert await save_to_db(loader) == 10
+
+    async with pg_engine.connect() as conn:
+        dates = (await conn.exec_driver_sql(
+            "SELECT date, count(*) FROM trading_results GROUP BY date ORDER BY date"
+        )).fetchall()
+    assert dates == [(date(2025, 7, 14), 5), (date(2025, 7, 16), 5)]
+    bump.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("loader", ["copy", "orm"])
+async def test_save_to_db_skips_loaded_files_and_replaces_republished_ones(
+    pg_engine, tmp_path, mocker, loader
+):
+    day = date(2025, 7, 14)
+    original = _frame(day, rows=6)
+    frames = {"2025-07-14_a.xls": original}
+    path = tmp_path / "2025-07-14_a.xls"
+    path.write_text("v1")
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path))
+    mocker.patch("scripts.hw.engine", pg_engine)
+    prepare = mocker.patch(
+        "scripts.hw.prepare_df",
+        side_effect=lambda p: frames[os.path.basename(p)].copy(),
+    )
+    mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    assert await save_to_db(loader) == 6
+    assert await save_to_db(loader) == 0
+    assert prepare.call_count == 1
+
+    async def rows():
+        async with pg_engine.connect() as conn:
+            return {
+                r.exchange_product_id: r for r in (await conn.exec_driver_sql(
+                    "SELECT id, exchange_product_id, volume FROM trading_results"
+                )).fetchall()
+            }
+
+    before = await rows()
+    republished = original.iloc[1:].copy()
+    republished.loc[republished.index[0], "volume"] = 999_999
+    frames["2025-07-14_a.xls"] = pd.concat([republished, republished.iloc[:1]])
+    path.write_text("v2")
+
+    assert await save_to_db(loader) == 2  # one row changed, one removed
+    after = await rows()
+    assert set(after) == set(original["exchange_product_id"].iloc[1:])
+    changed = republished.iloc[0]["exchange_product_id"]
+    assert after[changed].volume == 999_999
+    assert all(after[k].id == before[k].id for k in after)
+
+    async with pg_engine.connect() as conn:
+        ledger = (await conn.exec_driver_sql(
+            "SELECT file_name, file_date, size_bytes, row_count FROM ingest_ledger"
+        )).fetchall()
+    assert ledger == [("2025-07-14_a.xls", day, 2, 5)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("loader", ["copy", "orm"])
+async def test_a_new_checksum_with_the_same_rows_keeps_the_caches(
+    pg_engine, tmp_path, mocker, loader
+):
+    frame = _frame(date(2025, 7, 14), rows=4)
+    path = tmp_path / "2025-07-14_a.xls"
+    path.write_text("v1")
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path))
+    mocker.patch("scripts.hw.engine", pg_engine)
+    mocker.patch("scripts.hw.prepare_df", side_effect=lambda p: frame.copy())
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    assert await save_to_db(loader) == 4
+    bump.reset_mock()
+    path.write_text("v2")
+
+    assert await save_to_db(loader) == 0
+    bump.assert_not_awaited()
+
+
+def test_parse_file_does_not_parse_unchanged_files(tmp_path, mocker):
+    path = tmp_path / "2025-07-14_a.xls"
+    path.write_text("v1")
+    prepare = mocker.patch("scripts.hw.prepare_df", return_value=_frame(date(2025, 7, 14)))
+    _, checksum = file_fingerprint(str(path))
+
+    assert parse_file(str(path), checksum).df is None
+    parsed = parse_file(str(path), "stale")
+    assert parsed.checksum == checksum
+    assert list(parsed.df.columns) == COLS
+    prepare.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_run_pipeline_bounds_parsed_files_in_memory(tmp_path, mocker):
+    files = []
+    for n in range(20):
+        path = tmp_path / f"2025-07-{n + 1:02d}_a.xls"
+        path.write_text(str(n))
+        files.append(str(path))
+    held = 0
+    peak = 0
+
+    def prepare(path):
+        nonlocal held, peak
+        held += 1
+        peak = max(peak, held)
+        return _frame(date(2025, 7, 14), rows=2)
+
+    async def write(parsed):
+        nonlocal held
+        await asyncio.sleep(0.01)
+        held -= 1
+        return len(parsed.df)
+
+    mocker.patch("scripts.hw.prepare_df", side_effect=prepare)
+    known = {os.path.basename(files[0]): file_fingerprint(files[0])[1]}
+
+    report = await run_pipeline(files, known, write, workers=0, writers=2, queue_size=2)
+
+    assert (report.loaded, report.skipped, report.inserted) == (19, 1, 38)
+    # one parsing + two queued + one per writer
+    assert peak <= 1 + 2 + 2
+
+
+@pytest.mark.asyncio
+async def test_parser_pool_is_not_forked_from_the_loop_nor_awaited_on_exit(mocker):
+    executor = mocker.patch("scripts.hw.ProcessPoolExecutor")
+
+    await run_pipeline([], {}, AsyncMock(), workers=2)
+
+    assert executor.call_args.kwargs["mp_context"].get_start_method() != "fork"
+    executor.return_value.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+
+@pytest.mark.asyncio
+async def test_save_to_db_parses_bulletins_in_a_process_pool(pg_engine, tmp_path, mocker):
+    pytest.importorskip("xlwt")
+    from benchmarks.synthetic import write_bulletins
+
+    paths = write_bulletins(str(tmp_path), files=3, rows=50)
+    expected = sum(len(clean_df(prepare_df(p))) for p in paths)
+    mocker.patch("scripts.hw.OUT_DIR", str(tmp_path))
+    mocker.patch("scripts.hw.engine", pg_engine)
+    mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    assert await save_to_db("copy", workers=2, writers=2, queue_size=1) == expected
+    assert await save_to_db("copy", workers=2) == 0
+
+    async with pg_engine.connect() as conn:
+        count = (await conn.exec_driver_sql("SELECT count(*) FROM trading_results")).scalar_one()
+        files = (await conn.exec_driver_sql("SELECT count(*) FROM ingest_ledger")).scalar_one()
+    assert (count, files) == (expected, 3)
@@ -1,8 +1,10 @@
 from datetime import date
 from unittest.mock import AsyncMock, Mock
 
+from fastapi import HTTPException
 import pytest
 
+from api.core.pagination import decode_cursor, encode_cursor
 from api.models.crud import get_distinct_dates
 from api.routers.services import get_last_trading_dates_service
 from api.entities.schemas import LastTradingDatesResponse
@@ -66,7 +68,44 @@ async def test_get_last_trading_dates_service(mocker):
         session,
         oil_id="oil1",
         delivery_type_id="dt1",
-        delivery_basis_id="db1"
+        delivery_basis_id="db1",
+        limit=4,
+        before=None,
     )
     assert isinstance(response, LastTradingDatesResponse)
     assert response.dates == mock_dates[:3]
+    assert decode_cursor(response.next_cursor) == (date(2025, 7, 30), None)
+
+
+@pytest.mark.asyncio
+async def test_get_last_trading_dates_service_pages_with_cursor(mocker):
+    mock_get_distinct_dates = mocker.patch(
+        "api.routers.services.get_distinct_dates", new_callable=AsyncMock
+    )
+    mock_get_distinct_dates.return_value = [date(2025, 7, 29)]
+    response = await get_last_trading_dates_service(
+        None, count=3, cursor=encode_cursor(date(2025, 7, 30))
+    )
+    assert mock_get_distinct_dates.await_args.kwargs["before"] == date(2025, 7, 30)
+    assert response.dates == [date(2025, 7, 29)]
+    assert response.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_distinct_dates_applies_limit_in_sql():
+    rows = Mock()
+    rows.fetchall.return_value = []
+    session = AsyncMock()
+    session.execute.return_value = rows
+    await get_distinct_dates(session, limit=6, before=date(2025, 7, 30))
+    stmt = session.execute.await_args.args[0]
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "LIMIT 6" in sql
+    assert "trading_results.date < '2025-07-30'" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_last_trading_dates_service_rejects_bad_cursor():
+    with pytest.raises(HTTPException) as exc_info:
+        await get_last_trading_dates_service(None, cursor="not-a-cursor")
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,66 @@
+import copy
+
+import pytest
+
+from api.core import cache, profiling
+from api.core.snapshot import snapshots
+from benchmarks import load
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture(autouse=True)
+def restore_globals(monkeypatch):
+    monkeypatch.setattr(cache, "redis", None)
+    monkeypatch.setattr(snapshots, "snapshot", None)
+    monkeypatch.setattr(profiling.slow_queries, "threshold", profiling.slow_queries.threshold)
+    yield
+    cache.local_cache.clear()
+
+
+def small_run(*options):
+    return load.parse_args([
+        "--years", "0.05", "--products-per-day", "20", "--concurrency", "4",
+        "--distinct", "10", "--warm-passes", "2", *options,
+    ])
+
+
+@pytest.mark.asyncio
+async def test_stand_in_run_reports_every_scenario():
+    report = await load.run(small_run())
+
+    assert report["meta"]["backend"] == "stand-in" and report["meta"]["redis"] == "stand-in"
+    assert report["meta"]["rows"] > 0
+    assert list(report["results"]) == [
+        f"{endpoint}/{scenario}" for endpoint in load.ENDPOINTS for scenario in ("cold", "warm")
+    ]
+    for name, result in report["results"].items():
+        assert result["errors"] == 0, name
+        assert result["requests"] == (10 if name.endswith("cold") else 20)
+        assert result["rps"] > 0 and result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+    assert snapshots.snapshot is None
+
+
+def test_compare_flags_slower_runs_only_beyond_the_tolerance():
+    result = {"requests": 10, "errors": 0, "seconds": 1.0, "rps": 100.0, "p50_ms": 1.0, "p95_ms": 2.0, "p99_ms": 3.0}
+    baseline = {"results": {"dynamics/warm": dict(result), "dynamics/cold": dict(result)}}
+    report = copy.deepcopy(baseline)
+    report["results"]["dynamics/warm"].update(rps=85.0, p95_ms=2.3)
+    report["results"]["dynamics/cold"].update(rps=70.0, p95_ms=2.5, errors=1)
+    report["results"]["trading_results/warm"] = result
+
+    assert load.compare(report, baseline, tolerance=0.2) == [
+        "dynamics/cold: 70.0 req/s, baseline 100.0",
+        "dynamics/cold: p95 2.5 ms, baseline 2.0",
+        "dynamics/cold: 1 errors, baseline 0",
+    ]
+    assert load.compare(report, report, tolerance=0.0) == []
+
+
+@pytest.mark.asyncio
+async def test_postgres_run_serves_every_scenario():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    report = await load.run(small_run("--dsn", TEST_DATABASE_URL))
+
+    assert report["meta"]["backend"] == "postgres"
+    assert all(result["errors"] == 0 for result in report["results"].values())
@@ -0,0 +1,125 @@
+import time
+from datetime import date
+from unittest.mock import AsyncMock
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core import cache, metrics
+from api.core.metrics import Histogram, MetricsMiddleware
+from api.entities.schemas import AggregateResponse
+from api.main import app
+from api.models.crud import get_trading_results_by_date_range
+from benchmarks.synthetic import synthetic_rows
+from tests.conftest import copy_rows
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.registry.reset()
+    cache.cache_stats.reset()
+    cache.local_cache.clear()
+    yield
+    metrics.registry.reset()
+    cache.cache_stats.reset()
+    cache.local_cache.clear()
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, '/a"b')
+
+    assert histogram.render() == [
+        "# HELP demo_seconds Demo",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a\\"b",le="1.0"} 3',
+        'demo_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'demo_seconds_sum{route="/a\\"b"} 4.05',
+        'demo_seconds_count{route="/a\\"b"} 4',
+    ]
+
+
+def test_metrics_endpoint_reports_routes_cache_and_pool(mocker):
+    service = mocker.patch(
+        "api.routers.aggregates.get_aggregates_service", new_callable=AsyncMock
+    )
+    service.return_value = AggregateResponse(period="day", group_by=[], rows=[])
+    mocker.patch("api.core.cache.redis", AsyncMock(get=AsyncMock(return_value=None)))
+    client = TestClient(app)
+
+    for _ in range(2):
+        assert client.get("/dynamics/aggregate?start_date=2025-01-01&end_date=2025-01-31").status_code == 200
+    assert client.get("/no-such-route").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'http_request_duration_seconds_count{method="GET",route="/dynamics/aggregate",status="200"} 2' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 1' in lines
+    assert 'cache_operation_duration_seconds_count{prefix="aggregate",operation="get"} 1' in lines
+    assert 'cache_operation_duration_seconds_count{prefix="aggregate",operation="set"} 1' in lines
+    assert 'cache_requests_total{prefix="aggregate",result="local_hits"} 1' in lines
+    assert 'cache_requests_total{prefix="aggregate",result="misses"} 1' in lines
+    assert 'cache_hit_ratio{prefix="aggregate"} 0.5' in lines
+    assert 'db_pool_connections{engine="primary",state="checked_out"} 0' in lines
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in lines
+    assert 'db_pool_checkout_wait_seconds_bucket{engine="primary",le="5.0"} 0' in lines
+
+
+@pytest.mark.asyncio
+async def test_middleware_overhead_is_small():
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    class Forwarding:
+        """The least any middleware wrapping send costs"""
+
+        def __init__(self, app):
+            self.app = app
+
+        async def __call__(self, scope, receive, send):
+            async def forward(message):
+                await send(message)
+            await self.app(scope, receive, forward)
+
+    scope = {"type": "http", "method": "GET"}
+    wrapped = MetricsMiddleware(endpoint)
+
+    async def best_of(asgi_app, requests=2000, rounds=5):
+        best = float("inf")
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(requests):
+                await asgi_app(dict(scope), None, send)
+            best = min(best, (time.perf_counter() - started) / requests)
+        return best
+
+    # Relative to the same work through a forwarding middleware, so the
+    # bound holds on slow or busy machines; about 1.7x here.
+    assert await best_of(wrapped) < 5 * await best_of(Forwarding(endpoint))
+    assert metrics.http_request_seconds.series[("GET", "unmatched", "200")][2] == 10000
+
+
+@pytest.mark.asyncio
+async def test_statements_are_timed_by_crud_function(pg_engine):
+    await copy_rows(pg_engine, synthetic_rows(date(2025, 3, 3), days=5, products_per_day=8))
+    metrics.instrument_engine(pg_engine.sync_engine)
+
+    async with AsyncSession(pg_engine) as session:
+        rows = await get_trading_results_by_date_range(session, date(2025, 3, 3), date(2025, 3, 4))
+        await session.execute(text("SELECT 1"))
+
+    name = ("get_trading_results_by_date_range",)
+    assert metrics.db_query_seconds.series[name][2] == 1
+    counts, total, count = metrics.db_query_rows.series[name]
+    assert (total, count) == (len(rows), 1) and len(rows) == 16
+    assert ("SELECT",) in metrics.db_query_seconds.series
+
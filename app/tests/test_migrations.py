@@ -0,0 +1,129 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from api.models.crud import (
+    get_distinct_dates,
+    get_latest_trading_results,
+    get_trading_results_by_date_range,
+)
+from benchmarks.synthetic import synthetic_rows
+from scripts.migrations import discover, status, upgrade
+from tests.conftest import copy_rows
+
+
+class ExplainSession:
+    """Runs each statement and records its EXPLAIN ANALYZE plan"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.plans = []
+
+    async def execute(self, stmt):
+        sql = str(stmt.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"literal_binds": True},
+        ))
+        explain = await self.conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+        plan = explain.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        self.plans.append((sql, plan[0]["Plan"]))
+        return await self.conn.execute(stmt)
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+def test_migration_files_are_ordered_and_unique():
+    versions = [m.version for m in discover()]
+    assert versions == sorted(set(versions))
+
+
+@pytest.mark.asyncio
+async def test_upgrade_is_idempotent(pg_engine):
+    assert await upgrade(pg_engine) == []
+    assert all(line.endswith(" applied") for line in await status(pg_engine))
+
+
+QUERIES = [
+    (get_distinct_dates, {"limit": 6}),
+    (get_distinct_dates, {"oil_id": "A101", "limit": 6}),
+    (get_distinct_dates, {"delivery_basis_id": "ABY", "limit": 6}),
+    (get_distinct_dates, {"delivery_type_id": "F", "limit": 6}),
+    (get_distinct_dates, {"oil_id": "A101", "delivery_type_id": "F", "limit": 6}),
+    (get_distinct_dates, {"limit": 6, "before": date(2024, 3, 1)}),
+    (get_trading_results_by_date_range, {
+        "start_date": date(2024, 3, 1), "end_date": date(2024, 3, 7),
+    }),
+    (get_trading_results_by_date_range, {
+        "start_date": date(2023, 1, 1), "end_date": date(2024, 12, 31),
+        "oil_id": "A101",
+    }),
+    (get_trading_results_by_date_range, {
+        "start_date": date(2024, 1, 1), "end_date": date(2024, 3, 31),
+        "delivery_basis_id": "ABY", "delivery_type_id": "F",
+    }),
+    (get_latest_trading_results, {"oil_id": "A101", "limit": 101}),
+    (get_latest_trading_results, {"delivery_type_id": "F", "limit": 101}),
+    (get_latest_trading_results, {"delivery_basis_id": "ABY", "limit": 101}),
+    (get_latest_trading_results, {
+        "oil_id": "A101", "limit": 101, "before": (date(2024, 3, 1), 10_000),
+    }),
+]
+
+
+@pytest.mark.asyncio
+async def test_endpoint_queries_do_not_seq_scan(pg_engine):
+    await copy_rows(pg_engine, synthetic_rows(date(2022, 1, 1), days=3 * 365))
+
+    async with pg_engine.connect() as conn:
+        seeded = set((await conn.exec_driver_sql(
+            "SELECT relname FROM pg_class"
+            " WHERE relname LIKE 'trading_results%' AND relkind = 'r' AND reltuples > 0"
+        )).scalars().all())
+        session = ExplainSession(conn)
+        for query, kwargs in QUERIES:
+            await query(session, **kwargs)
+
+    assert seeded
+    for sql, plan in session.plans:
+        # Partitions pruned at run time show up as never executed.
+        scans = [
+            node["Node Type"] for node in _nodes(plan)
+            if node.get("Relation Name") in seeded and node.get("Actual Loops")
+        ]
+        assert scans, sql
+        assert "Seq Scan" not in scans, sql
+
+
+@pytest.mark.asyncio
+async def test_natural_key_migration_removes_duplicates(pg_engine):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from tests.conftest import TEST_DATABASE_URL
+
+    engine = create_async_engine(TEST_DATABASE_URL)
+    try:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+            await conn.exec_driver_sql("CREATE SCHEMA public")
+        await upgrade(engine, target="0003")
+        rows = list(synthetic_rows(date(2025, 7, 14), days=1, products_per_day=10))
+        await copy_rows(engine, rows)
+        await copy_rows(engine, rows[:4])
+
+        assert (await upgrade(engine))[0] == "0004"
+        async with engine.connect() as conn:
+            remaining = (await conn.exec_driver_sql(
+                "SELECT count(*), max(id) FILTER (WHERE exchange_product_id = $1)"
+                " FROM trading_results",
+                (rows[0][0],),
+            )).one()
+        assert remaining == (10, 11)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,126 @@
+from datetime import date
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmarks.synthetic import copy_rows as copy_records, synthetic_rows
+from api.models.crud import get_latest_trading_results, get_trading_results_by_date_range
+from scripts.migrations import upgrade
+from scripts.partitions import (
+    detach_partitions,
+    ensure_partitions,
+    list_partitions,
+    main,
+    months_to_ensure,
+)
+from tests.conftest import TEST_DATABASE_URL, copy_rows
+from tests.test_migrations import ExplainSession, _nodes
+
+
+def test_months_to_ensure_adds_upcoming_months():
+    assert months_to_ensure([date(2024, 12, 30), date(2024, 11, 3)], ahead=2) == [
+        date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1),
+    ]
+    assert months_to_ensure([], ahead=2) == []
+
+
+async def _count(engine, sql):
+    async with engine.connect() as conn:
+        return (await conn.exec_driver_sql(sql)).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_ensure_moves_rows_out_of_default_partition(pg_engine):
+    async with pg_engine.begin() as conn:
+        raw = await conn.get_raw_connection()
+        await copy_records(raw.driver_connection, synthetic_rows(date(2021, 3, 1), days=7))
+    assert await _count(pg_engine, "SELECT count(*) FROM trading_results_default") == 300
+
+    assert await ensure_partitions(pg_engine, [date(2021, 3, 5)], ahead=0) == ["trading_results_p2021_03"]
+    assert await _count(pg_engine, "SELECT count(*) FROM trading_results_default") == 0
+    assert await _count(pg_engine, "SELECT count(*) FROM trading_results_p2021_03") == 300
+    assert await ensure_partitions(pg_engine, [date(2021, 3, 9)], ahead=0) == ["trading_results_p2021_03"]
+
+
+@pytest.mark.asyncio
+async def test_date_range_and_latest_queries_prune_partitions(pg_engine):
+    await copy_rows(pg_engine, synthetic_rows(date(2023, 1, 1), days=365))
+
+    async with pg_engine.connect() as conn:
+        session = ExplainSession(conn)
+        await get_trading_results_by_date_range(
+            session, start_date=date(2023, 3, 6), end_date=date(2023, 4, 7), oil_id="A101",
+        )
+        await get_latest_trading_results(session, oil_id="A101", limit=101)
+
+    def touched(plan):
+        return {
+            node["Relation Name"] for node in _nodes(plan)
+            if node.get("Relation Name", "").startswith("trading_results_p")
+            and node.get("Actual Loops")
+        }
+
+    (_, range_plan), (_, latest_plan) = session.plans
+    assert touched(range_plan) == {"trading_results_p2023_03", "trading_results_p2023_04"}
+    # The max(date) lookup walks partitions newest first; the row fetch
+    # itself is pruned at run time to the single latest partition.
+    row_scan = [n for n in latest_plan.get("Plans", []) if n.get("Parent Relationship") != "InitPlan"]
+    assert touched(row_scan[0]) == {"trading_results_p2023_12"}
+
+
+@pytest.mark.asyncio
+async def test_detach_archives_exports_or_drops_old_partitions(pg_engine, tmp_path):
+    await copy_rows(pg_engine, synthetic_rows(date(2023, 1, 1), days=120))
+
+    archived = await detach_partitions(pg_engine, before=date(2023, 2, 1), export_dir=str(tmp_path))
+    assert archived == ["trading_results_p2023_01"]
+    assert (tmp_path / "trading_results_p2023_01.csv").read_text().count("\n") > 1
+    assert await _count(pg_engine, "SELECT count(*) FROM archive.trading_results_p2023_01") > 0
+    assert await _count(pg_engine, "SELECT count(*) FROM trading_results WHERE date < '2023-02-01'") == 0
+
+    dropped = await detach_partitions(pg_engine, before=date(2023, 3, 1), drop=True)
+    assert dropped == ["trading_results_p2023_02"]
+    names = [p.name for p in await list_partitions(pg_engine)]
+    assert "trading_results_p2023_02" not in names
+    assert "trading_results_default" in names
+
+
+@pytest.mark.asyncio
+async def test_detach_command_invalidates_the_api_caches(pg_engine, mocker):
+    await copy_rows(pg_engine, synthetic_rows(date(2023, 1, 1), days=40))
+    mocker.patch("scripts.hw.engine", pg_engine)
+    bump = mocker.patch("scripts.hw.bump_cache_generation", new_callable=AsyncMock)
+
+    await main(["detach", "--before", "2023-01-01"])
+    bump.assert_not_awaited()
+
+    await main(["detach", "--before", "2023-02-01", "--drop"])
+    bump.assert_awaited_once_with()
+
+
+@pytest.mark.asyncio
+async def test_partitioning_migration_keeps_existing_rows(pg_engine):
+    engine = create_async_engine(TEST_DATABASE_URL)
+    try:
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+            await conn.exec_driver_sql("CREATE SCHEMA public")
+        await upgrade(engine, target="0002")
+        async with engine.begin() as conn:
+            raw = await conn.get_raw_connection()
+            await copy_records(raw.driver_connection, synthetic_rows(date(2022, 12, 1), days=62))
+        before = await _count(engine, "SELECT count(*) FROM trading_results")
+        max_id = await _count(engine, "SELECT max(id) FROM trading_results")
+
+        assert (await upgrade(engine))[0] == "0003"
+        assert await _count(engine, "SELECT count(*) FROM trading_results") == before
+        assert await _count(engine, "SELECT count(*) FROM trading_results_default") == 0
+        assert await _count(engine, "SELECT count(*) FROM trading_results_p2023_01") > 0
+        async with engine.begin() as conn:
+            new_id = (await conn.exec_driver_sql(
+                "INSERT INTO trading_results (date, oil_id) VALUES ('2023-01-09', 'A100') RETURNING id"
+            )).scalar_one()
+        assert new_id == max_id + 1
+    finally:
+        await engine.dispose()
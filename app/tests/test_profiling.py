@@ -0,0 +1,118 @@
+from datetime import date
+from unittest.mock import AsyncMock
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy import Integer, func, literal, select
+
+from api.core import cache, profiling
+from api.core.profiling import SlowQueryLog
+from api.core.settings import Settings
+from api.main import app
+from tests.test_dynamics import DummyTradingResult
+
+
+URL = "/dynamics?start_date=2023-05-01&end_date=2023-05-02"
+
+
+@pytest.fixture
+def client(mocker):
+    cache.local_cache.clear()
+    mocker.patch("api.core.profiling.profile_token", "s3cret")
+    mocker.patch("api.core.cache.redis", AsyncMock(get=AsyncMock(return_value=None)))
+    mocker.patch(
+        "api.routers.services.get_trading_results_by_date_range",
+        new_callable=AsyncMock,
+        return_value=[DummyTradingResult()] * 3,
+    )
+    yield TestClient(app)
+    cache.local_cache.clear()
+
+
+def test_phases_mode_reports_server_timing(client):
+    response = client.get(URL, headers={"X-Profile": "phases", "X-Profile-Token": "s3cret"})
+
+    assert response.status_code == 200
+    assert len(response.json()["trades"]) == 3
+    timing = response.headers["server-timing"]
+    names = [entry.split(";")[0] for entry in timing.split(", ")]
+    assert names == ["cache", "mapping", "validation", "encoding", "app"]
+    assert 'cache;dur=' in timing and 'desc="2x"' in timing
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Profile": "phases"},
+    {"X-Profile": "phases", "X-Profile-Token": "wrong"},
+    {"X-Profile": "everything", "X-Profile-Token": "s3cret"},
+])
+def test_profiling_needs_the_token(client, headers):
+    response = client.get(URL, headers=headers)
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+
+def test_profiling_is_off_without_a_configured_token(client, mocker):
+    mocker.patch("api.core.profiling.profile_token", "")
+    response = client.get(URL, headers={"X-Profile": "calls", "X-Profile-Token": ""})
+    assert response.json()["trades"]
+
+
+def test_calls_mode_returns_the_profile_instead_of_the_body(client, mocker):
+    mocker.patch("api.core.profiling.profile_calls_limit", 1000)
+    response = client.get(URL, headers={"X-Profile": "calls", "X-Profile-Token": "s3cret"})
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.startswith("GET /dynamics -> 200\nServer-Timing: cache;dur=")
+    assert "function calls" in response.text
+    assert "get_dynamics_service" in response.text
+
+
+def test_settings_reach_the_middleware_and_the_slow_query_log(mocker):
+    log = SlowQueryLog(threshold=0.5, size=50)
+    log.entries.extend([{"query": "a"}, {"query": "b"}, {"query": "c"}])
+    mocker.patch("api.core.profiling.slow_queries", log)
+    mocker.patch("api.core.profiling.profile_token", "")
+    mocker.patch("api.core.profiling.profile_calls_limit", 40)
+
+    profiling.configure_profiling(Settings(
+        database_url="postgresql+asyncpg://u:p@localhost/db", profile_token="t0ken", profile_calls_limit=5,
+        slow_query_seconds=0.2, slow_query_log_size=2, slow_query_explain=False,
+    ))
+
+    assert (profiling.profile_token, profiling.profile_calls_limit) == ("t0ken", 5)
+    assert (log.threshold, log.explain) == (0.2, False)
+    assert list(log.entries) == [{"query": "b"}, {"query": "c"}]
+
+
+@pytest.mark.asyncio
+async def test_slow_statements_are_logged_with_their_plan(pg_engine, mocker):
+    log = SlowQueryLog(threshold=0.05, size=2)
+    mocker.patch("api.core.profiling.slow_queries", log)
+    profiling.instrument_engine(pg_engine.sync_engine)
+
+    async with pg_engine.connect() as conn:
+        await conn.execute(select(func.pg_sleep(0.1), literal(7, Integer)).execution_options(query_name="nap"))
+        await conn.execute(select(literal(1, Integer)))
+        [entry] = log.snapshot()["entries"]
+        # Taken in the background, on another connection.
+        assert entry["plan"] is None and log.pending
+
+    await log.drain()
+    [entry] = log.snapshot()["entries"]
+    assert entry["query"] == "nap" and entry["seconds"] >= 0.1
+    assert "pg_sleep" in entry["statement"] and entry["parameters"] == ["0.1", "7"]
+    assert entry["plan"][0].startswith("Result")
+
+
+@pytest.mark.asyncio
+async def test_db_time_goes_to_the_profiled_request(pg_engine):
+    profiling.instrument_engine(pg_engine.sync_engine)
+    phases = profiling.Phases()
+    token = profiling._phases.set(phases)
+    try:
+        async with pg_engine.connect() as conn:
+            await conn.execute(select(literal(date(2025, 1, 1))))
+    finally:
+        profiling._phases.reset(token)
+    assert phases.counts["db"] == 1
@@ -0,0 +1,149 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+
+from api.core.generation import GenerationTracker
+from api.models import db
+from api.models.db import LazySession, ReadRouter, Replica, make_engine
+from tests.conftest import TEST_DATABASE_URL
+
+
+TEST_REPLICA_DATABASE_URL = os.getenv("TEST_REPLICA_DATABASE_URL")
+
+
+def _replica(name, lag=0.0, caught_up=True, error=None, checked_out=0):
+    engine = MagicMock(name=name)
+    engine.pool.checkedout.return_value = checked_out
+    replica = Replica(f"postgresql+asyncpg://u:secret@{name}/db", engine)
+    replica.lag, replica.caught_up, replica.error = lag, caught_up, error
+    return replica
+
+
+def _router(replicas, **kwargs):
+    router = ReadRouter(MagicMock(name="primary"), replicas, **kwargs)
+    router.tracker = GenerationTracker(AsyncMock())
+    router.generation = router.tracker.value
+    return router
+
+
+def test_round_robin_skips_lagging_and_failed_replicas():
+    a, b = _replica("a"), _replica("b")
+    lagging = _replica("c", lag=31.0)
+    behind = _replica("d", caught_up=False)
+    failed = _replica("e", error="OSError: refused")
+    router = _router([a, lagging, b, behind, failed], max_lag=30)
+
+    assert [router.pick() for _ in range(4)] == [a.engine, b.engine, a.engine, b.engine]
+    assert router.status()["healthy"] == 2
+    assert "secret" not in router.status()["replicas"][0]["url"]
+
+
+def test_least_connections_and_primary_fallback():
+    busy, idle = _replica("busy", checked_out=4), _replica("idle", checked_out=1)
+    router = _router([busy, idle], strategy="least_connections")
+    assert router.pick() is idle.engine
+
+    router.tracker.update(1)
+    assert router.pick() is router.primary
+    router.generation = 1
+    busy.lag = idle.lag = 120.0
+    assert router.pick() is router.primary
+
+    with pytest.raises(ValueError):
+        ReadRouter(MagicMock(), [], strategy="random")
+    assert ReadRouter(MagicMock(), [_replica("x")]).pick() is not None
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_is_bound_to_the_picked_engine(mocker):
+    replica = _replica("a")
+    router = _router([replica])
+    mocker.patch("api.models.db.read_router", router)
+    factory = mocker.patch("api.models.db.AsyncSessionLocal")
+
+    await LazySession().get()
+    factory.assert_called_once_with(bind=replica.engine)
+
+
+@pytest_asyncio.fixture
+async def stand_in_router():
+    """Two "replicas" that are the test DB itself (not in recovery) and one unreachable"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    def replica(name):
+        return Replica(TEST_DATABASE_URL, make_engine(
+            TEST_DATABASE_URL, connect_args={"server_settings": {"application_name": name}},
+        ))
+
+    down = Replica("postgresql+asyncpg://u:p@127.0.0.1:1/db", make_engine(
+        "postgresql+asyncpg://u:p@127.0.0.1:1/db", connect_args={"timeout": 1},
+    ))
+    router = ReadRouter(make_engine(TEST_DATABASE_URL), [replica("r1"), replica("r2"), down])
+    router.tracker = GenerationTracker(AsyncMock())
+    try:
+        yield router
+    finally:
+        await router.dispose()
+        await router.primary.dispose()
+
+
+@pytest.mark.asyncio
+async def test_stand_in_replicas_serve_reads_in_turn(stand_in_router, mocker):
+    router = stand_in_router
+    await router.check()
+    assert [r.lag for r in router.replicas[:2]] == [0.0, 0.0]
+    assert router.replicas[2].error is not None
+
+    names = []
+    for _ in range(4):
+        async with router.pick().connect() as conn:
+            names.append((await conn.exec_driver_sql(
+                "SELECT current_setting('application_name')"
+            )).scalar_one())
+    assert names == ["r1", "r2", "r1", "r2"]
+
+    mocker.patch("api.models.db.REPLICA_STATUS_SQL", "SELECT 120.0 AS lag, true AS caught_up")
+    await router.check()
+    assert router.pick() is router.primary
+
+
+@pytest.mark.asyncio
+async def test_streaming_replica_is_skipped_until_it_replays_the_ingest(pg_engine):
+    if not TEST_REPLICA_DATABASE_URL:
+        pytest.skip("TEST_REPLICA_DATABASE_URL (a standby of TEST_DATABASE_URL) is not set")
+    replica = Replica(TEST_REPLICA_DATABASE_URL, make_engine(TEST_REPLICA_DATABASE_URL))
+    router = ReadRouter(pg_engine, [replica], max_lag=3600)
+    router.tracker = GenerationTracker(AsyncMock())
+    try:
+        await _wait_for(router, replica.engine)
+        async with replica.engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT pg_wal_replay_pause()")
+        async with pg_engine.begin() as conn:
+            await conn.exec_driver_sql("CREATE TABLE replica_probe (id int)")
+        router.tracker.update(router.tracker.value + 1)
+
+        assert router.pick() is pg_engine
+        await router.check()
+        assert replica.caught_up is False
+        assert router.pick() is pg_engine
+
+        async with replica.engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT pg_wal_replay_resume()")
+        await _wait_for(router, replica.engine)
+    finally:
+        async with replica.engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT pg_wal_replay_resume()")
+        await replica.engine.dispose()
+
+
+async def _wait_for(router, expected, timeout=10.0):
+    for _ in range(int(timeout / 0.1)):
+        await router.check()
+        if router.pick() is expected:
+            return
+        await asyncio.sleep(0.1)
+    raise AssertionError(router.status())
@@ -0,0 +1,146 @@
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+import pytest
+
+from api.core.generation import GenerationTracker
+from api.core.snapshot import SnapshotStore
+from api.core.trading_snapshot import TradingSnapshot
+from api.models.crud import (
+    get_distinct_dates,
+    get_latest_trading_results,
+    get_trading_results_by_date_range,
+)
+from api.routers.services import get_dynamics_service, get_last_trading_dates_service
+from benchmarks.synthetic import synthetic_rows
+from tests.conftest import copy_rows
+
+
+def _rows(days, per_day=3):
+    """Rows of the snapshot's column order, ids ascending by date"""
+    rows = []
+    for n in range(days):
+        for k in range(per_day):
+            rows.append((
+                len(rows) + 1, f"P{k}", f"Product {k}", f"A{k % 2}", f"B{k}", f"Basis {k}", "F",
+                Decimal("60"), Decimal("1200.50"), k + 1, date(2025, 1, 1) + timedelta(days=n),
+                datetime(2025, 1, 1), datetime(2025, 1, 1),
+            ))
+    return rows
+
+
+def test_snapshot_answers_inside_its_window_and_defers_outside():
+    rows = _rows(days=5)
+    snapshot = TradingSnapshot(rows[3:], start=date(2025, 1, 2), complete=False, generation=1)
+
+    assert snapshot.codes["oil_id"].dtype.name == "int32"
+    assert len(snapshot.dictionaries["oil_id"]) == 2
+    assert snapshot.distinct_dates(oil_id="A1", limit=3) == [
+        date(2025, 1, 5), date(2025, 1, 4), date(2025, 1, 3),
+    ]
+    assert snapshot.distinct_dates(oil_id="A1", limit=10) is None
+    assert snapshot.distinct_dates(oil_id="missing", limit=1) is None
+
+    latest = snapshot.latest(oil_id="A0", limit=10)
+    assert [r.id for r in latest] == [15, 13]
+    assert latest[0] == rows[14]
+    assert [r.id for r in snapshot.latest(limit=1, before=(date(2025, 1, 4), 12))] == [11]
+    assert snapshot.latest(before=(date(2025, 1, 1), 99)) is None
+    assert snapshot.latest(oil_id="missing") is None
+
+    assert snapshot.date_range(date(2025, 1, 3), date(2025, 1, 4), delivery_basis_id="B2") == [
+        rows[8], rows[11],
+    ]
+    assert snapshot.date_range(date(2025, 1, 1), date(2025, 1, 4)) is None
+
+    complete = TradingSnapshot(rows, start=date(2025, 1, 1), complete=True, generation=1)
+    assert complete.latest(oil_id="missing") == []
+    assert complete.distinct_dates() == [date(2025, 1, 1) + timedelta(days=n) for n in range(4, -1, -1)]
+    assert TradingSnapshot([], start=date.min, complete=True, generation=0).latest() == []
+
+
+@pytest.mark.asyncio
+async def test_store_serves_only_the_current_generation():
+    tracker = GenerationTracker(AsyncMock())
+    store = SnapshotStore(tracker, days=30)
+    store.snapshot = TradingSnapshot(_rows(days=2), start=date(2025, 1, 1), complete=True, generation=0)
+    assert store.current() is store.snapshot
+
+    waiter = asyncio.create_task(tracker.wait_change(0))
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    tracker.update(1)
+    assert await waiter == 1
+    assert store.current() is None
+    assert store.stats()["current"] is False
+
+
+@pytest.mark.asyncio
+async def test_services_use_the_snapshot_without_a_query(mocker):
+    tracker = GenerationTracker(AsyncMock())
+    store = SnapshotStore(tracker)
+    store.snapshot = TradingSnapshot(_rows(days=3), start=date(2025, 1, 1), complete=True, generation=0)
+    mocker.patch("api.routers.services.snapshots", store)
+    session = AsyncMock()
+    session.execute.side_effect = AssertionError("query")
+
+    dates = await get_last_trading_dates_service(session, count=2)
+    assert dates.dates == [date(2025, 1, 3), date(2025, 1, 2)]
+    dynamics = await get_dynamics_service(session, date(2025, 1, 2), date(2025, 1, 2), oil_id="A0")
+    assert [t.id for t in dynamics.trades] == [4, 6]
+    assert dynamics.trades[0].volume == Decimal("60")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("days", [10, 400])
+async def test_snapshot_matches_the_sql_path(pg_engine, days):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    await copy_rows(pg_engine, synthetic_rows(date(2024, 1, 1), days=60, products_per_day=25))
+    store = SnapshotStore(GenerationTracker(AsyncMock()), days=days)
+    snapshot = await store.reload(pg_engine)
+    assert snapshot.complete == (days == 400)
+    assert snapshot.generation == 0 and store.current() is snapshot
+
+    async with pg_engine.connect() as conn:
+        values = {
+            name: (await conn.exec_driver_sql(
+                f"SELECT DISTINCT {name} FROM trading_results ORDER BY 1 LIMIT 3"
+            )).scalars().all()
+            for name in ("oil_id", "delivery_basis_id", "delivery_type_id")
+        }
+    rnd = random.Random(7)
+    answered = 0
+    async with AsyncSession(pg_engine) as session:
+        for _ in range(40):
+            filters = {
+                name: rnd.choice([None, *options, "missing"])
+                for name, options in values.items()
+            }
+            day = date(2024, 1, 1) + timedelta(days=rnd.randrange(70))
+            limit = rnd.choice([None, 1, 3, 20])
+
+            before_day = rnd.choice([None, day])
+            got = snapshot.distinct_dates(**filters, limit=limit, before=before_day)
+            if got is not None:
+                answered += 1
+                want = await get_distinct_dates(session, **filters, limit=limit, before=before_day)
+                assert got == want
+
+            for before in (None, (day, rnd.randrange(1, 1500))):
+                got = snapshot.latest(**filters, limit=limit, before=before)
+                if got is not None:
+                    answered += 1
+                    want = await get_latest_trading_results(session, **filters, limit=limit, before=before)
+                    assert [tuple(r) for r in got] == [tuple(r) for r in want]
+
+            end = day + timedelta(days=rnd.randrange(15))
+            got = snapshot.date_range(day, end, **filters)
+            if got is not None:
+                answered += 1
+                want = await get_trading_results_by_date_range(session, day, end, **filters)
+                assert [tuple(r) for r in got] == [tuple(r) for r in want]
+    assert answered >= 10
@@ -1,21 +1,27 @@
+from collections import namedtuple
 from unittest.mock import patch, AsyncMock, MagicMock
 from datetime import date, datetime
 
 from fastapi import HTTPException
 import pytest
 
+from api.core.pagination import decode_cursor
 from api.entities.schemas import TradingResultsResponse
-from api.models.crud import get_latest_trading_results
-from api.models.models import TradingResult
+from api.models.crud import TRADING_RESULT_COLUMNS, get_latest_trading_results
 from api.routers.services import get_trading_results_service
 
 
+TradingResultRow = namedtuple(
+    "TradingResultRow",
+    [c.name for c in TRADING_RESULT_COLUMNS],
+    defaults=[None] * len(TRADING_RESULT_COLUMNS),
+)
+
+
 @pytest.mark.asyncio
 async def test_get_latest_trading_results():
     max_date = date(2023, 8, 1)
-    mock_result_max_date = AsyncMock()
-    mock_result_max_date.scalar_one = MagicMock(return_value=max_date)
-    tr = TradingResult(
+    tr = TradingResultRow(
         id=123,
         oil_id="oil1",
         delivery_type_id="dt1",
@@ -25,24 +31,45 @@ async def test_get_latest_trading_results():
         total=100,
         count=1,
     )
-    mock_scalars = MagicMock()
-    mock_scalars.all = MagicMock(return_value=[tr])
-    mock_result_rows = AsyncMock()
-    mock_result_rows.scalars = MagicMock(return_value=mock_scalars)
+    mock_result_rows = MagicMock()
+    mock_result_rows.all = MagicMock(return_value=[tr])
     session = AsyncMock()
-    session.execute = AsyncMock(
-        side_effect=[mock_result_max_date, mock_result_rows]
-    )
+    session.execute = AsyncMock(return_value=mock_result_rows)
     results = await get_latest_trading_results(
         session=session,
         oil_id="oil1",
         delivery_type_id="dt1",
         delivery_basis_id="db1",
+        limit=11,
     )
 
     assert len(results) == 1
     assert results[0].id == 123
     assert results[0].date == max_date
+    session.execute.assert_awaited_once()
+    stmt = session.execute.await_args.args[0]
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "max(trading_results.date)" in sql
+    assert "LIMIT 11" in sql
+
+
+@pytest.mark.asyncio
+async def test_get_latest_trading_results_continues_from_keyset():
+    mock_result_rows = MagicMock()
+    mock_result_rows.all.return_value = []
+    session = AsyncMock()
+    session.execute = AsyncMock(return_value=mock_result_rows)
+    await get_latest_trading_results(
+        session=session,
+        oil_id="oil1",
+        limit=11,
+        before=(date(2023, 8, 1), 50),
+    )
+    stmt = session.execute.await_args.args[0]
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "max(" not in sql
+    assert "trading_results.date = '2023-08-01'" in sql
+    assert "trading_results.id < 50" in sql
 
 
 @pytest.mark.asyncio
@@ -55,7 +82,7 @@ async def test_get_trading_results_service_no_filters_raises():
 
 @pytest.mark.asyncio
 async def test_get_trading_results_service_calls_get_latest_trading_results():
-    fake_tr = TradingResult(
+    fake_tr = TradingResultRow(
         id=1,
         oil_id="oil1",
         delivery_type_id="dt1",
@@ -85,6 +112,44 @@ async def test_get_trading_results_service_calls_get_latest_trading_results():
         )
 
         mock_get_latest.assert_awaited_once()
+        assert mock_get_latest.await_args.kwargs["limit"] == 11
         assert isinstance(response, TradingResultsResponse)
         assert len(response.results) == 1
         assert response.results[0].id == fake_tr.id
+        assert response.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_trading_results_service_returns_keyset_cursor():
+    rows = [
+        TradingResultRow(
+            id=i,
+            oil_id="oil1",
+            delivery_type_id="dt1",
+            delivery_basis_id="db1",
+            date=date(2023, 8, 1),
+            volume=10,
+            total=100,
+            count=5,
+            exchange_product_id="prod123",
+            exchange_product_name="Oil Product",
+            delivery_basis_name="Basis Name",
+            created_on=datetime(2023, 8, 1),
+            updated_on=datetime(2023, 8, 1),
+        )
+        for i in (30, 20, 10)
+    ]
+    with patch(
+        "api.routers.services.get_latest_trading_results", new_callable=AsyncMock
+    ) as mock_get_latest:
+        mock_get_latest.return_value = rows
+        response = await get_trading_results_service(
+            session=AsyncMock(), oil_id="oil1", limit=2
+        )
+        assert [r.id for r in response.results] == [30, 20]
+        assert decode_cursor(response.next_cursor) == (date(2023, 8, 1), 20)
+
+        await get_trading_results_service(
+            session=AsyncMock(), oil_id="oil1", limit=2, cursor=response.next_cursor
+        )
+        assert mock_get_latest.await_args.kwargs["before"] == (date(2023, 8, 1), 20)